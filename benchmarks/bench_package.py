@@ -0,0 +1,310 @@
+"""Benchmark the creation and the extraction of MSE packages.
+
+Each benchmark runs in its own process to measure its peak RSS, and its
+temporary files are written in a dedicated directory whose peak size is sampled.
+
+Usage:
+
+    python benchmarks/bench_package.py --output bench.json [--quick]
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+
+from mse_home import __version__
+from mse_home.command.code_provider.package import create_code_tar, create_test_tar
+from mse_home.model.package import CodePackage
+
+MB = 1024 * 1024
+
+# (name, number of files, size of each file)
+TREES: List[Tuple[str, int, int]] = [
+    ("10-large", 10, 16 * MB),
+    ("10k-small", 10_000, 4 * 1024),
+    ("100k-small", 100_000, 1024),
+]
+
+QUICK_TREES: List[Tuple[str, int, int]] = [
+    ("10-large", 10, MB),
+    ("10k-small", 10_000, 256),
+]
+
+
+def create_tree(path: Path, count: int, size: int) -> int:
+    """Create `count` files of `size` bytes in sub-directories of 1000 files."""
+    block = os.urandom(size)
+
+    for i in range(count):
+        directory = path / f"dir_{i // 1000}"
+        directory.mkdir(parents=True, exist_ok=True)
+        (directory / f"file_{i}.py").write_bytes(block)
+
+    return count * size
+
+
+def create_image(path: Path, size: int):
+    """Create a fake image tarball of `size` bytes of random data."""
+    with open(path, "wb") as f:
+        for _ in range(size // MB):
+            f.write(os.urandom(MB))
+
+
+def disk_usage(path: Path) -> int:
+    """Compute the size of the files in `path`."""
+    size = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                size += os.lstat(os.path.join(root, name)).st_size
+            except FileNotFoundError:
+                pass
+
+    return size
+
+
+def measure(
+    name: str,
+    case: str,
+    size: int,
+    tmp_path: Path,
+    func: Callable[..., Any],
+    *args,
+) -> Dict[str, Any]:
+    """Run `func(*args)` in the current process and measure it."""
+    # Every temporary file of the benchmark is written into `tmp_path`
+    tmp_path.mkdir(parents=True, exist_ok=True)
+    os.environ["TMPDIR"] = str(tmp_path)
+    tempfile.tempdir = None
+
+    peak_disk = 0
+    done = threading.Event()
+
+    def sample():
+        nonlocal peak_disk
+        while not done.wait(0.05):
+            peak_disk = max(peak_disk, disk_usage(tmp_path))
+
+    sampler = threading.Thread(target=sample, daemon=True)
+    sampler.start()
+
+    start = time.perf_counter()
+    func(*args)
+    seconds = time.perf_counter() - start
+
+    peak_disk = max(peak_disk, disk_usage(tmp_path))
+    done.set()
+    sampler.join()
+
+    return {
+        "name": name,
+        "case": case,
+        "bytes": size,
+        "seconds": round(seconds, 3),
+        "throughput_mb_s": round(size / MB / seconds, 1) if seconds > 0 else None,
+        # `ru_maxrss` is in kilobytes on Linux
+        "peak_rss_mb": round(
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1
+        ),
+        "peak_tmp_disk_mb": round(peak_disk / MB, 1),
+    }
+
+
+def bench_create_code_tar(code_path: Path, encrypt: bool, tmp_path: Path):
+    """Tar the code directory into a temporary file."""
+    with open(tmp_path / "app.tar", "wb") as f:
+        create_code_tar(code_path, f, encrypt)
+
+
+def bench_create_test_tar(test_path: Path, tmp_path: Path):
+    """Tar the tests directory into a temporary file."""
+    with open(tmp_path / "tests.tar", "wb") as f:
+        create_test_tar(test_path, f)
+
+
+def bench_create(package: CodePackage, tmp_path: Path):
+    """Create the package into a temporary file."""
+    package.create(tmp_path / "package.tar")
+
+
+def bench_extract(package_path: Path, tmp_path: Path):
+    """Extract the package into a temporary directory."""
+    CodePackage.extract(tmp_path, package_path)
+
+
+def run_isolated(
+    name: str, case: str, size: int, tmp_path: Path, func: Callable[..., Any], *args
+) -> Dict[str, Any]:
+    """Run the benchmark in a fresh process to isolate its peak RSS."""
+    with ProcessPoolExecutor(
+        max_workers=1, mp_context=multiprocessing.get_context("spawn")
+    ) as executor:
+        result = executor.submit(
+            measure, name, case, size, tmp_path, func, *args, tmp_path
+        ).result()
+
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    print(json.dumps(result), file=sys.stderr)
+    return result
+
+
+# pylint: disable=too-many-locals
+def bench_tree(
+    workspace: Path,
+    name: str,
+    count: int,
+    file_size: int,
+    image_path: Path,
+    config_path: Path,
+) -> List[Dict[str, Any]]:
+    """Run the benchmarks on a synthetic tree of `count` files of `file_size`."""
+    results = []
+
+    tree_path = workspace / name
+    tree_size = create_tree(tree_path, count, file_size)
+    tmp_path = workspace / "tmp"
+
+    for encrypt in (False, True):
+        results.append(
+            run_isolated(
+                "create_code_tar",
+                f"{name}{'-encrypted' if encrypt else ''}",
+                tree_size,
+                tmp_path,
+                bench_create_code_tar,
+                tree_path,
+                encrypt,
+            )
+        )
+
+    results.append(
+        run_isolated(
+            "create_test_tar",
+            name,
+            tree_size,
+            tmp_path,
+            bench_create_test_tar,
+            tree_path,
+        )
+    )
+
+    # The package of the tree and the fake image
+    code_tar_path = workspace / f"{name}.tar"
+    with open(code_tar_path, "wb") as f:
+        create_code_tar(tree_path, f, False)
+
+    package = CodePackage(
+        code_tar=code_tar_path,
+        image_tar=image_path,
+        test_tar=code_tar_path,
+        config_path=config_path,
+    )
+    package_size = 2 * code_tar_path.stat().st_size + image_path.stat().st_size
+
+    results.append(
+        run_isolated(
+            "CodePackage.create",
+            name,
+            package_size,
+            tmp_path,
+            bench_create,
+            package,
+        )
+    )
+
+    package_path = workspace / f"package_{name}.tar"
+    package.create(package_path)
+
+    results.append(
+        run_isolated(
+            "CodePackage.extract",
+            name,
+            package_size,
+            tmp_path,
+            bench_extract,
+            package_path,
+        )
+    )
+
+    shutil.rmtree(tree_path)
+    code_tar_path.unlink()
+    package_path.unlink()
+
+    return results
+
+
+def run(args) -> Dict[str, Any]:
+    """Run the benchmarks."""
+    workspace = Path(tempfile.mkdtemp(dir=args.workspace))
+    results = []
+
+    try:
+        image_path = workspace / "image.tar"
+        create_image(image_path, args.image_size * MB)
+
+        config_path = workspace / "mse.toml"
+        config_path.write_text("name = 'bench'\n")
+
+        for name, count, file_size in QUICK_TREES if args.quick else TREES:
+            results += bench_tree(
+                workspace, name, count, file_size, image_path, config_path
+            )
+    finally:
+        shutil.rmtree(workspace)
+
+    return {
+        "version": __version__,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "image_size_mb": args.image_size,
+        "results": results,
+    }
+
+
+def main():
+    """Entrypoint of the benchmarks."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+
+    parser.add_argument(
+        "--output", type=Path, required=True, help="The JSON file of the results"
+    )
+
+    parser.add_argument(
+        "--image-size",
+        type=int,
+        help="The size of the fake image tarball in MB "
+        "(default: 4096, or 256 with --quick)",
+    )
+
+    parser.add_argument(
+        "--workspace",
+        type=Path,
+        help="The directory of the synthetic trees (default: the temp directory)",
+    )
+
+    parser.add_argument(
+        "--quick", action="store_true", help="Run smaller benchmarks only"
+    )
+
+    args = parser.parse_args()
+    if args.image_size is None:
+        args.image_size = 256 if args.quick else 4096
+
+    report = run(args)
+    args.output.write_text(json.dumps(report, indent=4))
+
+
+if __name__ == "__main__":
+    main()
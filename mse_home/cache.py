@@ -0,0 +1,133 @@
+"""mse_home.cache module."""
+
+import hashlib
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+from typing import BinaryIO, Iterable, Iterator, Optional, Union, cast
+
+from mse_home.fs import ls
+
+DEFAULT_CACHE_DIR = (
+    Path(os.getenv("XDG_CACHE_HOME", Path.home() / ".cache")) / "mse-home"
+)
+
+# Temporary files being written in the cache start with that prefix
+TMP_PREFIX = ".tmp-"
+
+
+class Cache:
+    """Content-addressed cache of files with a size-bounded LRU eviction.
+
+    Entries are files named after their key. Reading an entry marks it as
+    recently used by updating its modification time.
+    """
+
+    def __init__(self, path: Path, max_size: int):
+        """Initialize the cache in `path` holding at most `max_size` bytes."""
+        self.path = path
+        self.max_size = max_size
+        self.path.mkdir(parents=True, exist_ok=True)
+
+    def get(self, key: str) -> Optional[Path]:
+        """Get the path of the entry `key` if it is in the cache."""
+        path = self.path / key
+
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+
+        return path
+
+    @contextmanager
+    def open(self, key: str) -> Iterator[BinaryIO]:
+        """Open the entry `key` and yield a stream to write its content.
+
+        The entry is only added to the cache if no error occurred while writing.
+        """
+        with tempfile.NamedTemporaryFile(
+            dir=self.path, prefix=TMP_PREFIX, delete=False
+        ) as f:
+            tmp_path = Path(f.name)
+            try:
+                yield cast(BinaryIO, f)
+            except BaseException as exc:
+                tmp_path.unlink()
+                raise exc
+
+        os.replace(tmp_path, self.path / key)
+        self.evict()
+
+    def put(self, key: str, path: Path) -> Path:
+        """Move the file `path` into the cache as the entry `key`."""
+        with tempfile.NamedTemporaryFile(
+            dir=self.path, prefix=TMP_PREFIX, delete=False
+        ) as f:
+            tmp_path = Path(f.name)
+
+        shutil.move(str(path), tmp_path)
+        os.replace(tmp_path, self.path / key)
+        self.evict()
+
+        return self.path / key
+
+    def evict(self):
+        """Remove the least recently used entries exceeding the cache size."""
+        entries = []
+        for path in self.path.iterdir():
+            if path.name.startswith(TMP_PREFIX) or not path.is_file():
+                continue
+
+            stat = path.stat()
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        size = sum(entry[1] for entry in entries)
+
+        for _, entry_size, path in sorted(entries):
+            if size <= self.max_size:
+                break
+
+            path.unlink(missing_ok=True)
+            size -= entry_size
+
+
+def hash_directory(dir_path: Path, ignore_patterns: Iterable[str] = ()) -> str:
+    """Compute the digest of the files of `dir_path` which are not ignored.
+
+    The digest covers the relative path, the permissions and the content of
+    each file.
+    """
+    dir_path = dir_path.absolute()
+    h = hashlib.sha256()
+
+    for path in ls(dir_path, ignore_patterns):
+        h.update(str(path.relative_to(dir_path)).encode("utf-8") + b"\0")
+        h.update(oct(path.stat().st_mode).encode("utf-8") + b"\0")
+        h.update(hash_file(path).encode("utf-8"))
+
+    return h.hexdigest()
+
+
+def hash_file(path: Path) -> str:
+    """Compute the SHA-256 digest of the file `path`."""
+    h = hashlib.sha256()
+
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(block)
+
+    return h.hexdigest()
+
+
+def cache_key(*parts: Union[str, bytes]) -> str:
+    """Build a cache key from the digests and values identifying an entry."""
+    h = hashlib.sha256()
+
+    for part in parts:
+        h.update(part.encode("utf-8") if isinstance(part, str) else part)
+        h.update(b"\0")
+
+    return h.hexdigest()
@@ -0,0 +1,264 @@
+"""mse_home.collaterals module."""
+
+import base64
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Literal, Optional, Tuple
+
+from cryptography.hazmat.primitives.hashes import SHA256
+from cryptography.hazmat.primitives.serialization import Encoding
+from cryptography.x509 import (
+    Certificate,
+    CertificateRevocationList,
+    NameOID,
+    load_pem_x509_certificate,
+    load_pem_x509_crl,
+)
+from intel_sgx_ra import pccs
+from intel_sgx_ra.error import CertificateError
+from intel_sgx_ra.pck import sgx_pck_extension_from_cert
+from intel_sgx_ra.quote import Quote
+
+from mse_home.cache import Cache, cache_key
+from mse_home.log import LOGGER as LOG
+
+# TCB info, QE identity, TCB signing certificate, Root CA CRL, PCK CA CRL
+Collaterals = Tuple[
+    bytes, bytes, Certificate, CertificateRevocationList, CertificateRevocationList
+]
+
+# The maximum size of the cache of the collaterals
+COLLATERALS_CACHE_SIZE = 64 * 1024 * 1024
+
+# The type of the CA issuing the PCK certificates from its common name
+PCK_CA_TYPES: Dict[str, Literal["processor", "platform"]] = {
+    "Intel SGX PCK Platform CA": "platform",
+    "Intel SGX PCK Processor CA": "processor",
+}
+
+# The format of the `nextUpdate` of the TCB info and the QE identity
+NEXT_UPDATE_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+
+
+class CollateralCache:
+    """Cache of the PCCS collaterals shared by the enclaves of a platform.
+
+    The collaterals only depend on the FMSPC and the PCK CA of the platform:
+    they are fetched once for all its enclaves and kept until the earliest
+    `nextUpdate` of the TCB info, the QE identity and the CRLs.
+    """
+
+    def __init__(
+        self,
+        path: Optional[Path],
+        clock: Callable[[], datetime] = datetime.utcnow,
+    ):
+        """Initialize the cache in `path`, or in memory only if None.
+
+        `clock` returns the current UTC time.
+        """
+        self.cache = Cache(path, COLLATERALS_CACHE_SIZE) if path else None
+        self.clock = clock
+        self.entries: Dict[str, Tuple[datetime, Collaterals]] = {}
+        self.locks: Dict[str, threading.Lock] = {}
+        self.lock = threading.Lock()
+
+    def retrieve(self, quote: Quote, pccs_url: str) -> Collaterals:
+        """Retrieve the collaterals of `quote` from the cache or the PCCS."""
+        key = collaterals_key(quote, pccs_url)
+
+        # The concurrent retrievals of the same collaterals wait for one fetch
+        with self.lock:
+            lock = self.locks.setdefault(key, threading.Lock())
+
+        with lock:
+            entry = self.entries.get(key) or self._load(key)
+            if entry and self.clock() < entry[0]:
+                LOG.debug("Reusing the collaterals valid until %s", entry[0])
+                return entry[1]
+
+            collaterals = fetch_collaterals(quote, pccs_url)
+
+            expiration = next_update(collaterals)
+            if expiration and self.clock() < expiration:
+                self.entries[key] = (expiration, collaterals)
+                self._save(key, expiration, collaterals)
+
+            return collaterals
+
+    def _load(self, key: str) -> Optional[Tuple[datetime, Collaterals]]:
+        """Load the entry `key` from the disk."""
+        if self.cache is None:
+            return None
+
+        path = self.cache.get(key)
+        if path is None:
+            return None
+
+        try:
+            return load_collaterals(json.loads(path.read_text(encoding="utf8")))
+        except (ValueError, KeyError) as exc:
+            LOG.debug("Ignoring the corrupted collaterals %s: %s", path, exc)
+            return None
+
+    def _save(self, key: str, expiration: datetime, collaterals: Collaterals):
+        """Save the entry `key` on the disk."""
+        if self.cache is None:
+            return
+
+        with self.cache.open(key) as f:
+            f.write(
+                json.dumps(dump_collaterals(expiration, collaterals)).encode("utf-8")
+            )
+
+
+def fetch_collaterals(quote: Quote, pccs_url: str) -> Collaterals:
+    """Fetch the collaterals of `quote` from the PCCS.
+
+    Same as `intel_sgx_ra.attest.retrieve_collaterals` but the requests to the
+    PCCS are sent concurrently.
+    """
+    _, pck_ca_cert, root_ca_cert = [
+        load_pem_x509_certificate(raw_cert) for raw_cert in quote.certs()
+    ]
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        root_ca_crl = executor.submit(pccs.get_root_ca_crl, pccs_url)
+        pck_cert_crl = executor.submit(
+            pccs.get_pck_cert_crl, pccs_url, pck_ca_type(pck_ca_cert)
+        )
+        tcb_info = executor.submit(pccs.get_tcbinfo, pccs_url, platform_fmspc(quote))
+        qe_identity = executor.submit(pccs.get_qe_identity, pccs_url)
+
+        return check_collaterals(
+            root_ca_cert,
+            pck_ca_cert,
+            root_ca_crl.result(),
+            pck_cert_crl.result(),
+            tcb_info.result(),
+            qe_identity.result(),
+        )
+
+
+def check_collaterals(
+    root_ca_cert: Certificate,
+    pck_ca_cert: Certificate,
+    root_ca_crl: CertificateRevocationList,
+    pck_cert_crl: Tuple[Certificate, Certificate, CertificateRevocationList],
+    tcb_info: Tuple[bytes, Certificate, Certificate],
+    qe_identity: Tuple[bytes, Certificate, Certificate],
+) -> Collaterals:
+    """Check the issuers returned by the PCCS along with the collaterals."""
+    if pck_cert_crl[0] != root_ca_cert:
+        raise CertificateError("PCCS returned different Intel SGX Root CA")
+    if pck_cert_crl[1] != pck_ca_cert:
+        raise CertificateError(
+            "PCCS returned different Intel SGX PCK Platform/Processor CA"
+        )
+
+    if tcb_info[1] != root_ca_cert:
+        raise CertificateError("PCCS returned different Intel SGX Root CA")
+
+    if qe_identity[1] != root_ca_cert:
+        raise CertificateError("PCCS returned different Intel SGX Root CA")
+    if qe_identity[2] != tcb_info[2]:
+        raise CertificateError(
+            "PCCS returned different Intel SGX TCB signing certificate"
+        )
+
+    return (tcb_info[0], qe_identity[0], tcb_info[2], root_ca_crl, pck_cert_crl[2])
+
+
+def pck_ca_type(pck_ca_cert: Certificate) -> Literal["processor", "platform"]:
+    """Return the type of the CA issuing the PCK certificates."""
+    common_name, *_ = pck_ca_cert.subject.get_attributes_for_oid(NameOID.COMMON_NAME)
+
+    ca = PCK_CA_TYPES.get(str(common_name.value))
+    if ca is None:
+        raise CertificateError("Unknown CN in Intel SGX PCK Platform/Processor CA")
+
+    return ca
+
+
+def platform_fmspc(quote: Quote) -> bytes:
+    """Return the FMSPC of the platform from the PCK certificate of `quote`."""
+    pck_cert = load_pem_x509_certificate(quote.certs()[0])
+    return sgx_pck_extension_from_cert(pck_cert)["fmspc"]
+
+
+def collaterals_key(quote: Quote, pccs_url: str) -> str:
+    """Build the cache key of the collaterals of `quote`."""
+    _, pck_ca_cert, root_ca_cert = [
+        load_pem_x509_certificate(raw_cert) for raw_cert in quote.certs()
+    ]
+
+    return cache_key(
+        pccs_url,
+        platform_fmspc(quote),
+        pck_ca_cert.fingerprint(SHA256()),
+        root_ca_cert.fingerprint(SHA256()),
+    )
+
+
+def next_update(collaterals: Collaterals) -> Optional[datetime]:
+    """Return the earliest next update of the collaterals, if they have one."""
+    tcb_info, qe_identity, _, root_ca_crl, pck_ca_crl = collaterals
+
+    dates: List[Optional[datetime]] = [
+        parse_next_update(tcb_info, "tcbInfo"),
+        parse_next_update(qe_identity, "enclaveIdentity"),
+        root_ca_crl.next_update,
+        pck_ca_crl.next_update,
+    ]
+
+    if any(date is None for date in dates):
+        return None
+
+    return min(date for date in dates if date is not None)
+
+
+def parse_next_update(content: bytes, field: str) -> Optional[datetime]:
+    """Parse the `nextUpdate` of the signed JSON `content`.
+
+    Some PCCS hex-encode the JSON content.
+    """
+    try:
+        try:
+            data = json.loads(content)
+        except ValueError:
+            data = json.loads(bytes.fromhex(content.decode("ascii")))
+
+        return datetime.strptime(data[field]["nextUpdate"], NEXT_UPDATE_FORMAT)
+    except (ValueError, KeyError, TypeError):
+        return None
+
+
+def dump_collaterals(expiration: datetime, collaterals: Collaterals) -> Dict[str, Any]:
+    """Serialize the collaterals and their expiration date."""
+    tcb_info, qe_identity, tcb_cert, root_ca_crl, pck_ca_crl = collaterals
+
+    return {
+        "next_update": expiration.strftime(NEXT_UPDATE_FORMAT),
+        "tcb_info": base64.b64encode(tcb_info).decode("utf-8"),
+        "qe_identity": base64.b64encode(qe_identity).decode("utf-8"),
+        "tcb_cert": tcb_cert.public_bytes(Encoding.PEM).decode("utf-8"),
+        "root_ca_crl": root_ca_crl.public_bytes(Encoding.PEM).decode("utf-8"),
+        "pck_ca_crl": pck_ca_crl.public_bytes(Encoding.PEM).decode("utf-8"),
+    }
+
+
+def load_collaterals(data: Dict[str, Any]) -> Tuple[datetime, Collaterals]:
+    """Deserialize the collaterals and their expiration date."""
+    return (
+        datetime.strptime(data["next_update"], NEXT_UPDATE_FORMAT),
+        (
+            base64.b64decode(data["tcb_info"]),
+            base64.b64decode(data["qe_identity"]),
+            load_pem_x509_certificate(data["tcb_cert"].encode("utf-8")),
+            load_pem_x509_crl(data["root_ca_crl"].encode("utf-8")),
+            load_pem_x509_crl(data["pck_ca_crl"].encode("utf-8")),
+        ),
+    )
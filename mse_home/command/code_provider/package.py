@@ -1,20 +1,34 @@
 """mse_home.command.code_provider.package module."""
 
 import argparse
+import multiprocessing
+import os
 import shutil
 import tempfile
 import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict, Optional, Tuple
+from typing import Any, BinaryIO, Callable, Dict, List, Optional, Set, Tuple, cast
 
 from docker.errors import BuildError
+from docker.models.images import Image
+from mse_cli_core import enclave
 from mse_cli_core.conf import AppConf, AppConfParsingOption
-from mse_cli_core.fs import tar, whitelist
+from mse_cli_core.fs import whitelist
 from mse_cli_core.ignore_file import IgnoreFile
-from mse_lib_crypto.xsalsa20_poly1305 import encrypt_directory, random_key
-
-from mse_home.command.helpers import get_client_docker
+from mse_cli_core.no_sgx_docker import NoSgxDockerConfig
+from mse_lib_crypto.xsalsa20_poly1305 import random_key
+
+from mse_home.cache import DEFAULT_CACHE_DIR, Cache, cache_key, hash_directory
+from mse_home.command.helpers import get_client_docker, positive_integer
+from mse_home.compression import ALGORITHMS, NONE, Compression
+from mse_home.crypto import encrypt_tar
+from mse_home.fs import Tee, tar
+from mse_home.image import common_layers, filter_image_tar, image_layers
 from mse_home.log import LOGGER as LOG
+from mse_home.log import setup_logging
+from mse_home.model.manifest import EnclaveMeasurement, ImageManifest, PackageManifest
+from mse_home.model.measurement import MeasurementGrid
 from mse_home.model.package import (
     CODE_TAR_NAME,
     DEFAULT_CODE_DIR,
@@ -22,10 +36,14 @@ from mse_home.model.package import (
     DEFAULT_DOCKERFILE_FILENAME,
     DEFAULT_TEST_DIR,
     DOCKER_IMAGE_TAR_NAME,
+    MANIFEST_SIZE,
+    MSE_CONFIG_NAME,
     TEST_TAR_NAME,
-    CodePackage,
+    PackageWriter,
 )
 
+TEST_IGNORE_PATTERNS = ["__pycache__", ".pytest_cache"]
+
 
 def add_subparser(subparsers):
     """Define the subcommand."""
@@ -56,6 +74,71 @@ def add_subparser(subparsers):
         help="Encrypt the code before packaging it",
     )
 
+    parser.add_argument(
+        "--jobs",
+        type=positive_integer,
+        default=1,
+        help="Number of worker processes used to build the package concurrently "
+        "with the Docker image (default: 1, everything runs sequentially)",
+    )
+
+    parser.add_argument(
+        "--compression",
+        choices=ALGORITHMS,
+        default=NONE,
+        help="Compress the code, tests and Docker image archives (default: none)",
+    )
+
+    parser.add_argument(
+        "--compression-level",
+        type=int,
+        help="The compression level (default: 6 for gzip, 3 for zstd)",
+    )
+
+    parser.add_argument(
+        "--compression-threads",
+        type=positive_integer,
+        default=os.cpu_count() or 1,
+        help="Number of threads compressing the archives "
+        "(default: the number of CPUs)",
+    )
+
+    parser.add_argument(
+        "--base-image",
+        help="Omit the layers of this Docker image from the package: "
+        "the sgx operator should already have it",
+    )
+
+    parser.add_argument(
+        "--measure",
+        type=Path,
+        metavar="FILE",
+        help="Precompute the MRENCLAVE of the deployments of this toml file "
+        "(sizes, applications and host, app_id and expiration_date of each "
+        "[[deployments]]) to verify them without measuring the image",
+    )
+
+    parser.add_argument(
+        "--cache-dir",
+        type=Path,
+        default=DEFAULT_CACHE_DIR,
+        help="The directory of the cache of the unchanged archives "
+        f"(default: {DEFAULT_CACHE_DIR})",
+    )
+
+    parser.add_argument(
+        "--cache-size",
+        type=int,
+        default=20 * 1024,
+        help="The maximum size of the cache in MB (default: 20480)",
+    )
+
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Neither reuse nor store the archives in the cache",
+    )
+
     parser.set_defaults(func=run)
 
 
@@ -110,114 +193,380 @@ def run(args) -> None:
 
     code_config = AppConf.load(config_path, option=AppConfParsingOption.SkipCloud)
 
-    workspace = Path(tempfile.mkdtemp())
-
-    LOG.info("A workspace has been created at: %s", str(workspace))
-
-    package = CodePackage(
-        code_tar=workspace / CODE_TAR_NAME,
-        image_tar=workspace / DOCKER_IMAGE_TAR_NAME,
-        test_tar=workspace / TEST_TAR_NAME,
-        config_path=config_path.resolve(),
+    input_args = (
+        MeasurementGrid.load(args.measure).input_args(code_config.python_application)
+        if args.measure
+        else []
     )
 
+    # Fail before building the image if the grid can't fit in the manifest
+    check_manifest_room(PackageManifest(), input_args)
+
     now = time.time_ns()
     code_secret_path = package_path / f"package_{code_config.name}_{now}.key"
     package_path = package_path / f"package_{code_config.name}_{now}.tar"
 
-    (secret_key, _) = create_code_tar(
-        code_path.resolve(), package.code_tar, args.encrypt
+    secret_key = create_package(
+        package_path,
+        code_path.resolve(),
+        test_path.resolve(),
+        config_path.resolve(),
+        dockerfile_path.resolve(),
+        code_config.name,
+        args.encrypt,
+        args.jobs,
+        None
+        if args.no_cache
+        else Cache(args.cache_dir / "package", args.cache_size * 1024 * 1024),
+        Compression(
+            algorithm=args.compression,
+            level=args.compression_level,
+            threads=args.compression_threads,
+        ),
+        args.base_image,
+        input_args,
     )
 
     if secret_key:
         code_secret_path.write_bytes(secret_key)
         LOG.info("Your code secret key has been saved at: %s", code_secret_path)
 
-    create_test_tar(
-        test_path.resolve(),
-        package.test_tar,
+    LOG.info("Your package is now ready to be shared: %s", package_path)
+
+
+# pylint: disable=too-many-locals
+def create_package(
+    package_path: Path,
+    code_path: Path,
+    test_path: Path,
+    config_path: Path,
+    dockerfile_path: Path,
+    image_name: str,
+    encrypt_code: bool,
+    jobs: int = 1,
+    cache: Optional[Cache] = None,
+    compression: Compression = Compression(),
+    base_image: Optional[str] = None,
+    input_args: Optional[List[NoSgxDockerConfig]] = None,
+) -> Optional[bytes]:
+    """Stream the code, tests, configuration and Docker image into the package.
+
+    The archives already in the `cache` are reused instead of being recreated.
+    The code, tests and image archives are compressed using `compression`.
+    The layers of the Docker image shared with `base_image` are omitted.
+    The MRENCLAVE of the image spawned with each of `input_args` is stored
+    in the manifest of the package.
+    """
+    workspace = Path(tempfile.mkdtemp())
+
+    LOG.info("A workspace has been created at: %s", str(workspace))
+
+    try:
+        with PackageWriter(package_path) as package:
+            if jobs == 1:
+                secret_key = add_code_tar(
+                    package, code_path, encrypt_code, compression, cache
+                )
+
+                add_member(
+                    package,
+                    TEST_TAR_NAME,
+                    lambda f: create_test_tar(test_path, f),
+                    compression,
+                    cache,
+                    tests_cache_key(test_path, compression) if cache else None,
+                )
+
+                package.add(config_path, MSE_CONFIG_NAME)
+
+                image = build_image(dockerfile_path, image_name)
+            else:
+                (secret_key, image) = create_package_concurrently(
+                    package,
+                    workspace,
+                    code_path,
+                    test_path,
+                    config_path,
+                    dockerfile_path,
+                    image_name,
+                    encrypt_code,
+                    jobs,
+                    compression,
+                    cache,
+                )
+
+            package.manifest.image = add_image_tar(
+                package, image, config_path, base_image, compression, cache
+            )
+
+            if input_args:
+                check_manifest_room(package.manifest, input_args)
+                package.manifest.measurements = measure_image(
+                    image, input_args, workspace, jobs
+                )
+    except BaseException as exc:
+        package_path.unlink(missing_ok=True)
+        raise exc
+    finally:
+        # Clean up the workspace
+        LOG.info("Cleaning up the temporary workspace...")
+        shutil.rmtree(workspace)
+
+    return secret_key
+
+
+def create_package_concurrently(
+    package: PackageWriter,
+    workspace: Path,
+    code_path: Path,
+    test_path: Path,
+    config_path: Path,
+    dockerfile_path: Path,
+    image_name: str,
+    encrypt_code: bool,
+    jobs: int,
+    compression: Compression,
+    cache: Optional[Cache] = None,
+) -> Tuple[Optional[bytes], Image]:
+    """Build the Docker image while the code and tests archives are created.
+
+    The Docker build runs in a thread, the tests archive and the code encryption
+    run in `jobs` worker processes and the code archive is streamed meanwhile.
+    """
+    test_key = tests_cache_key(test_path, compression) if cache else None
+    test_tar_path = cache.get(test_key) if cache and test_key else None
+
+    with ProcessPoolExecutor(
+        max_workers=jobs,
+        # Do not fork the process while the Docker build thread is running
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=setup_logging,
+    ) as processes, ThreadPoolExecutor(max_workers=1) as threads:
+        image_future = threads.submit(build_image, dockerfile_path, image_name)
+
+        test_tar_future = (
+            None
+            if test_tar_path
+            else processes.submit(
+                create_test_tar_file,
+                test_path,
+                workspace / TEST_TAR_NAME,
+                compression,
+            )
+        )
+
+        secret_key = add_code_tar(
+            package, code_path, encrypt_code, compression, cache, processes, jobs
+        )
+
+        if test_tar_future:
+            package.add(test_tar_future.result(), TEST_TAR_NAME)
+
+            if cache and test_key:
+                cache.put(test_key, test_tar_future.result())
+        else:
+            LOG.info("Reusing %s from the cache...", TEST_TAR_NAME)
+            package.add(cast(Path, test_tar_path), TEST_TAR_NAME)
+
+        package.add(config_path, MSE_CONFIG_NAME)
+
+        image = image_future.result()
+
+    return (secret_key, image)
+
+
+def add_member(
+    package: PackageWriter,
+    arcname: str,
+    create: Callable[[BinaryIO], Any],
+    compression: Compression = Compression(),
+    cache: Optional[Cache] = None,
+    key: Optional[str] = None,
+):
+    """Add the member `arcname` from the cache or stream it using `create`.
+
+    A streamed member is compressed and also written into the cache as the
+    entry `key`.
+    """
+    if cache is None or key is None:
+        with package.open(arcname) as f, compression.open(f) as output:
+            create(output)
+        return
+
+    cached_path = cache.get(key)
+    if cached_path:
+        LOG.info("Reusing %s from the cache...", arcname)
+        package.add(cached_path, arcname)
+        return
+
+    with package.open(arcname) as f, cache.open(key) as cache_file:
+        with compression.open(cast(BinaryIO, Tee(f, cache_file))) as output:
+            create(output)
+
+
+def add_image_tar(
+    package: PackageWriter,
+    image: Image,
+    config_path: Path,
+    base_image: Optional[str] = None,
+    compression: Compression = Compression(),
+    cache: Optional[Cache] = None,
+) -> ImageManifest:
+    """Add the Docker image tarball to the package and return its description.
+
+    The delta tarball omitting the layers of `base_image` is never cached: it is
+    small and the layers actually omitted are only known once it is written.
+    """
+    manifest = ImageManifest(id=image.id, tags=image.tags, layers=image_layers(image))
+
+    if not base_image:
+        add_member(
+            package,
+            DOCKER_IMAGE_TAR_NAME,
+            lambda f: save_image(image, f),
+            compression,
+            cache,
+            cache_key(
+                "image",
+                str(image.id),
+                config_path.read_bytes(),
+                compression.json(exclude={"threads"}),
+            ),
+        )
+
+        return manifest
+
+    layers = common_layers(image, get_client_docker().images.get(base_image))
+
+    with package.open(DOCKER_IMAGE_TAR_NAME) as f, compression.open(f) as output:
+        omitted_layers = save_image(image, output, set(layers))
+
+    manifest.base_image = base_image
+    manifest.omitted_layers = [layer for layer in layers if layer in omitted_layers]
+
+    LOG.info(
+        "%d layers of %s have been omitted from the image archive",
+        len(manifest.omitted_layers),
+        base_image,
     )
 
-    create_image_tar(dockerfile_path.resolve(), code_config.name, package.image_tar)
+    return manifest
 
-    LOG.info("Creating the final package...")
 
-    package.create(package_path)
+def add_code_tar(
+    package: PackageWriter,
+    code_path: Path,
+    encrypt_code: bool,
+    compression: Compression = Compression(),
+    cache: Optional[Cache] = None,
+    executor: Optional[Executor] = None,
+    jobs: int = 1,
+) -> Optional[bytes]:
+    """Add the code tarball to the package and return the encryption key if any.
 
-    LOG.info("Your package is now ready to be shared: %s", package_path)
+    The encrypted code is never cached: it would also require to cache its key.
+    """
+    if encrypt_code:
+        with package.open(CODE_TAR_NAME) as f, compression.open(f) as output:
+            (secret_key, _) = create_code_tar(code_path, output, True, executor, jobs)
+
+        return secret_key
+
+    add_member(
+        package,
+        CODE_TAR_NAME,
+        lambda f: create_code_tar(code_path, f, False),
+        compression,
+        cache,
+        cache_key(
+            "code",
+            hash_directory(code_path, IgnoreFile.parse(code_path)),
+            compression.json(exclude={"threads"}),
+        )
+        if cache
+        else None,
+    )
 
-    # Clean up the workspace
-    LOG.info("Cleaning up the temporary workspace...")
-    shutil.rmtree(workspace)
+    return None
+
+
+def tests_cache_key(test_path: Path, compression: Compression) -> str:
+    """Compute the cache key of the tests tarball."""
+    return cache_key(
+        "tests",
+        hash_directory(test_path, TEST_IGNORE_PATTERNS),
+        compression.json(exclude={"threads"}),
+    )
 
 
 def create_code_tar(
-    code_path: Path, output_tar_path: Path, encrypt_code: bool
+    code_path: Path,
+    output: BinaryIO,
+    encrypt_code: bool,
+    executor: Optional[Executor] = None,
+    jobs: int = 1,
 ) -> Tuple[Optional[bytes], Optional[Dict[str, bytes]]]:
-    """Create the tarball for the code directory."""
-    if encrypt_code:
-        LOG.info("Encrypting your code...")
+    """Create the tarball for the code directory into `output`.
 
+    If an `executor` of `jobs` workers is given, the code encryption is shared
+    by its workers.
+    """
+    if encrypt_code:
         # Generate the key to encrypt the code
         secret_key = random_key()
 
-        encrypted_path = output_tar_path.parent / "encrypted_code"
+        LOG.info("Your encryption key is: %s", bytes(secret_key).hex())
+        LOG.info("Encrypting your code and building the code archive...")
 
-        # Encrypt the code directory
-        nounces = encrypt_directory(
+        # Encrypt the code directory straight into the tarball
+        nounces = encrypt_tar(
             dir_path=code_path,
-            pattern="*",
+            fileobj=output,
             key=secret_key,
-            nonces=None,
             exceptions=whitelist(),
-            ignore_patterns=list(IgnoreFile.parse(code_path)),
-            out_dir_path=encrypted_path,
+            ignore_patterns=IgnoreFile.parse(code_path),
+            executor=executor,
+            jobs=jobs,
         )
 
-        LOG.info("Your encryption key is: %s", bytes(secret_key).hex())
-        LOG.info("Building the code archive...")
-
-        # Generate the tarball
-        tar(dir_path=encrypted_path, tar_path=output_tar_path)
-
         return (secret_key, nounces)
 
     LOG.info("Building the code archive...")
 
-    mirror_path = output_tar_path.parent / "mirrored_code"
-
-    # We copy the code directory to remove the files to ignore when taring
-    shutil.copytree(
-        code_path,
-        mirror_path,
-        ignore=shutil.ignore_patterns(*list(IgnoreFile.parse(code_path))),
+    # Generate the tarball without the files to ignore
+    tar(
+        dir_path=code_path,
+        fileobj=output,
+        ignore_patterns=IgnoreFile.parse(code_path),
     )
 
-    # Generate the tarball
-    tar(dir_path=mirror_path, tar_path=output_tar_path)
-
     return (None, None)
 
 
-def create_test_tar(test_path: Path, output_tar_path: Path):
-    """Create the tarball for the tests directory."""
+def create_test_tar(test_path: Path, output: BinaryIO):
+    """Create the tarball for the tests directory into `output`."""
     LOG.info("Building the tests archive...")
 
-    mirror_path = output_tar_path.parent / "mirrored_tests"
-
-    # We copy the code directory to remove the files to ignore when taring
-    shutil.copytree(
-        test_path,
-        mirror_path,
-        ignore=shutil.ignore_patterns(*["__pycache__", ".pytest_cache"]),
+    # Generate the tarball without the files to ignore
+    tar(
+        dir_path=test_path,
+        fileobj=output,
+        ignore_patterns=TEST_IGNORE_PATTERNS,
     )
 
-    # Generate the tarball
-    tar(dir_path=mirror_path, tar_path=output_tar_path)
 
+def create_test_tar_file(
+    test_path: Path, output_tar_path: Path, compression: Compression = Compression()
+) -> Path:
+    """Create the compressed tarball for the tests directory at `output_tar_path`."""
+    with open(output_tar_path, "wb") as f, compression.open(f) as output:
+        create_test_tar(test_path, output)
 
-def create_image_tar(dockerfile: Path, image_name: str, output_tar_path: Path):
-    """Build the docker image and export it into a tarball."""
+    return output_tar_path
+
+
+def build_image(dockerfile: Path, image_name: str) -> Image:
+    """Build the docker image."""
     client = get_client_docker()
 
     try:
@@ -234,13 +583,81 @@ def create_image_tar(dockerfile: Path, image_name: str, output_tar_path: Path):
         #         for line in chunk["stream"].splitlines():
         #             LOG.info(line)
 
-        LOG.info("Building the image archive...")
-
-        # Save it as a tarball
-        with open(output_tar_path, "wb") as f:
-            for chunk in image.save(named=True):
-                f.write(chunk)
-
     except BuildError as exc:
         LOG.error("Failed to build your docker!")
         raise exc
+
+    return image
+
+
+def check_manifest_room(
+    manifest: PackageManifest, input_args: List[NoSgxDockerConfig]
+) -> None:
+    """Check that the measurements of `input_args` fit in `manifest`.
+
+    The manifest is written in the room reserved at the head of the package.
+    """
+    placeholders = [
+        EnclaveMeasurement(input_args=args, mrenclave="0" * 64) for args in input_args
+    ]
+    data = manifest.copy(update={"measurements": placeholders}).json(indent=4)
+
+    if len(data.encode("utf-8")) > MANIFEST_SIZE:
+        raise Exception(
+            f"The {len(input_args)} deployments to measure do not fit in the "
+            "manifest of the package: reduce the sizes, applications or "
+            "deployments of the grid"
+        )
+
+
+def measure_image(
+    image: Image,
+    input_args: List[NoSgxDockerConfig],
+    workspace: Path,
+    jobs: int = 1,
+) -> List[EnclaveMeasurement]:
+    """Compute the MRENCLAVE of the image spawned with each of `input_args`.
+
+    The enclaves are measured by `jobs` concurrent containers.
+    """
+    client = get_client_docker()
+
+    def measure(index: int) -> EnclaveMeasurement:
+        app_path = workspace / f"measurement_{index}"
+        app_path.mkdir()
+
+        return EnclaveMeasurement(
+            input_args=input_args[index],
+            mrenclave=enclave.compute_mr_enclave(
+                client,
+                str(image.id),
+                input_args[index],
+                app_path,
+                workspace / f"measurement_{index}.log",
+            ),
+        )
+
+    LOG.info("Computing the fingerprint of %d deployments...", len(input_args))
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        return list(executor.map(measure, range(len(input_args))))
+
+
+def save_image(
+    image: Image, output: BinaryIO, omitted_layers: Optional[Set[str]] = None
+) -> Set[str]:
+    """Export the docker image as a tarball into `output`.
+
+    The layers `omitted_layers` are not exported and the ones actually found in
+    the image are returned.
+    """
+    LOG.info("Building the image archive...")
+
+    if omitted_layers:
+        return filter_image_tar(image.save(named=True), output, omitted_layers)
+
+    # Stream it as a tarball
+    for chunk in image.save(named=True):
+        output.write(chunk)
+
+    return set()
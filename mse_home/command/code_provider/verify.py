@@ -1,16 +1,27 @@
 """mse_home.command.code_provider.verify module."""
 
+import argparse
+import json
+import os
 import shutil
 import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, cast
 
 from cryptography.hazmat.primitives.serialization import Encoding
-from mse_cli_core.enclave import compute_mr_enclave, verify_enclave
+from cryptography.x509 import CertificateRevocationList
+from mse_cli_core.enclave import verify_enclave
 
-from mse_home.command.helpers import get_client_docker, load_docker_image
+from mse_home.cache import DEFAULT_CACHE_DIR, Cache
+from mse_home.command.helpers import positive_integer
+from mse_home.enclave import MRENCLAVE_CACHE_SIZE, EnclaveMeasurer
 from mse_home.log import LOGGER as LOG
-from mse_home.model.evidence import ApplicationEvidence
+from mse_home.model.evidence import BINARY_SUFFIX, ApplicationEvidence, load_evidences
 from mse_home.model.package import CodePackage
+from mse_home.revocation import RevocationIndex, check_revocation
+
+REPORT_FILENAME = "verify_report.json"
 
 
 def add_subparser(subparsers):
@@ -23,10 +34,23 @@ def add_subparser(subparsers):
 
     parser.add_argument(
         "--evidence",
-        required=True,
         type=Path,
         metavar="FILE",
-        help="The path to the evidence file",
+        help="The path to the evidence file (json or cbor) or the evidence bundle",
+    )
+
+    parser.add_argument(
+        "--evidence-dir",
+        type=Path,
+        metavar="DIR",
+        help="Verify all the evidence files and bundles of this directory "
+        "and write a report",
+    )
+
+    parser.add_argument(
+        "--app",
+        type=str,
+        help="Only verify the evidence of this application of the bundle",
     )
 
     parser.add_argument(
@@ -43,6 +67,29 @@ def add_subparser(subparsers):
         help="Output path of the verified RA-TLS certificate",
     )
 
+    parser.add_argument(
+        "--jobs",
+        type=positive_integer,
+        default=os.cpu_count() or 1,
+        help="Number of evidences verified concurrently "
+        "(default: the number of CPUs)",
+    )
+
+    parser.add_argument(
+        "--cache-dir",
+        type=Path,
+        default=DEFAULT_CACHE_DIR,
+        help="The directory of the cache of the fingerprints of the enclaves "
+        f"and of the revocation index (default: {DEFAULT_CACHE_DIR})",
+    )
+
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Neither reuse nor store the fingerprints and the revocation index "
+        "in the cache",
+    )
+
     parser.set_defaults(func=run)
 
 
@@ -51,34 +98,218 @@ def run(args) -> None:
     if not args.output.is_dir():
         raise NotADirectoryError(f"{args.output} does not exist")
 
+    if bool(args.evidence) == bool(args.evidence_dir):
+        raise argparse.ArgumentTypeError(
+            "either --evidence or --evidence-dir is required"
+        )
+
+    if args.evidence_dir:
+        (evidences, sources) = find_evidences(args.evidence_dir)
+    else:
+        evidences = select_evidences(args.evidence, args.app)
+        sources = dict.fromkeys(evidences, args.evidence)
+
+    # A single evidence is verified as is, without report
+    single = args.evidence is not None and len(evidences) == 1
+
     workspace = Path(tempfile.mkdtemp())
     log_path = workspace / "docker.log"
 
-    evidence = ApplicationEvidence.load(args.evidence)
-
     LOG.info("Extracting the package at %s...", workspace)
-    package = CodePackage.extract(workspace, args.package)
+    package = CodePackage.extract(workspace, args.package, [])
 
     LOG.info("A log file is generating at: %s", log_path)
 
-    client = get_client_docker()
-    image = load_docker_image(client, package.image_tar)
-    mrenclave = compute_mr_enclave(
-        client,
-        image,
-        evidence.input_args,
+    measurer = EnclaveMeasurer(
+        package,
         workspace,
         log_path,
+        None
+        if args.no_cache
+        else Cache(args.cache_dir / "mrenclave", MRENCLAVE_CACHE_SIZE),
     )
 
-    LOG.info("Fingerprint is: %s", mrenclave)
+    (fingerprints, errors) = compute_fingerprints(measurer, evidences, single)
+
+    # The CRLs shared by the evidences are indexed once
+    index = RevocationIndex(None if args.no_cache else args.cache_dir / "revocation")
+
+    if single:
+        ((name, evidence),) = evidences.items()
+        verify_evidence(evidence, fingerprints[name], args.output.resolve(), index)
+    else:
+        with ThreadPoolExecutor(max_workers=args.jobs) as executor:
+            results = list(
+                executor.map(
+                    lambda name: verify_app(
+                        name,
+                        evidences[name],
+                        fingerprints.get(name),
+                        errors.get(name),
+                        args.output.resolve() / name,
+                        index,
+                    ),
+                    evidences,
+                )
+            )
+
+    # Clean up the workspace
+    LOG.info("Cleaning up the temporary workspace...")
+    shutil.rmtree(workspace)
+
+    if not single:
+        save_report(args.output / REPORT_FILENAME, args.package, results, sources)
+
+
+def select_evidences(path: Path, app: Optional[str]) -> Dict[str, ApplicationEvidence]:
+    """Load the evidences of the evidence file or bundle `path`."""
+    evidences = load_evidences(path)
+
+    if app:
+        if app not in evidences:
+            raise Exception(f"No evidence of `{app}` in {path}")
+        return {app: evidences[app]}
+
+    return evidences
+
+
+def find_evidences(
+    dir_path: Path,
+) -> Tuple[Dict[str, ApplicationEvidence], Dict[str, Path]]:
+    """Load the evidences of the evidence files and bundles in `dir_path`.
+
+    Return the evidences and their file by application name.
+    """
+    if not dir_path.is_dir():
+        raise NotADirectoryError(f"{dir_path} does not exist")
+
+    evidences: Dict[str, ApplicationEvidence] = {}
+    sources: Dict[str, Path] = {}
+
+    paths = [*dir_path.rglob("*.json"), *dir_path.rglob(f"*{BINARY_SUFFIX}")]
+
+    for path in sorted(paths):
+        try:
+            file_evidences = load_evidences(path)
+        except (KeyError, TypeError, ValueError) as exc:
+            LOG.warning("Skipping %s which is not an evidence: %s", path, exc)
+            continue
+
+        for name, evidence in file_evidences.items():
+            if name in evidences:
+                raise Exception(
+                    f"Evidences of `{name}` found in {sources[name]} and {path}"
+                )
+
+            evidences[name] = evidence
+            sources[name] = path
+
+    if not evidences:
+        raise Exception(f"No evidence found in {dir_path}")
+
+    LOG.info("%d evidences found in %s", len(evidences), dir_path)
+
+    return (evidences, sources)
+
+
+def compute_fingerprints(
+    measurer: EnclaveMeasurer,
+    evidences: Dict[str, ApplicationEvidence],
+    strict: bool,
+) -> Tuple[Dict[str, str], Dict[str, str]]:
+    """Compute the MRENCLAVE of the evidences.
+
+    The evidences spawned with the same arguments share the same MRENCLAVE,
+    which is computed once for all of them. Return the MRENCLAVE and the
+    errors by application name; the first error is raised if `strict`.
+    """
+    groups: Dict[str, List[str]] = {}
+    for name, evidence in evidences.items():
+        groups.setdefault(evidence.input_args.json(), []).append(name)
+
+    fingerprints: Dict[str, str] = {}
+    errors: Dict[str, str] = {}
+
+    for names in groups.values():
+        try:
+            mrenclave = measurer.measure(evidences[names[0]].input_args)
+        except Exception as exc:  # pylint: disable=broad-except
+            if strict:
+                raise exc
+            LOG.error("Fingerprint of %s failed: %s", ", ".join(names), exc)
+            errors.update(dict.fromkeys(names, str(exc)))
+            continue
+
+        LOG.info("Fingerprint is: %s", mrenclave)
+        fingerprints.update(dict.fromkeys(names, mrenclave))
+
+    return (fingerprints, errors)
+
+
+def verify_app(
+    name: str,
+    evidence: ApplicationEvidence,
+    fingerprint: Optional[str],
+    error: Optional[str],
+    output: Path,
+    index: RevocationIndex,
+) -> Dict[str, Any]:
+    """Verify the evidence of the application `name`.
+
+    Return the result of the verification instead of raising.
+    """
+    if fingerprint is None:
+        return {"name": name, "status": "failed", "error": error}
 
     try:
+        output.mkdir(exist_ok=True)
+        verify_evidence(evidence, fingerprint, output, index)
+    except Exception as exc:  # pylint: disable=broad-except
+        LOG.error("Verification of %s failed: %s", name, exc)
+        return {
+            "name": name,
+            "status": "failed",
+            "mrenclave": fingerprint,
+            "error": str(exc),
+        }
+
+    return {
+        "name": name,
+        "status": "passed",
+        "mrenclave": fingerprint,
+        "ratls_certificate": str(Path(name) / "ratls.pem"),
+    }
+
+
+def verify_evidence(
+    evidence: ApplicationEvidence,
+    fingerprint: str,
+    output: Path,
+    index: RevocationIndex,
+):
+    """Verify the evidence against the fingerprint and save its certificate.
+
+    The certificates are checked against the CRLs using the revocation `index`.
+    """
+    try:
+        (root_ca_crl, pck_ca_crl) = check_revocation(
+            index,
+            evidence.ratls_certificate,
+            evidence.root_ca_crl,
+            evidence.pck_platform_crl,
+        )
+
         verify_enclave(
             evidence.signer_pk,
             evidence.ratls_certificate,
-            fingerprint=mrenclave,
-            collaterals=evidence.collaterals,
+            fingerprint=fingerprint,
+            collaterals=(
+                evidence.tcb_info,
+                evidence.qe_identity,
+                evidence.tcb_cert,
+                cast(CertificateRevocationList, root_ca_crl),
+                cast(CertificateRevocationList, pck_ca_crl),
+            ),
         )
     except Exception as exc:
         LOG.error("Verification failed!")
@@ -86,13 +317,42 @@ def run(args) -> None:
 
     LOG.info("Verification successful")
 
-    ratls_cert_path = args.output.resolve() / "ratls.pem"
+    ratls_cert_path = output / "ratls.pem"
     ratls_cert_path.write_bytes(
         evidence.ratls_certificate.public_bytes(encoding=Encoding.PEM)
     )
 
     LOG.info("The RA-TLS certificate has been saved at: %s", ratls_cert_path)
 
-    # Clean up the workspace
-    LOG.info("Cleaning up the temporary workspace...")
-    shutil.rmtree(workspace)
+
+def save_report(
+    path: Path,
+    package: Path,
+    results: List[Dict[str, Any]],
+    sources: Dict[str, Path],
+):
+    """Save the pass/fail report of the verifications and raise on failures."""
+    failures = [result["name"] for result in results if result["status"] != "passed"]
+
+    with open(path, "w", encoding="utf8") as f:
+        json.dump(
+            {
+                "package": str(package),
+                "passed": len(results) - len(failures),
+                "failed": len(failures),
+                "results": [
+                    {**result, "evidence": str(sources[result["name"]])}
+                    for result in results
+                ],
+            },
+            f,
+            indent=4,
+        )
+
+    LOG.info("The verification report has been saved at: %s", path)
+
+    if failures:
+        raise Exception(
+            f"{len(failures)}/{len(results)} verifications failed: "
+            f"{', '.join(failures)}"
+        )
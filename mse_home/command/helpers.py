@@ -1,16 +1,28 @@
 """mse_home.command.helpers module."""
 
+import io
+import re
 import socket
-from pathlib import Path
-from typing import Optional
+import time
+from functools import partial
+from typing import BinaryIO, Optional, Tuple
 
 from docker import from_env
 from docker.client import DockerClient
-from docker.errors import DockerException, NotFound
+from docker.errors import DockerException, ImageLoadError, NotFound
 from docker.models.containers import Container
 
+from mse_home.compression import decompress
 from mse_home.error import AppContainerNotFound, AppContainerNotRunning
+from mse_home.image import has_layers
 from mse_home.log import LOGGER as LOG
+from mse_home.model.manifest import ImageManifest
+from mse_home.model.package import CodePackage
+
+MB = 1024 * 1024
+
+# The image tarball is streamed to Docker by chunks of that size
+LOAD_CHUNK_SIZE = 4 * MB
 
 
 def get_client_docker() -> DockerClient:
@@ -60,12 +72,125 @@ def get_running_app_container(client: DockerClient, name: str) -> Container:
     return container
 
 
-def load_docker_image(client: DockerClient, image_tar_path: Path) -> str:
-    """Load the docker image from the image tarball."""
+def load_package_image(client: DockerClient, package: CodePackage) -> str:
+    """Load the docker image of the package unless it is already loaded."""
+    manifest = package.manifest.image if package.manifest else None
+
+    if manifest:
+        image = find_docker_image(client, manifest)
+        if image:
+            LOG.info("The docker image %s is already loaded", image)
+            return image
+
+    # The image is streamed from the package without being extracted
+    with package.open_image() as (image_tar, size):
+        return load_docker_image(client, image_tar, size, manifest)
+
+
+def find_docker_image(client: DockerClient, manifest: ImageManifest) -> Optional[str]:
+    """Return the tag of the local image with the ID of `manifest` if any."""
+    try:
+        image = client.images.get(manifest.id)
+    except NotFound:
+        return None
+
+    tags = [tag for tag in manifest.tags if tag in image.tags] or image.tags
+    return tags[0] if tags else None
+
+
+def load_docker_image(
+    client: DockerClient,
+    image_tar: BinaryIO,
+    size: int,
+    manifest: Optional[ImageManifest] = None,
+) -> str:
+    """Load the docker image from the image tarball `image_tar` of `size` bytes.
+
+    The tarball is decompressed and streamed to Docker by chunks.
+    A delta tarball is completed by the layers of the base image available locally.
+    """
+    if manifest and manifest.is_delta:
+        if not has_layers(client, manifest.omitted_layers):
+            raise Exception(
+                "The package only contains the layers missing from "
+                f"`{manifest.base_image}`: pull it first"
+            )
+
+        LOG.info("Reusing %d local layers", len(manifest.omitted_layers))
+
     LOG.info("Loading the docker image...")
-    with open(image_tar_path, "rb") as f:
-        image = client.images.load(f.read())
-        return image[0].tags[0]
+
+    progress = ProgressReader(image_tar, size)
+    with decompress(io.BufferedReader(progress, LOAD_CHUNK_SIZE)) as f:
+        resp = client.api.load_image(iter(partial(f.read, LOAD_CHUNK_SIZE), b""))
+
+        images = []
+        for chunk in resp:
+            if "stream" in chunk:
+                match = re.search(
+                    r"(^Loaded image ID: |^Loaded image: )(.+)$", chunk["stream"]
+                )
+                if match:
+                    images.append(match.group(2))
+            if "error" in chunk:
+                raise ImageLoadError(chunk["error"])
+
+    progress.done()
+
+    if not images:
+        raise ImageLoadError("No image has been loaded")
+
+    return client.images.get(images[0]).tags[0]
+
+
+class ProgressReader(io.RawIOBase):
+    """Readable stream logging the progress of the reading of `fileobj`."""
+
+    def __init__(self, fileobj: BinaryIO, size: int, period: float = 5):
+        """Initialize the stream reading `size` bytes from `fileobj`."""
+        super().__init__()
+        self.fileobj = fileobj
+        self.size = size
+        self.period = period
+        self.count = 0
+        self.start = time.monotonic()
+        self.last_log = self.start
+
+    def readable(self) -> bool:
+        """Return True since the stream is read-only."""
+        return True
+
+    def readinto(self, b) -> int:
+        """Read the next bytes of `fileobj` into `b`."""
+        data = self.fileobj.read(len(b))
+        n = len(data)
+        b[:n] = data
+        self.count += n
+
+        now = time.monotonic()
+        if now - self.last_log >= self.period:
+            self.last_log = now
+            LOG.info(
+                "%d%% loaded (%d MB at %.1f MB/s)",
+                100 * self.count // max(self.size, 1),
+                self.count // MB,
+                self.throughput(),
+            )
+
+        return n
+
+    def throughput(self) -> float:
+        """Return the throughput in MB/s."""
+        return self.count / MB / max(time.monotonic() - self.start, 1e-6)
+
+    def done(self):
+        """Log the summary of the reading."""
+        LOG.info(
+            "%d MB loaded in %.1fs (%.1f MB/s)",
+            self.count // MB,
+            time.monotonic() - self.start,
+            self.throughput(),
+        )
 
 
 def is_port_free(port: int):
@@ -92,3 +217,21 @@ def enclave_size_integer(n: str) -> int:
         raise ValueError("Enclave size should be a power of two (lower than EPC size)")
 
     return m
+
+
+def port_range(s: str) -> Tuple[int, int]:
+    """Define a new type for the range of ports arg."""
+    (start, end) = (int(port) for port in s.split("-", 1))
+    if not 0 < start <= end < 65536:
+        raise ValueError("The range of ports should be START-END within 1-65535")
+
+    return (start, end)
+
+
+def positive_integer(n: str) -> int:
+    """Define a new integer type for the args counting workers."""
+    m = int(n)
+    if m < 1:
+        raise ValueError("The value should be greater than 0")
+
+    return m
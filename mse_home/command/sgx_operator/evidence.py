@@ -1,23 +1,37 @@
 """mse_home.command.sgx_operator.evidence module."""
 
+import argparse
 import json
 import socket
 import ssl
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from pathlib import Path
-from typing import Optional
+from typing import Any, Dict, Optional, Tuple
 from urllib.parse import urlparse
 
 from cryptography.hazmat.primitives.serialization import Encoding, load_pem_private_key
 from cryptography.x509 import load_pem_x509_certificate
 from docker.models.containers import Container
-from intel_sgx_ra.attest import retrieve_collaterals
 from intel_sgx_ra.ratls import get_server_certificate, ratls_verify
 from mse_cli_core.no_sgx_docker import NoSgxDockerConfig
 from mse_cli_core.sgx_docker import SgxDockerConfig
 
-from mse_home.command.helpers import get_client_docker, get_running_app_container
+from mse_home.cache import DEFAULT_CACHE_DIR
+from mse_home.collaterals import CollateralCache, fetch_collaterals
+from mse_home.command.helpers import (
+    get_client_docker,
+    get_running_app_container,
+    positive_integer,
+)
 from mse_home.log import LOGGER as LOG
-from mse_home.model.evidence import ApplicationEvidence
+from mse_home.model.evidence import ApplicationEvidence, EvidenceBundle
+
+EVIDENCE_FILENAME = "evidence.json"
+EVIDENCE_BINARY_FILENAME = "evidence.cbor"
+RATLS_CERT_FILENAME = "ratls.pem"
+INDEX_FILENAME = "evidence_index.json"
+BUNDLE_FILENAME = "evidence_bundle.json"
 
 
 def add_subparser(subparsers):
@@ -40,12 +54,65 @@ def add_subparser(subparsers):
         "--output",
         type=Path,
         required=True,
-        help="The directory to write the evidence file",
+        help="The directory to write the evidence file "
+        "(a sub-directory per application with --all)",
+    )
+
+    parser.add_argument(
+        "--cache-dir",
+        type=Path,
+        default=DEFAULT_CACHE_DIR,
+        help="The directory of the cache of the PCCS collaterals "
+        f"(default: {DEFAULT_CACHE_DIR})",
+    )
+
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Neither reuse nor store the PCCS collaterals on the disk",
+    )
+
+    parser.add_argument(
+        "--all",
+        action="store_true",
+        help="Collect the evidences of all the running MSE applications",
+    )
+
+    parser.add_argument(
+        "--label",
+        type=str,
+        action="append",
+        default=[],
+        metavar="KEY[=VALUE]",
+        help="Only collect the evidences of the applications with this "
+        "docker label with --all (can be repeated)",
+    )
+
+    parser.add_argument(
+        "--bundle",
+        action="store_true",
+        help="Write the evidences collected with --all into a single bundle "
+        "sharing their collaterals",
+    )
+
+    parser.add_argument(
+        "--binary",
+        action="store_true",
+        help="Write the evidence in the compact binary format "
+        f"({EVIDENCE_BINARY_FILENAME})",
+    )
+
+    parser.add_argument(
+        "--jobs",
+        type=positive_integer,
+        default=8,
+        help="Number of evidences collected concurrently with --all (default: 8)",
     )
 
     parser.add_argument(
         "name",
         type=str,
+        nargs="?",
         help="The name of the application",
     )
 
@@ -57,21 +124,162 @@ def run(args) -> None:
     if not args.output.is_dir():
         raise NotADirectoryError(f"`{args.output}` does not exist")
 
+    if args.all == bool(args.name):
+        raise argparse.ArgumentTypeError(
+            "either the name of the application or --all is required"
+        )
+
+    if args.label and not args.all:
+        raise argparse.ArgumentTypeError("[--label] requires [--all]")
+
+    if args.bundle and not args.all:
+        raise argparse.ArgumentTypeError("[--bundle] requires [--all]")
+
+    if args.binary and args.bundle:
+        raise argparse.ArgumentTypeError(
+            "[--binary] and [--bundle] are mutually exclusive"
+        )
+
+    if args.all:
+        run_all(args)
+        return
+
     client = get_client_docker()
     container = get_running_app_container(client, args.name)
 
     collect_evidence_and_certificate(
-        container=container, pccs_url=args.pccs, output=args.output
+        container=container,
+        pccs_url=args.pccs,
+        output=args.output,
+        collaterals_cache=get_collaterals_cache(args),
+        filename=EVIDENCE_BINARY_FILENAME if args.binary else EVIDENCE_FILENAME,
     )
 
 
-# pylint: disable=too-many-locals
+def run_all(args) -> None:
+    """Collect the evidences of the running applications concurrently."""
+    client = get_client_docker()
+
+    containers = client.containers.list(
+        filters={
+            "label": [SgxDockerConfig.docker_label, *args.label],
+            "status": "running",
+        }
+    )
+
+    if not containers:
+        raise Exception("No running MSE application found!")
+
+    LOG.info(
+        "Collecting the evidences of %d applications: %s",
+        len(containers),
+        ", ".join(container.name for container in containers),
+    )
+
+    # The applications share the collaterals of the platform
+    cache = get_collaterals_cache(args)
+
+    with ThreadPoolExecutor(max_workers=args.jobs) as executor:
+        results = list(
+            executor.map(
+                partial(collect_app_evidence, pccs_url=args.pccs, cache=cache),
+                containers,
+            )
+        )
+
+    bundle = EvidenceBundle() if args.bundle else None
+    filename = EVIDENCE_BINARY_FILENAME if args.binary else EVIDENCE_FILENAME
+    index = [
+        save_app_evidence(entry, evidence, args.output, bundle, filename)
+        for entry, evidence in results
+    ]
+
+    if bundle:
+        bundle_path = args.output / BUNDLE_FILENAME
+        bundle.save(bundle_path)
+        LOG.info("The evidence bundle has been generated at: %s", bundle_path)
+
+    index_path = args.output / INDEX_FILENAME
+    with open(index_path, "w", encoding="utf8") as f:
+        json.dump(index, f, indent=4)
+
+    LOG.info("The index of the evidences has been saved at: %s", index_path)
+
+    failures = [entry["name"] for entry in index if entry["status"] != "ok"]
+    if failures:
+        raise Exception(
+            f"{len(failures)}/{len(index)} evidences failed to be collected: "
+            f"{', '.join(failures)}"
+        )
+
+
+def collect_app_evidence(
+    container: Container, pccs_url: str, cache: CollateralCache
+) -> Tuple[Dict[str, Any], Optional[ApplicationEvidence]]:
+    """Collect the evidence of `container`.
+
+    Return the entry of the application in the index instead of raising.
+    """
+    try:
+        evidence = collect_evidence(container, pccs_url, cache)
+    except Exception as exc:  # pylint: disable=broad-except
+        LOG.error("Failed to collect the evidence of %s: %s", container.name, exc)
+        return ({"name": container.name, "status": "failed", "error": str(exc)}, None)
+
+    return ({"name": container.name, "status": "ok"}, evidence)
+
+
+def save_app_evidence(
+    entry: Dict[str, Any],
+    evidence: Optional[ApplicationEvidence],
+    output: Path,
+    bundle: Optional[EvidenceBundle],
+    filename: str = EVIDENCE_FILENAME,
+) -> Dict[str, Any]:
+    """Save the evidence of the application of `entry` in its sub-directory.
+
+    The evidence is added to `bundle` instead of its own file if any.
+    """
+    if evidence is None:
+        return entry
+
+    name = entry["name"]
+    (output / name).mkdir(exist_ok=True)
+
+    if bundle is None:
+        save_evidence(evidence, output / name, filename)
+        evidence_path = Path(name) / filename
+    else:
+        bundle.add(name, evidence)
+        save_ratls_certificate(evidence, output / name)
+        evidence_path = Path(BUNDLE_FILENAME)
+
+    return {
+        **entry,
+        "evidence": str(evidence_path),
+        "ratls_certificate": str(Path(name) / RATLS_CERT_FILENAME),
+    }
+
+
 def collect_evidence_and_certificate(
     container: Container,
     pccs_url: str,
     output: Path,
+    collaterals_cache: Optional[CollateralCache] = None,
+    filename: str = EVIDENCE_FILENAME,
 ):
-    """Collect evidence JSON file and RA-TLS certificate from running enclave."""
+    """Collect evidence file and RA-TLS certificate from running enclave."""
+    evidence = collect_evidence(container, pccs_url, collaterals_cache)
+    save_evidence(evidence, output, filename)
+
+
+# pylint: disable=too-many-locals
+def collect_evidence(
+    container: Container,
+    pccs_url: str,
+    collaterals_cache: Optional[CollateralCache] = None,
+) -> ApplicationEvidence:
+    """Collect the evidence of the running enclave."""
     LOG.info("Collecting the enclave and application evidences...")
 
     docker = SgxDockerConfig.load(container.attrs, container.labels)
@@ -96,14 +304,18 @@ def collect_evidence_and_certificate(
         tcb_cert,
         root_ca_crl,
         pck_platform_crl,
-    ) = retrieve_collaterals(quote, pccs_url)
+    ) = (
+        collaterals_cache.retrieve(quote, pccs_url)
+        if collaterals_cache
+        else fetch_collaterals(quote, pccs_url)
+    )
 
     signer_key = load_pem_private_key(
         docker.signer_key.read_bytes(),
         password=None,
     )
 
-    evidence = ApplicationEvidence(
+    return ApplicationEvidence(
         input_args=input_args,
         ratls_certificate=ratls_cert,
         root_ca_crl=root_ca_crl,
@@ -114,12 +326,25 @@ def collect_evidence_and_certificate(
         signer_pk=signer_key.public_key(),
     )
 
-    evidence_path = output / "evidence.json"
+
+def save_evidence(
+    evidence: ApplicationEvidence, output: Path, filename: str = EVIDENCE_FILENAME
+):
+    """Save the evidence file and the RA-TLS certificate into `output`.
+
+    The evidence is written in the binary format if `filename` ends with `.cbor`.
+    """
+    evidence_path = output / filename
     evidence.save(evidence_path)
     LOG.info("The evidence file has been generated at: %s", evidence_path)
     LOG.info("The evidence file can now be shared!")
 
-    ratls_cert_path = output / "ratls.pem"
+    save_ratls_certificate(evidence, output)
+
+
+def save_ratls_certificate(evidence: ApplicationEvidence, output: Path):
+    """Save the RA-TLS certificate of the evidence into `output`."""
+    ratls_cert_path = output / RATLS_CERT_FILENAME
     ratls_cert_path.write_bytes(
         evidence.ratls_certificate.public_bytes(encoding=Encoding.PEM)
     )
@@ -127,6 +352,15 @@ def collect_evidence_and_certificate(
     LOG.info("The RA-TLS certificate has been saved at: %s", ratls_cert_path)
 
 
+def get_collaterals_cache(args) -> CollateralCache:
+    """Build the cache of the collaterals from the command arguments.
+
+    The collaterals are still shared by the applications of the command with
+    `--no-cache`.
+    """
+    return CollateralCache(None if args.no_cache else args.cache_dir / "collaterals")
+
+
 def guess_pccs_url(
     aemsd_conf_file: Path = Path("/etc/sgx_default_qcnl.conf"),
 ) -> Optional[str]:
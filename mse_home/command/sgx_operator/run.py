@@ -1,20 +1,22 @@
 """mse_home.command.sgx_operator.run module."""
 
 import json
+from functools import partial
 from pathlib import Path
 
 from mse_cli_core.bootstrap import (
     ConfigurationPayload,
     configure_app,
+    is_ready,
     is_waiting_for_secrets,
-    wait_for_app_server,
 )
-from mse_cli_core.clock_tick import ClockTick
 from mse_cli_core.sgx_docker import SgxDockerConfig
 from mse_cli_core.spinner import Spinner
 
 from mse_home.command.helpers import get_client_docker, get_running_app_container
 from mse_home.log import LOGGER as LOG
+from mse_home.readiness import wait_for_container
+from mse_home.timing import Timer
 
 
 def add_subparser(subparsers):
@@ -58,11 +60,35 @@ def add_subparser(subparsers):
         "respond after a delay (in min). (Default: 1440 min)",
     )
 
+    parser.add_argument(
+        "--timing",
+        type=Path,
+        metavar="FILE",
+        help="Append the duration of each phase to this JSON lines file",
+    )
+
+    parser.add_argument(
+        "--timing-openmetrics",
+        type=Path,
+        metavar="FILE",
+        help="Write the duration of each phase to this OpenMetrics text file",
+    )
+
     parser.set_defaults(func=run)
 
 
 def run(args) -> None:
     """Run the subcommand."""
+    timer = Timer("run")
+
+    try:
+        configure(args, timer)
+    finally:
+        timer.report(args.timing, args.timing_openmetrics)
+
+
+def configure(args, timer: Timer) -> None:
+    """Configure the application and wait for it to be ready."""
     client = get_client_docker()
     container = get_running_app_container(client, args.name)
 
@@ -83,29 +109,28 @@ def run(args) -> None:
     )
 
     LOG.info("Sending data to the configuration server...")
-    configure_app(
-        f"https://localhost:{docker.port}",
-        data.payload(),
-        False,
-    )
-    LOG.info("Your application is now configured!")
-
-    with Spinner("Waiting for your application to be ready... "):
-        wait_for_app_server(
-            ClockTick(
-                period=5,
-                timeout=60 * args.timeout,
-                message="Your application is unreachable!",
-            ),
+    with timer.span("configure_app", args.name):
+        configure_app(
             f"https://localhost:{docker.port}",
-            docker.healthcheck,
+            data.payload(),
             False,
-            get_running_app_container,
-            (
+        )
+    LOG.info("Your application is now configured!")
+
+    with timer.span("wait_for_app", args.name):
+        with Spinner("Waiting for your application to be ready... "):
+            wait_for_container(
                 client,
                 args.name,
-            ),
-        )
+                partial(
+                    is_ready,
+                    f"https://localhost:{docker.port}",
+                    docker.healthcheck,
+                    False,
+                ),
+                timeout=60 * args.timeout,
+                message="Your application is unreachable!",
+            )
 
     LOG.info("Application ready!")
     LOG.info("Feel free to test it using the `msehome test` command")
@@ -1,33 +1,58 @@
 """mse_home.command.sgx_operator.spawn module."""
 
+import argparse
+import json
 import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
 from datetime import datetime, timedelta
+from functools import partial
 from pathlib import Path
-from uuid import uuid4
+from typing import Any, Dict, List, Optional
+from uuid import UUID, uuid4
 
 from docker.client import DockerClient
 from docker.models.containers import Container
-from mse_cli_core.bootstrap import wait_for_conf_server
-from mse_cli_core.clock_tick import ClockTick
+from mse_cli_core.bootstrap import is_waiting_for_secrets
 from mse_cli_core.conf import AppConf, AppConfParsingOption
 from mse_cli_core.sgx_docker import SgxDockerConfig
 from mse_cli_core.spinner import Spinner
 
+from mse_home.cache import DEFAULT_CACHE_DIR
+from mse_home.collaterals import CollateralCache
 from mse_home.command.helpers import (
     app_container_exists,
     enclave_size_integer,
     get_app_container,
     get_client_docker,
-    get_running_app_container,
-    is_port_free,
-    load_docker_image,
+    load_package_image,
+    port_range,
+    positive_integer,
 )
 from mse_home.command.sgx_operator.evidence import (
     collect_evidence_and_certificate,
+    get_collaterals_cache,
     guess_pccs_url,
 )
 from mse_home.log import LOGGER as LOG
-from mse_home.model.package import CodePackage
+from mse_home.model.fleet import DEFAULT_DAYS, Fleet, FleetApp
+from mse_home.model.package import (
+    CODE_TAR_NAME,
+    MSE_CONFIG_NAME,
+    TEST_TAR_NAME,
+    CodePackage,
+)
+from mse_home.ports import DEFAULT_PORT_RANGE, PORT_LABEL, PortPool
+from mse_home.readiness import wait_for_container
+from mse_home.timing import Timer
+
+# The members of the package used by the application
+APP_MEMBERS = [CODE_TAR_NAME, TEST_TAR_NAME, MSE_CONFIG_NAME]
+
+SUMMARY_FILENAME = "spawn_summary.json"
 
 
 def add_subparser(subparsers):
@@ -37,6 +62,7 @@ def add_subparser(subparsers):
     parser.add_argument(
         "name",
         type=str,
+        nargs="?",
         help="The name of the application",
     )
 
@@ -50,31 +76,67 @@ def add_subparser(subparsers):
     parser.add_argument(
         "--host",
         type=str,
-        required=True,
         help="The common name of the generated certificate",
     )
 
     parser.add_argument(
         "--days",
         type=int,
-        help="The number of days before the certificate expires",
-        default=365,
+        help="The number of days before the certificate expires "
+        f"(default: {DEFAULT_DAYS})",
+    )
+
+    parser.add_argument(
+        "--expiration",
+        type=int,
+        metavar="TIMESTAMP",
+        help="The expiration date of the certificate as a UNIX timestamp "
+        "instead of --days",
+    )
+
+    parser.add_argument(
+        "--app-id",
+        type=UUID,
+        help="The ID of the application (default: a random UUID)",
     )
 
     parser.add_argument(
         "--port",
         type=int,
-        required=True,
-        help="The application port",
+        help="The application port (default: the first free port of --port-range)",
+    )
+
+    parser.add_argument(
+        "--port-range",
+        type=port_range,
+        default=DEFAULT_PORT_RANGE,
+        metavar="START-END",
+        help="The range of the ports allocated to the applications "
+        f"(default: {DEFAULT_PORT_RANGE[0]}-{DEFAULT_PORT_RANGE[1]})",
     )
 
     parser.add_argument(
         "--size",
         type=enclave_size_integer,
-        required=True,
         help="The enclave size to spawn (must be a power of 2)",
     )
 
+    parser.add_argument(
+        "--batch",
+        type=Path,
+        metavar="FILE",
+        help="Spawn the applications listed in this toml file (name, host, size "
+        "and optional port, days, expiration_date and app_id of each [[apps]]) "
+        "instead of a single one",
+    )
+
+    parser.add_argument(
+        "--jobs",
+        type=positive_integer,
+        default=4,
+        help="Number of applications spawned concurrently with --batch (default: 4)",
+    )
+
     parser.add_argument(
         "--signer-key",
         type=Path,
@@ -103,7 +165,36 @@ def add_subparser(subparsers):
         "--output",
         type=Path,
         required=True,
-        help="The directory to write the args file",
+        help="The directory to write the args file "
+        "(a sub-directory per application with --batch)",
+    )
+
+    parser.add_argument(
+        "--cache-dir",
+        type=Path,
+        default=DEFAULT_CACHE_DIR,
+        help="The directory of the cache of the PCCS collaterals "
+        f"(default: {DEFAULT_CACHE_DIR})",
+    )
+
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Neither reuse nor store the PCCS collaterals on the disk",
+    )
+
+    parser.add_argument(
+        "--timing",
+        type=Path,
+        metavar="FILE",
+        help="Append the duration of each phase to this JSON lines file",
+    )
+
+    parser.add_argument(
+        "--timing-openmetrics",
+        type=Path,
+        metavar="FILE",
+        help="Write the duration of each phase to this OpenMetrics text file",
     )
 
     parser.set_defaults(func=run)
@@ -111,67 +202,287 @@ def add_subparser(subparsers):
 
 def run(args) -> None:
     """Run the subcommand."""
+    timer = Timer("spawn")
+
+    try:
+        spawn(args, timer)
+    finally:
+        timer.report(args.timing, args.timing_openmetrics)
+
+
+def spawn(args, timer: Timer) -> None:
+    """Spawn the application or the fleet."""
+    if args.batch:
+        if any(
+            [
+                args.name,
+                args.host,
+                args.port,
+                args.size,
+                args.app_id,
+                args.days is not None,
+                args.expiration is not None,
+            ]
+        ):
+            raise argparse.ArgumentTypeError(
+                "[--batch] and [name & --host & --port & --size & --days & "
+                "--expiration & --app-id] are mutually exclusive"
+            )
+
+        run_batch(args, timer)
+        return
+
+    if not all([args.name, args.host, args.size]):
+        raise argparse.ArgumentTypeError(
+            "the following arguments are required: name, --host, --size"
+        )
+
+    client = get_client_docker()
+    pool = PortPool(client, *args.port_range)
+
+    app = reserve_app(
+        client,
+        pool,
+        FleetApp(
+            name=args.name,
+            host=args.host,
+            port=args.port,
+            size=args.size,
+            days=DEFAULT_DAYS if args.days is None else args.days,
+            expiration_date=args.expiration,
+            app_id=args.app_id,
+        ),
+    )
+
+    try:
+        workspace = args.output.resolve()
+
+        LOG.info("Extracting the package at %s...", workspace)
+        with timer.span("extract", app.name):
+            package = CodePackage.extract(workspace, args.package, APP_MEMBERS)
+
+        with timer.span("load_image", app.name):
+            image = load_package_image(client, package)
+
+        spawn_app(
+            client,
+            app,
+            image,
+            package,
+            workspace,
+            args,
+            timer,
+            get_collaterals_cache(args),
+        )
+    except BaseException as exc:
+        release_app(client, pool, app)
+        raise exc
+
+
+# pylint: disable=too-many-locals
+def run_batch(args, timer: Timer) -> None:
+    """Spawn the applications of the fleet concurrently from the same package."""
+    output = args.output.resolve()
+    if not output.is_dir():
+        raise NotADirectoryError(f"`{output}` does not exist")
+
     client = get_client_docker()
+    pool = PortPool(client, *args.port_range)
+
+    apps = reserve_fleet(client, pool, Fleet.load(args.batch).apps)
+
+    # The package is extracted and its image loaded once for all the applications
+    workspace = Path(tempfile.mkdtemp())
+    try:
+        LOG.info("Extracting the package at %s...", workspace)
+        with timer.span("extract"):
+            package = CodePackage.extract(workspace, args.package, APP_MEMBERS)
+
+        with timer.span("load_image"):
+            image = load_package_image(client, package)
+
+        # The applications share the collaterals of the platform
+        cache = get_collaterals_cache(args)
 
-    if app_container_exists(client, args.name):
+        with ThreadPoolExecutor(max_workers=args.jobs) as executor:
+            futures = {
+                app.name: executor.submit(
+                    spawn_fleet_app,
+                    pool,
+                    app,
+                    image,
+                    package,
+                    output / app.name,
+                    args,
+                    timer,
+                    cache,
+                )
+                for app in apps
+            }
+
+            summary = [{"name": app.name, **futures[app.name].result()} for app in apps]
+    except BaseException as exc:
+        for app in apps:
+            release_app(client, pool, app)
+        raise exc
+    finally:
+        shutil.rmtree(workspace)
+
+    save_summary(output / SUMMARY_FILENAME, summary)
+
+    failures = [result["name"] for result in summary if result["status"] != "ok"]
+    if failures:
         raise Exception(
-            f"Docker container `{args.name}` is already running. "
+            f"{len(failures)}/{len(summary)} applications failed to spawn: "
+            f"{', '.join(failures)}"
+        )
+
+
+def save_summary(path: Path, summary: List[Dict[str, Any]]):
+    """Save the results of the spawning of the fleet."""
+    with open(path, "w", encoding="utf8") as f:
+        json.dump(summary, f, indent=4)
+
+    LOG.info("The summary has been saved at: %s", path)
+
+
+def spawn_fleet_app(
+    pool: PortPool,
+    app: FleetApp,
+    image: str,
+    package: CodePackage,
+    app_dir: Path,
+    args,
+    timer: Timer,
+    cache: Optional[CollateralCache],
+) -> Dict[str, Any]:
+    """Spawn `app` with its own copy of the package members in `app_dir`.
+
+    Return the result of the spawning instead of raising.
+    """
+    start = time.monotonic()
+    client = get_client_docker()
+
+    try:
+        app_dir.mkdir(exist_ok=True)
+        for path in (package.code_tar, package.test_tar, package.config_path):
+            shutil.copy(path, app_dir / path.name)
+
+        spawn_app(client, app, image, package, app_dir, args, timer, cache, False)
+    except Exception as exc:  # pylint: disable=broad-except
+        LOG.error("Failed to spawn %s: %s", app.name, exc)
+        release_app(client, pool, app)
+        return {
+            "status": "failed",
+            "error": str(exc),
+            "duration": round(time.monotonic() - start, 3),
+        }
+
+    return {
+        "status": "ok",
+        "host": app.host,
+        "port": app.port,
+        "evidence": str(app_dir / "evidence.json"),
+        "duration": round(time.monotonic() - start, 3),
+    }
+
+
+def reserve_app(client: DockerClient, pool: PortPool, app: FleetApp) -> FleetApp:
+    """Check that `app` can be spawned and reserve its port."""
+    if app_container_exists(client, app.name):
+        raise Exception(
+            f"Docker container `{app.name}` is already running. "
             "Stop and remove it before respawn it!"
         )
 
-    if not is_port_free(args.port):
-        raise Exception(f"Port {args.port} is already in-used!")
+    port = pool.reserve(app.name, app.port)
+    LOG.info("Port %d has been reserved for %s", port, app.name)
+
+    return app.copy(update={"port": port})
+
+
+def reserve_fleet(
+    client: DockerClient, pool: PortPool, apps: List[FleetApp]
+) -> List[FleetApp]:
+    """Reserve the ports of all the applications or none of them."""
+    reserved: List[FleetApp] = []
+
+    try:
+        for app in apps:
+            reserved.append(reserve_app(client, pool, app))
+    except BaseException as exc:
+        for app in reserved:
+            release_app(client, pool, app)
+        raise exc
+
+    return reserved
+
 
-    workspace = args.output.resolve()
+def release_app(client: DockerClient, pool: PortPool, app: FleetApp):
+    """Release the port of `app` unless its container has been created."""
+    if app.port and not app_container_exists(client, app.name):
+        pool.release(app.port)
 
-    LOG.info("Extracting the package at %s...", workspace)
-    package = CodePackage.extract(workspace, args.package)
+
+def spawn_app(
+    client: DockerClient,
+    app: FleetApp,
+    image: str,
+    package: CodePackage,
+    app_dir: Path,
+    args,
+    timer: Timer,
+    cache: Optional[CollateralCache],
+    spinner: bool = True,
+):
+    """Spawn the application and collect its evidence into `app_dir`."""
     code_config = AppConf.load(
         package.config_path, option=AppConfParsingOption.SkipCloud
     )
 
-    image = load_docker_image(client, package.image_tar)
-
     docker_config = SgxDockerConfig(
-        size=args.size,
-        host=args.host,
-        port=args.port,
-        app_id=uuid4(),
-        expiration_date=int((datetime.today() + timedelta(days=args.days)).timestamp()),
-        app_dir=workspace,
+        size=app.size,
+        host=app.host,
+        port=app.port,
+        app_id=app.app_id or uuid4(),
+        expiration_date=app.expiration_date
+        or int((datetime.today() + timedelta(days=app.days)).timestamp()),
+        app_dir=app_dir,
         application=code_config.python_application,
         healthcheck=code_config.healthcheck_endpoint,
         signer_key=args.signer_key,
     )
 
-    run_docker_image(
-        client,
-        args.name,
-        image,
-        docker_config,
-    )
-
-    with Spinner("Waiting for the configuration server to be ready... "):
-        wait_for_conf_server(
-            ClockTick(
-                period=5,
-                timeout=60 * args.timeout,
-                message="The configuration server is unreachable!",
-            ),
-            f"https://localhost:{args.port}",
-            False,
-            get_running_app_container,
-            (
-                client,
-                args.name,
-            ),
+    with timer.span("run_docker_image", app.name):
+        run_docker_image(
+            client,
+            app.name,
+            image,
+            docker_config,
+        )
+
+    # Concurrent spinners would mess up the output
+    waiting = (
+        Spinner("Waiting for the configuration server to be ready... ")
+        if spinner
+        else nullcontext()
+    )
+
+    with waiting, timer.span("wait_for_conf_server", app.name):
+        wait_for_container(
+            client,
+            app.name,
+            partial(is_waiting_for_secrets, f"https://localhost:{app.port}", False),
+            timeout=60 * args.timeout,
+            message="The configuration server is unreachable!",
         )
-    LOG.info("The application is now ready to receive the secrets!")
+    LOG.info("The application %s is now ready to receive the secrets!", app.name)
 
     # Generate evidence and RA-TLS certificate files
-    container: Container = get_app_container(client, args.name)
+    container: Container = get_app_container(client, app.name)
 
-    collect_evidence_and_certificate(container, args.pccs, args.output)
+    with timer.span("collect_evidence", app.name):
+        collect_evidence_and_certificate(container, args.pccs, app_dir, cache)
 
 
 def run_docker_image(
@@ -190,7 +501,8 @@ def run_docker_image(
         devices=SgxDockerConfig.devices(),
         ports=docker_config.ports(),
         entrypoint=SgxDockerConfig.entrypoint,
-        labels=docker_config.labels(),
+        # The port is recorded to be released when the container is removed
+        labels={**docker_config.labels(), PORT_LABEL: str(docker_config.port)},
         remove=False,
         detach=True,
         stdout=True,
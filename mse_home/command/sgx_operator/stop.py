@@ -2,6 +2,7 @@
 
 from mse_home.command.helpers import get_app_container, get_client_docker
 from mse_home.log import LOGGER as LOG
+from mse_home.ports import PORT_LABEL, PortPool
 
 
 def add_subparser(subparsers):
@@ -38,3 +39,7 @@ def run(args) -> None:
     if args.remove:
         container.remove()
         LOG.info("Docker '%s' has been removed!", args.name)
+
+        # A stopped container keeps its port to be restarted
+        if PORT_LABEL in container.labels:
+            PortPool(client).release(int(container.labels[PORT_LABEL]))
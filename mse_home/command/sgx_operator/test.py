@@ -1,8 +1,12 @@
 """mse_home.command.sgx_operator.test module."""
 
+import argparse
 import os
+import shutil
 import subprocess
 import sys
+import tarfile
+import tempfile
 from pathlib import Path
 
 from mse_cli_core.bootstrap import is_waiting_for_secrets
@@ -10,6 +14,13 @@ from mse_cli_core.conf import AppConf, AppConfParsingOption
 from mse_cli_core.sgx_docker import SgxDockerConfig
 
 from mse_home.command.helpers import get_client_docker, get_running_app_container
+from mse_home.log import LOGGER as LOG
+from mse_home.model.package import (
+    DEFAULT_TEST_DIR,
+    MSE_CONFIG_NAME,
+    TEST_TAR_NAME,
+    CodePackage,
+)
 
 
 def add_subparser(subparsers):
@@ -25,22 +36,36 @@ def add_subparser(subparsers):
     parser.add_argument(
         "--test",
         type=Path,
-        required=True,
         help="The path of the test directory extracted from the MSE package",
     )
 
     parser.add_argument(
         "--config",
         type=Path,
-        required=True,
         help="The conf path extracted from the MSE package",
     )
 
+    parser.add_argument(
+        "--package",
+        type=Path,
+        help="The MSE package to extract the tests and the conf from",
+    )
+
     parser.set_defaults(func=run)
 
 
 def run(args) -> None:
     """Run the subcommand."""
+    if args.package:
+        if args.test or args.config:
+            raise argparse.ArgumentTypeError(
+                "[--package] and [--test & --config] are mutually exclusive"
+            )
+    elif not args.test or not args.config:
+        raise argparse.ArgumentTypeError(
+            "the following arguments are required: --test, --config"
+        )
+
     client = get_client_docker()
     container = get_running_app_container(client, args.name)
 
@@ -51,13 +76,37 @@ def run(args) -> None:
             "Your application is waiting for secrets and can't be tested right now."
         )
 
-    code_config = AppConf.load(args.config, option=AppConfParsingOption.SkipCloud)
+    if not args.package:
+        run_tests(args.test, args.config, docker.port)
+        return
+
+    workspace = Path(tempfile.mkdtemp())
+
+    try:
+        # Only the tests and the conf are extracted
+        LOG.info("Extracting the tests at %s...", workspace)
+        package = CodePackage.extract(
+            workspace, args.package, [TEST_TAR_NAME, MSE_CONFIG_NAME]
+        )
+
+        test_path = workspace / DEFAULT_TEST_DIR
+        with tarfile.open(package.test_tar) as tar_file:
+            tar_file.extractall(test_path)
+
+        run_tests(test_path, package.config_path, docker.port)
+    finally:
+        shutil.rmtree(workspace)
+
+
+def run_tests(test_path: Path, config_path: Path, port: int):
+    """Run the tests of `test_path` against the application."""
+    code_config = AppConf.load(config_path, option=AppConfParsingOption.SkipCloud)
 
     for package in code_config.tests_requirements:
         subprocess.check_call([sys.executable, "-m", "pip", "install", package])
 
     subprocess.check_call(
         code_config.tests_cmd,
-        cwd=args.test,
-        env=dict(os.environ, TEST_REMOTE_URL=f"https://localhost:{docker.port}"),
+        cwd=test_path,
+        env=dict(os.environ, TEST_REMOTE_URL=f"https://localhost:{port}"),
     )
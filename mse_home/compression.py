@@ -0,0 +1,220 @@
+"""mse_home.compression module."""
+
+import gzip
+import io
+import os
+import shutil
+import tarfile
+import zlib
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, BinaryIO, Deque, Iterator, Optional, cast
+
+from pydantic import BaseModel
+
+NONE = "none"
+GZIP = "gzip"
+ZSTD = "zstd"
+ALGORITHMS = [NONE, GZIP, ZSTD]
+
+DEFAULT_LEVELS = {GZIP: 6, ZSTD: 3}
+
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+# Data is compressed by blocks of that size by the gzip worker threads
+GZIP_BLOCK_SIZE = 1024 * 1024
+
+
+def _zstandard() -> Any:
+    """Import the optional `zstandard` module."""
+    try:
+        # pylint: disable=import-outside-toplevel
+        import zstandard  # type: ignore
+
+        return zstandard
+    except ImportError as exc:
+        raise Exception(
+            "The zstd compression requires the `zstandard` package: "
+            "pip install mse-home[zstd]"
+        ) from exc
+
+
+class Compression(BaseModel):
+    """Compression of the tarballs of an MSE package."""
+
+    algorithm: str = NONE
+    level: Optional[int] = None
+    threads: int = 1
+
+    @contextmanager
+    def open(self, fileobj: BinaryIO) -> Iterator[BinaryIO]:
+        """Yield a stream compressing the data written into `fileobj`."""
+        if self.algorithm == NONE:
+            yield fileobj
+            return
+
+        level = self.level if self.level is not None else DEFAULT_LEVELS[self.algorithm]
+
+        if self.algorithm == GZIP:
+            with GzipWriter(fileobj, level, self.threads) as writer:
+                yield cast(BinaryIO, writer)
+        elif self.algorithm == ZSTD:
+            compressor = _zstandard().ZstdCompressor(
+                level=level,
+                # zstd spawns its own worker threads if more than one is requested
+                threads=self.threads if self.threads > 1 else 0,
+            )
+            with compressor.stream_writer(fileobj, closefd=False) as writer:
+                yield writer
+        else:
+            raise Exception(f"Unknown compression algorithm: {self.algorithm}")
+
+
+class GzipWriter(io.RawIOBase):
+    """Writable stream compressing the data as gzip using several threads.
+
+    Each block of data is compressed independently by a worker thread as a gzip
+    member: the concatenation of the members is a valid gzip stream.
+    """
+
+    def __init__(self, fileobj: BinaryIO, level: int, threads: int = 1):
+        """Initialize the stream writing the compressed data into `fileobj`."""
+        super().__init__()
+        self.fileobj = fileobj
+        self.level = level
+        self.buffer = bytearray()
+        self.size = 0
+        self.pending: Deque[Future] = deque()
+        self.max_pending = 2 * threads
+        self.executor = ThreadPoolExecutor(max_workers=threads) if threads > 1 else None
+
+    def writable(self) -> bool:
+        """Return True since the stream is write-only."""
+        return True
+
+    def write(self, b) -> int:
+        """Compress `b`."""
+        self.buffer += b
+        self.size += len(b)
+
+        while len(self.buffer) >= GZIP_BLOCK_SIZE:
+            self._compress(bytes(self.buffer[:GZIP_BLOCK_SIZE]))
+            del self.buffer[:GZIP_BLOCK_SIZE]
+
+        return len(b)
+
+    def tell(self) -> int:
+        """Return the number of bytes written so far before compression."""
+        return self.size
+
+    def close(self):
+        """Compress the remaining data and wait for the worker threads."""
+        if self.closed:  # pylint: disable=using-constant-test
+            return
+
+        try:
+            if self.buffer or self.size == 0:
+                self._compress(bytes(self.buffer))
+                self.buffer.clear()
+
+            while self.pending:
+                self.fileobj.write(self.pending.popleft().result())
+        finally:
+            if self.executor:
+                self.executor.shutdown()
+
+            super().close()
+
+    def _compress(self, block: bytes):
+        """Compress `block` as a gzip member, in order with the previous ones."""
+        if self.executor is None:
+            self.fileobj.write(compress_block(block, self.level))
+            return
+
+        # zlib releases the GIL while compressing
+        self.pending.append(self.executor.submit(compress_block, block, self.level))
+
+        while len(self.pending) >= self.max_pending:
+            self.fileobj.write(self.pending.popleft().result())
+
+
+def compress_block(block: bytes, level: int) -> bytes:
+    """Compress `block` as a gzip member."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return compressor.compress(block) + compressor.flush()
+
+
+def detect(fileobj: BinaryIO) -> str:
+    """Detect the compression algorithm of the seekable or buffered `fileobj`."""
+    if isinstance(fileobj, io.BufferedReader):
+        magic = fileobj.peek(len(ZSTD_MAGIC))[: len(ZSTD_MAGIC)]
+    else:
+        position = fileobj.tell()
+        magic = fileobj.read(len(ZSTD_MAGIC))
+        fileobj.seek(position)
+
+    if magic.startswith(GZIP_MAGIC):
+        return GZIP
+
+    if magic.startswith(ZSTD_MAGIC):
+        return ZSTD
+
+    return NONE
+
+
+@contextmanager
+def decompress(fileobj: BinaryIO) -> Iterator[BinaryIO]:
+    """Yield a stream of the decompressed content of `fileobj`.
+
+    The stream `fileobj` should be seekable or buffered.
+    """
+    algorithm = detect(fileobj)
+
+    if algorithm == GZIP:
+        with gzip.GzipFile(fileobj=fileobj, mode="rb") as reader:
+            yield cast(BinaryIO, reader)
+    elif algorithm == ZSTD:
+        decompressor = _zstandard().ZstdDecompressor()
+        with decompressor.stream_reader(
+            fileobj, read_across_frames=True, closefd=False
+        ) as reader:
+            yield reader
+    else:
+        yield fileobj
+
+
+def decompress_file(path: Path) -> bool:
+    """Decompress the file `path` in place if it is compressed."""
+    with open(path, "rb") as f:
+        if detect(f) == NONE:
+            return False
+
+        tmp_path = path.with_name(f".{path.name}.tmp")
+        try:
+            with decompress(f) as reader, open(tmp_path, "wb") as output:
+                shutil.copyfileobj(reader, output, GZIP_BLOCK_SIZE)
+        except BaseException as exc:
+            tmp_path.unlink(missing_ok=True)
+            raise exc
+
+    os.replace(tmp_path, path)
+    return True
+
+
+@contextmanager
+def open_tar(path: Path) -> Iterator[tarfile.TarFile]:
+    """Open the tarball `path` for reading whatever its compression."""
+    with open(path, "rb") as f:
+        if detect(f) == NONE:
+            with tarfile.open(fileobj=f, mode="r") as tar_file:
+                yield tar_file
+            return
+
+        # Compressed tarballs are read sequentially
+        with decompress(f) as reader, tarfile.open(
+            fileobj=reader, mode="r|"
+        ) as tar_file:
+            yield tar_file
@@ -0,0 +1,170 @@
+"""mse_home.crypto module."""
+
+import io
+import os
+import tarfile
+from collections import deque
+from concurrent.futures import Executor, Future
+from pathlib import Path
+from typing import BinaryIO, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from mse_lib_crypto.xsalsa20_poly1305 import NONCE_LENGTH, encrypt
+
+from mse_home.fs import ls
+
+# Files are encrypted by chunks of that size to amortize the inter-process calls
+CHUNK_SIZE = 4 * 1024 * 1024
+
+ENCRYPTED_EXTENSION = ".enc"
+
+
+def encrypt_files(paths: List[Path], key: bytes, nonces: List[bytes]) -> List[bytes]:
+    """Encrypt the content of the files `paths` with their own nonce."""
+    return [
+        encrypt(path.read_bytes(), key, nonce) for (path, nonce) in zip(paths, nonces)
+    ]
+
+
+def chunks(
+    members: Iterable[Tuple[Path, str, bool]], chunk_size: int = CHUNK_SIZE
+) -> Iterator[Tuple[List[Tuple[Path, str, bool]], int]]:
+    """Group the members to tar by chunks of about `chunk_size` bytes.
+
+    Yield each chunk with its size. A file larger than `chunk_size` is alone
+    in its chunk.
+    """
+    chunk: List[Tuple[Path, str, bool]] = []
+    size = 0
+
+    for member in members:
+        member_size = member[0].stat().st_size
+
+        if chunk and member_size >= chunk_size:
+            yield (chunk, size)
+            chunk = []
+            size = 0
+
+        chunk.append(member)
+        size += member_size
+
+        if size >= chunk_size:
+            yield (chunk, size)
+            chunk = []
+            size = 0
+
+    if chunk:
+        yield (chunk, size)
+
+
+# pylint: disable=too-many-locals
+def encrypt_tar(
+    dir_path: Path,
+    fileobj: BinaryIO,
+    key: bytes,
+    exceptions: List[str],
+    ignore_patterns: Iterable[str],
+    executor: Optional[Executor] = None,
+    jobs: int = 1,
+) -> Dict[str, bytes]:
+    """Encrypt the files of `dir_path` using XSalsa20-Poly1305 and tar them.
+
+    The tarball has the same content as `mse_lib_crypto.encrypt_directory`
+    followed by `mse_home.fs.tar` would create, but the ciphertexts are written
+    straight into `fileobj` instead of an encrypted copy of the directory.
+
+    Parameters
+    ----------
+    dir_path : Path
+        Path to the directory to be encrypted.
+    fileobj : BinaryIO
+        Stream to write the tarball into.
+    key : bytes
+        Symmetric key used for encryption.
+    exceptions: List[str]
+        List of files which won't be encrypted.
+    ignore_patterns: Iterable[str]
+        Glob patterns of the file and directory names to skip.
+    executor : Optional[Executor]
+        Pool of workers sharing the encryption of the chunks of files.
+    jobs : int
+        Number of workers of `executor`, bounding the size of the chunks
+        encrypted ahead of the tarball writing to `jobs` chunks.
+
+    Returns
+    -------
+    Dict[str, bytes]
+        Map of path string to nonce used to encrypt.
+
+    """
+    dir_path = dir_path.absolute()
+    nonce_map: Dict[str, bytes] = {}
+
+    # List the members as (path, name in the tarball, whether to encrypt it)
+    members: List[Tuple[Path, str, bool]] = []
+    for path in ls(dir_path, ignore_patterns):
+        relpath = str(path.relative_to(dir_path))
+        if path.name in exceptions:
+            members.append((path, relpath, False))
+        else:
+            members.append((path, relpath + ENCRYPTED_EXTENSION, True))
+
+    # Sort the members as the encrypted directory would be listed
+    members.sort(key=lambda member: dir_path / member[1])
+
+    def encrypt_chunk(chunk: List[Tuple[Path, str, bool]]) -> "Future[List[bytes]]":
+        paths = [path for (path, _, encrypted) in chunk if encrypted]
+        nonces = [os.urandom(NONCE_LENGTH) for _ in paths]
+
+        for path, nonce in zip(paths, nonces):
+            nonce_map[str(path.relative_to(dir_path))] = nonce
+
+        if executor:
+            return executor.submit(encrypt_files, paths, key, nonces)
+
+        future: "Future[List[bytes]]" = Future()
+        future.set_result(encrypt_files(paths, key, nonces))
+        return future
+
+    # The chunks being encrypted with their size, in the tarball order
+    pending: Deque[Tuple[List[Tuple[Path, str, bool]], int, "Future[List[bytes]]"]]
+    pending = deque()
+    pending_size = 0
+
+    with tarfile.open(fileobj=fileobj, mode="w:", dereference=True) as tar_file:
+
+        def write_chunk():
+            nonlocal pending_size
+
+            chunk, size, future = pending.popleft()
+            pending_size -= size
+            ciphertexts = iter(future.result())
+
+            for path, arcname, encrypted in chunk:
+                # Store hard links as regular files as well
+                tar_file.inodes.clear()  # type: ignore[attr-defined]
+                info = tar_file.gettarinfo(path, arcname)
+
+                if encrypted:
+                    ciphertext = next(ciphertexts)
+                    info.size = len(ciphertext)
+                    tar_file.addfile(info, io.BytesIO(ciphertext))
+                else:
+                    with open(path, "rb") as f:
+                        tar_file.addfile(info, f)
+
+        for chunk, size in chunks(members):
+            # Write the oldest chunks until the new one fits in the budget
+            while pending and pending_size + size > jobs * CHUNK_SIZE:
+                write_chunk()
+
+            pending.append((chunk, size, encrypt_chunk(chunk)))
+            pending_size += size
+
+            # Without workers, the chunk is already encrypted
+            if executor is None:
+                write_chunk()
+
+        while pending:
+            write_chunk()
+
+    return nonce_map
@@ -0,0 +1,114 @@
+"""mse_home.enclave module."""
+
+import re
+from pathlib import Path
+from typing import Optional
+
+from docker.client import DockerClient
+from mse_cli_core import enclave
+from mse_cli_core.no_sgx_docker import NoSgxDockerConfig
+
+from mse_home.cache import Cache, cache_key
+from mse_home.command.helpers import get_client_docker, load_package_image
+from mse_home.log import LOGGER as LOG
+from mse_home.model.package import CodePackage
+
+# The maximum size of the cache of the measurements
+MRENCLAVE_CACHE_SIZE = 16 * 1024 * 1024
+
+RE_MRENCLAVE = re.compile(r"[0-9a-f]{64}")
+
+
+class EnclaveMeasurer:
+    """Compute the MRENCLAVE of the image of a package.
+
+    The measurement only depends on the image and the arguments of the enclave:
+    it is reused from the package manifest when it was precomputed, or from the
+    cache when the same deployment is verified again. The cache is keyed by the
+    ID Docker reports for the loaded image, since the manifest is not
+    authenticated.
+    """
+
+    def __init__(
+        self,
+        package: CodePackage,
+        workspace: Path,
+        log_path: Path,
+        cache: Optional[Cache] = None,
+    ):
+        """Initialize the measurer of the image of `package`."""
+        self.package = package
+        self.workspace = workspace
+        self.log_path = log_path
+        self.cache = cache
+        self.client: Optional[DockerClient] = None
+        self.image: Optional[str] = None
+        self.image_id: Optional[str] = None
+
+    def measure(self, input_args: NoSgxDockerConfig) -> str:
+        """Compute the MRENCLAVE of the image spawned with `input_args`."""
+        if self.package.manifest:
+            precomputed = self.package.manifest.mrenclave(input_args)
+            if precomputed:
+                LOG.info("Reusing the fingerprint of the image from the package")
+                return precomputed
+
+        self.load_image()
+
+        key = mr_enclave_key(str(self.image_id), input_args)
+
+        if self.cache is not None:
+            cached = self.cached(key)
+            if cached:
+                LOG.info("Reusing the fingerprint of the image from the cache")
+                return cached
+
+        mrenclave = enclave.compute_mr_enclave(
+            self.client, self.image, input_args, self.workspace, self.log_path
+        )
+
+        if self.cache is not None:
+            with self.cache.open(key) as f:
+                f.write(mrenclave.encode("utf-8"))
+
+        return mrenclave
+
+    def cached(self, key: str) -> Optional[str]:
+        """Return the MRENCLAVE `key` from the cache if any."""
+        path = self.cache.get(key) if self.cache else None
+        if path is None:
+            return None
+
+        mrenclave = path.read_text(encoding="utf8").strip()
+        return mrenclave if RE_MRENCLAVE.fullmatch(mrenclave) else None
+
+    def load_image(self):
+        """Load the image of the package in Docker once.
+
+        The package is rejected if the loaded image is not the one of its manifest.
+        """
+        if self.client is not None:
+            return
+
+        self.client = get_client_docker()
+        self.image = load_package_image(self.client, self.package)
+        self.image_id = self.client.images.get(self.image).id
+
+        manifest = self.package.manifest
+        if manifest and manifest.image and manifest.image.id != self.image_id:
+            raise Exception(
+                f"The image of the package ({self.image_id}) is not the one of "
+                f"its manifest ({manifest.image.id})"
+            )
+
+
+def mr_enclave_key(image_id: str, input_args: NoSgxDockerConfig) -> str:
+    """Build the cache key of the MRENCLAVE of an image and its arguments."""
+    return cache_key(
+        image_id,
+        input_args.host,
+        str(input_args.expiration_date or ""),
+        str(input_args.size),
+        str(input_args.app_id),
+        input_args.application,
+    )
@@ -0,0 +1,142 @@
+"""mse_home.fs module."""
+
+import fnmatch
+import io
+import os
+import tarfile
+from pathlib import Path
+from typing import BinaryIO, Iterable, Iterator, List
+
+from mse_cli_core.fs import is_hidden
+
+
+def ls(
+    dir_path: Path, ignore_patterns: Iterable[str] = (), dot_files: bool = False
+) -> Iterator[Path]:
+    """Recursive listing of files `dir_path` skipping the ignored ones.
+
+    The listing is the same as `mse_cli_core.fs.ls` on a copy of `dir_path` made
+    with `shutil.copytree(ignore=shutil.ignore_patterns(*ignore_patterns))`.
+
+    Parameters
+    ----------
+    dir_path : Path
+        Path to the directory.
+    ignore_patterns : Iterable[str]
+        Glob patterns of the file and directory names to skip.
+    dot_files : bool
+        Whether you want to list dot files.
+
+    Yields
+    -------
+    Path
+        Path to a file within `dir_path`.
+
+    """
+    dir_path = dir_path.absolute()
+    patterns = list(ignore_patterns)
+    paths: List[Path] = []
+
+    for root, dirs, files in os.walk(dir_path, followlinks=True):
+        ignored = set()
+        for pattern in patterns:
+            ignored.update(fnmatch.filter(dirs + files, pattern))
+
+        # Do not walk through the ignored directories
+        dirs[:] = [name for name in dirs if name not in ignored]
+
+        for name in files:
+            if name in ignored:
+                continue
+
+            path = Path(root) / name
+            if path.is_file() and (
+                dot_files or not is_hidden(path.relative_to(dir_path))
+            ):
+                paths.append(path)
+
+    yield from sorted(paths)
+
+
+def tar(
+    dir_path: Path,
+    fileobj: BinaryIO,
+    ignore_patterns: Iterable[str] = (),
+    dot_files: bool = False,
+):
+    """Tar directory `dir_path` into the writable stream `fileobj`.
+
+    Files are read in place: the ignored ones are skipped while walking the
+    directory, without copying it first.
+
+    Parameters
+    ----------
+    dir_path : Path
+        Directory path to tar.
+    fileobj : BinaryIO
+        Stream to write the tarball into.
+    ignore_patterns : Iterable[str]
+        Glob patterns of the file and directory names to skip.
+    dot_files : bool
+        Whether you want to include dot files.
+
+    """
+    # Symbolic links are followed as a copy of the directory would do
+    with tarfile.open(fileobj=fileobj, mode="w:", dereference=True) as tar_file:
+        for path in ls(dir_path, ignore_patterns, dot_files):
+            # Store hard links as regular files as well
+            tar_file.inodes.clear()  # type: ignore[attr-defined]
+            tar_file.add(path, path.relative_to(dir_path.absolute()))
+
+
+class Tee(io.RawIOBase):
+    """Writable stream duplicating the data written into several streams."""
+
+    def __init__(self, *streams: BinaryIO):
+        """Initialize the stream writing into `streams`."""
+        super().__init__()
+        self.streams = streams
+        self.size = 0
+
+    def writable(self) -> bool:
+        """Return True since the stream is write-only."""
+        return True
+
+    def write(self, b) -> int:
+        """Write `b` into all the streams."""
+        for stream in self.streams:
+            stream.write(b)
+
+        self.size += len(b)
+        return len(b)
+
+    def tell(self) -> int:
+        """Return the number of bytes written so far."""
+        return self.size
+
+
+class ChunksReader(io.RawIOBase):
+    """Readable stream over an iterable of chunks of bytes."""
+
+    def __init__(self, chunks: Iterable[bytes]):
+        """Initialize the stream reading `chunks`."""
+        super().__init__()
+        self.chunks = iter(chunks)
+        self.chunk = memoryview(b"")
+
+    def readable(self) -> bool:
+        """Return True since the stream is read-only."""
+        return True
+
+    def readinto(self, b) -> int:
+        """Read the next bytes of the chunks into `b`."""
+        while not self.chunk:
+            chunk = next(self.chunks, None)
+            if chunk is None:
+                return 0
+            self.chunk = memoryview(chunk)
+
+        n = min(len(b), len(self.chunk))
+        b[:n] = self.chunk[:n]
+        self.chunk = self.chunk[n:]
+        return n
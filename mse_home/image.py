@@ -0,0 +1,120 @@
+"""mse_home.image module."""
+
+import hashlib
+import tarfile
+import tempfile
+from typing import BinaryIO, Iterable, List, Set, cast
+
+from docker.client import DockerClient
+from docker.models.images import Image
+
+from mse_home.fs import ChunksReader
+
+# Layers of the `docker save` tarballs: `<id>/layer.tar` or `blobs/sha256/<digest>`
+LEGACY_LAYER_NAME = "layer.tar"
+BLOB_PREFIX = "blobs/sha256/"
+
+# Layers are spooled in memory up to that size while their digest is computed
+SPOOL_SIZE = 64 * 1024 * 1024
+COPY_SIZE = 1024 * 1024
+
+
+def image_layers(image: Image) -> List[str]:
+    """Return the digests of the uncompressed layers of `image`."""
+    return list(image.attrs["RootFS"]["Layers"])
+
+
+def common_layers(image: Image, base_image: Image) -> List[str]:
+    """Return the digests of the first layers of `image` shared with `base_image`."""
+    layers = []
+
+    for layer, base_layer in zip(image_layers(image), image_layers(base_image)):
+        if layer != base_layer:
+            break
+        layers.append(layer)
+
+    return layers
+
+
+def has_layers(client: DockerClient, layers: List[str]) -> bool:
+    """Check whether a local image starts with the chain of `layers`."""
+    return any(
+        image_layers(image)[: len(layers)] == layers for image in client.images.list()
+    )
+
+
+def filter_image_tar(
+    chunks: Iterable[bytes], output: BinaryIO, omitted_layers: Set[str]
+) -> Set[str]:
+    """Copy the `docker save` tarball `chunks` into `output` without some layers.
+
+    Docker does not read the layers of a tarball it is loading as long as it
+    already has the same chain of layers, so the tarball can omit them.
+
+    Parameters
+    ----------
+    chunks : Iterable[bytes]
+        The tarball of the image as returned by `Image.save`.
+    output : BinaryIO
+        Stream to write the filtered tarball into.
+    omitted_layers : Set[str]
+        Digests of the uncompressed layers to omit.
+
+    Returns
+    -------
+    Set[str]
+        The digests of the layers actually omitted.
+
+    """
+    omitted: Set[str] = set()
+
+    with tarfile.open(
+        fileobj=cast(BinaryIO, ChunksReader(chunks)), mode="r|"
+    ) as tar_input:
+        with tarfile.open(fileobj=output, mode="w|") as tar_output:
+            for member in tar_input:
+                if not member.isreg():
+                    tar_output.addfile(member)
+                    continue
+
+                fileobj = tar_input.extractfile(member)
+
+                if member.name.startswith(BLOB_PREFIX):
+                    # The name of the blob is its digest
+                    digest = f"sha256:{member.name[len(BLOB_PREFIX):]}"
+                    if digest in omitted_layers:
+                        omitted.add(digest)
+                        continue
+
+                    tar_output.addfile(member, fileobj)
+                    continue
+
+                if not member.name.endswith(f"/{LEGACY_LAYER_NAME}"):
+                    tar_output.addfile(member, fileobj)
+                    continue
+
+                # The legacy layer directories are not named after the digest
+                with tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE) as spool:
+                    digest = f"sha256:{copy_and_hash(fileobj, spool)}"
+                    if digest in omitted_layers:
+                        omitted.add(digest)
+                        continue
+
+                    spool.seek(0)
+                    tar_output.addfile(member, spool)
+
+    return omitted
+
+
+def copy_and_hash(fileobj, output) -> str:
+    """Copy `fileobj` into `output` and return the SHA-256 of the data."""
+    digest = hashlib.sha256()
+
+    while True:
+        data = fileobj.read(COPY_SIZE)
+        if not data:
+            break
+        digest.update(data)
+        output.write(data)
+
+    return digest.hexdigest()
@@ -1,28 +1,83 @@
 """mse_home.model.evidence module."""
 
 import base64
+import hashlib
 import json
+import os
 from pathlib import Path
-from typing import Any, Dict, Tuple
+from typing import Any, Dict, Optional, Tuple, Union
 
 from cryptography.hazmat.primitives.asymmetric.types import PublicKeyTypes
 from cryptography.hazmat.primitives.serialization import (
     Encoding,
     PublicFormat,
+    load_der_public_key,
     load_pem_public_key,
 )
 from cryptography.x509 import (
     Certificate,
     CertificateRevocationList,
+    load_der_x509_certificate,
+    load_der_x509_crl,
     load_pem_x509_certificate,
     load_pem_x509_crl,
 )
 from mse_cli_core.no_sgx_docker import NoSgxDockerConfig
-from pydantic import BaseModel
+from pydantic import BaseModel, PrivateAttr, validator
+
+# The suffix of the evidence files in the compact binary format
+BINARY_SUFFIX = ".cbor"
+
+# The fields of an evidence encoded in PEM or base64, in the order of the file
+ENCODED_FIELDS = [
+    "ratls_certificate",
+    "root_ca_crl",
+    "pck_platform_crl",
+    "tcb_info",
+    "qe_identity",
+    "tcb_cert",
+    "signer_pk",
+]
+
+# The certificates and CRLs, only decoded when they are accessed
+LAZY_FIELDS = [
+    "ratls_certificate",
+    "root_ca_crl",
+    "pck_platform_crl",
+    "tcb_cert",
+]
+
+# The collaterals shared by the enclaves of a platform
+COLLATERAL_FIELDS = [
+    "root_ca_crl",
+    "pck_platform_crl",
+    "tcb_info",
+    "qe_identity",
+    "tcb_cert",
+]
+
+
+def _cbor2() -> Any:
+    """Import the optional `cbor2` module."""
+    try:
+        # pylint: disable=import-outside-toplevel
+        import cbor2  # type: ignore
+
+        return cbor2
+    except ImportError as exc:
+        raise Exception(
+            "The binary evidence format requires the `cbor2` package: "
+            "pip install mse-home[cbor]"
+        ) from exc
 
 
 class ApplicationEvidence(BaseModel):
-    """Definition of an enclave evidence."""
+    """Definition of an enclave evidence.
+
+    The evidence is either stored in json, with PEM and base64 fields, or in
+    the compact binary format: CBOR with DER and raw bytes fields. The
+    certificates and CRLs of a loaded evidence are decoded on first access.
+    """
 
     ratls_certificate: Certificate
 
@@ -40,11 +95,25 @@ class ApplicationEvidence(BaseModel):
 
     input_args: NoSgxDockerConfig
 
+    # The encoded certificates and CRLs not decoded yet, by field
+    _encoded: Dict[str, Union[str, bytes]] = PrivateAttr(default_factory=dict)
+
     class Config:
         """Overwrite internal structure."""
 
         arbitrary_types_allowed = True
 
+    def __getattr__(self, name: str) -> Any:
+        """Decode the certificate or CRL `name` on first access."""
+        if name.startswith("_") or name not in self._encoded:
+            raise AttributeError(
+                f"'{type(self).__name__}' object has no attribute '{name}'"
+            )
+
+        value = decode_field(name, self._encoded[name])
+        self.__dict__[name] = value
+        return value
+
     @property
     def collaterals(
         self,
@@ -62,58 +131,211 @@ class ApplicationEvidence(BaseModel):
 
     @staticmethod
     def load(path: Path):
-        """Load the evidence from a json file."""
+        """Load the evidence from a json or binary file."""
+        if path.suffix == BINARY_SUFFIX:
+            return ApplicationEvidence.from_bytes(path.read_bytes())
+
         with open(path, encoding="utf8") as f:
-            dataMap = json.load(f)
-
-            return ApplicationEvidence(
-                input_args=NoSgxDockerConfig(**dataMap["input_args"]),
-                ratls_certificate=load_pem_x509_certificate(
-                    dataMap["ratls_certificate"].encode("utf-8")
-                ),
-                root_ca_crl=load_pem_x509_crl(dataMap["root_ca_crl"].encode("utf-8")),
-                pck_platform_crl=load_pem_x509_crl(
-                    dataMap["pck_platform_crl"].encode("utf-8")
-                ),
-                tcb_info=base64.b64decode(dataMap["tcb_info"].encode("utf-8")),
-                qe_identity=base64.b64decode(dataMap["qe_identity"].encode("utf-8")),
-                tcb_cert=load_pem_x509_certificate(dataMap["tcb_cert"].encode("utf-8")),
-                signer_pk=load_pem_public_key(
-                    dataMap["signer_pk"].encode("utf-8"),
-                ),
-            )
+            return ApplicationEvidence.from_dict(json.load(f))
+
+    @staticmethod
+    def from_bytes(data: bytes):
+        """Load the evidence from its binary representation."""
+        return ApplicationEvidence.from_dict(_cbor2().loads(data))
+
+    @staticmethod
+    def from_dict(
+        dataMap: Dict[str, Any], collaterals: Optional[Dict[str, Any]] = None
+    ):
+        """Load the evidence from its json or binary representation.
+
+        The already decoded `collaterals` are used instead of their encoding.
+        The other certificates and CRLs are decoded on first access.
+        """
+        collaterals = collaterals or {}
+
+        evidence = ApplicationEvidence.construct(
+            input_args=NoSgxDockerConfig(**dataMap["input_args"]),
+            **{
+                field: collaterals[field]
+                if field in collaterals
+                else decode_field(field, dataMap[field])
+                for field in ENCODED_FIELDS
+                if field in collaterals or field not in LAZY_FIELDS
+            },
+        )
+
+        # pylint: disable=protected-access
+        evidence._encoded = {
+            field: dataMap[field] for field in LAZY_FIELDS if field not in collaterals
+        }
+
+        return evidence
+
+    def to_bytes(self) -> bytes:
+        """Return the binary representation of the evidence."""
+        return _cbor2().dumps(self.to_dict(binary=True))
+
+    def to_dict(self, binary: bool = False) -> Dict[str, Any]:
+        """Return the json or binary representation of the evidence.
+
+        The certificates and CRLs not decoded yet are copied as is when their
+        encoding matches.
+        """
+        return {
+            "input_args": {
+                "host": self.input_args.host,
+                "expiration_date": self.input_args.expiration_date
+                if self.input_args.expiration_date
+                else None,
+                "size": self.input_args.size,
+                "app_id": str(self.input_args.app_id),
+                "application": self.input_args.application,
+            },
+            **{field: self.encoded(field, binary) for field in ENCODED_FIELDS},
+        }
+
+    def encoded(self, field: str, binary: bool = False) -> Union[str, bytes]:
+        """Return the json or binary encoding of `field`."""
+        value = self._encoded.get(field)
+        if value is not None and isinstance(value, bytes) == binary:
+            return value
+
+        return encode_field(field, getattr(self, field), binary)
 
     def save(self, path: Path) -> None:
-        """Save the evidence into a json file."""
+        """Save the evidence into a json or binary file."""
+        if path.suffix == BINARY_SUFFIX:
+            path.write_bytes(self.to_bytes())
+            return
+
         with open(path, "w", encoding="utf8") as f:
-            dataMap: Dict[str, Any] = {
-                "input_args": {
-                    "host": self.input_args.host,
-                    "expiration_date": self.input_args.expiration_date
-                    if self.input_args.expiration_date
-                    else None,
-                    "size": self.input_args.size,
-                    "app_id": str(self.input_args.app_id),
-                    "application": self.input_args.application,
-                },
-                "ratls_certificate": self.ratls_certificate.public_bytes(
-                    encoding=Encoding.PEM
-                ).decode("utf-8"),
-                "root_ca_crl": self.root_ca_crl.public_bytes(
-                    encoding=Encoding.PEM,
-                ).decode("utf-8"),
-                "pck_platform_crl": self.pck_platform_crl.public_bytes(
-                    encoding=Encoding.PEM,
-                ).decode("utf-8"),
-                "tcb_info": base64.b64encode(self.tcb_info).decode("utf-8"),
-                "qe_identity": base64.b64encode(self.qe_identity).decode("utf-8"),
-                "tcb_cert": self.tcb_cert.public_bytes(encoding=Encoding.PEM).decode(
-                    "utf-8"
-                ),
-                "signer_pk": self.signer_pk.public_bytes(
-                    encoding=Encoding.PEM,
-                    format=PublicFormat.SubjectPublicKeyInfo,
-                ).decode("utf-8"),
-            }
-
-            json.dump(dataMap, f, indent=4)
+            json.dump(self.to_dict(), f, indent=4)
+
+
+class EvidenceBundle(BaseModel):
+    """Definition of the evidences of several applications.
+
+    The collaterals shared by the applications of a platform are stored once.
+    """
+
+    # The encoded collaterals by their SHA-256 digest
+    collaterals: Dict[str, str] = {}
+
+    # The encoded evidences by application name, referencing their collaterals
+    # by digest
+    apps: Dict[str, Dict[str, Any]] = {}
+
+    def add(self, name: str, evidence: ApplicationEvidence) -> None:
+        """Add the evidence of the application `name`."""
+        dataMap = evidence.to_dict()
+
+        for field in COLLATERAL_FIELDS:
+            digest = hashlib.sha256(dataMap[field].encode("utf-8")).hexdigest()
+            self.collaterals[digest] = dataMap[field]
+            dataMap[field] = digest
+
+        self.apps[name] = dataMap
+
+    @validator("apps")
+    @classmethod
+    def check_app_names(cls, v: Dict[str, Dict[str, Any]]):
+        """Check that the application names are safe directory names.
+
+        The evidences are verified into a directory named after their
+        application, which must not escape the output directory.
+        """
+        for name in v:
+            if name in ("", ".", "..") or any(
+                sep in name for sep in ("/", os.sep, os.altsep) if sep
+            ):
+                raise ValueError(f"Invalid application name `{name}`")
+        return v
+
+    def evidences(self) -> Dict[str, ApplicationEvidence]:
+        """Decode the evidences of the applications.
+
+        Each collateral is decoded once for all the applications.
+        """
+        decoded: Dict[str, Any] = {}
+        evidences = {}
+
+        for name, dataMap in self.apps.items():
+            for field in COLLATERAL_FIELDS:
+                digest = dataMap[field]
+                if digest not in decoded:
+                    decoded[digest] = decode_field(field, self.collaterals[digest])
+
+            evidences[name] = ApplicationEvidence.from_dict(
+                dataMap,
+                {field: decoded[dataMap[field]] for field in COLLATERAL_FIELDS},
+            )
+
+        return evidences
+
+    @staticmethod
+    def load(path: Path):
+        """Load the bundle from a json file."""
+        return EvidenceBundle.parse_file(path)
+
+    def save(self, path: Path) -> None:
+        """Save the bundle into a json file."""
+        path.write_text(self.json(indent=4), encoding="utf8")
+
+
+def load_evidences(path: Path) -> Dict[str, ApplicationEvidence]:
+    """Load the evidences of an evidence file or a bundle by application name.
+
+    The evidence of an evidence file is named after the file, or after its
+    directory for an `evidence.json` or `evidence.cbor` file.
+    """
+    name = path.resolve().parent.name if path.stem == "evidence" else path.stem
+
+    if path.suffix == BINARY_SUFFIX:
+        return {name: ApplicationEvidence.load(path)}
+
+    with open(path, encoding="utf8") as f:
+        dataMap = json.load(f)
+
+    if "apps" in dataMap:
+        return EvidenceBundle(**dataMap).evidences()
+
+    return {name: ApplicationEvidence.from_dict(dataMap)}
+
+
+def encode_field(field: str, value: Any, binary: bool = False) -> Union[str, bytes]:
+    """Encode the field of an evidence into its json or binary representation."""
+    if field in ("tcb_info", "qe_identity"):
+        return value if binary else base64.b64encode(value).decode("utf-8")
+
+    encoding = Encoding.DER if binary else Encoding.PEM
+
+    if field == "signer_pk":
+        data = value.public_bytes(
+            encoding=encoding,
+            format=PublicFormat.SubjectPublicKeyInfo,
+        )
+    else:
+        data = value.public_bytes(encoding=encoding)
+
+    return data if binary else data.decode("utf-8")
+
+
+def decode_field(field: str, value: Union[str, bytes]) -> Any:
+    """Decode the field of an evidence from its json or binary representation.
+
+    The binary representation holds raw bytes and DER instead of base64 and PEM.
+    """
+    binary = isinstance(value, bytes)
+    data = value if isinstance(value, bytes) else value.encode("utf-8")
+
+    if field in ("tcb_info", "qe_identity"):
+        return data if binary else base64.b64decode(data)
+
+    if field == "signer_pk":
+        return (load_der_public_key if binary else load_pem_public_key)(data)
+
+    if field in ("root_ca_crl", "pck_platform_crl"):
+        return (load_der_x509_crl if binary else load_pem_x509_crl)(data)
+
+    return (load_der_x509_certificate if binary else load_pem_x509_certificate)(data)
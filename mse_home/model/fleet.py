@@ -0,0 +1,56 @@
+"""mse_home.model.fleet module."""
+
+from pathlib import Path
+from typing import List, Optional
+from uuid import UUID
+
+import toml
+from pydantic import BaseModel, validator
+
+DEFAULT_DAYS = 365
+
+
+class FleetApp(BaseModel):
+    """Definition of an application to spawn in a fleet."""
+
+    name: str
+    host: str
+    port: Optional[int] = None
+    size: int
+    days: int = DEFAULT_DAYS
+
+    # The expiration date of the certificate instead of `days`
+    expiration_date: Optional[int] = None
+
+    # A random ID is generated if None
+    app_id: Optional[UUID] = None
+
+    @validator("size")
+    @classmethod
+    def check_size(cls, v: int):
+        """Check that the enclave size is a power of 2 of at least 1024 MB."""
+        if v < 1024 or v & (v - 1) != 0:
+            raise ValueError("Enclave size should be a power of two greater than 1024")
+        return v
+
+
+class Fleet(BaseModel):
+    """Definition of the applications spawned from the same package."""
+
+    apps: List[FleetApp]
+
+    @validator("apps")
+    @classmethod
+    def check_unique(cls, v: List[FleetApp]):
+        """Check that the names, ports and IDs of the applications are unique."""
+        for field in ("name", "port", "app_id"):
+            values = [getattr(app, field) for app in v if getattr(app, field)]
+            if len(values) != len(set(values)):
+                raise ValueError(f"The application {field}s should be unique")
+        return v
+
+    @staticmethod
+    def load(path: Path):
+        """Load the fleet from a toml file."""
+        with open(path, encoding="utf8") as f:
+            return Fleet(**toml.load(f))
@@ -0,0 +1,88 @@
+"""mse_home.model.manifest module."""
+
+from pathlib import Path
+from typing import List, Optional
+
+from mse_cli_core.no_sgx_docker import NoSgxDockerConfig
+from pydantic import BaseModel
+
+
+class ImageManifest(BaseModel):
+    """Definition of the Docker image shipped in a package."""
+
+    # The image ID
+    id: str
+
+    # The tags of the image, restored when it is loaded
+    tags: List[str] = []
+
+    # The digests of the uncompressed layers (`RootFS.Layers`) of the image
+    layers: List[str]
+
+    # The image containing the layers omitted from the image tarball
+    base_image: Optional[str] = None
+
+    # The digests of the layers the operator should already have
+    omitted_layers: List[str] = []
+
+    @property
+    def is_delta(self) -> bool:
+        """Whether the image tarball omits some layers of the image."""
+        return len(self.omitted_layers) > 0
+
+
+class MemberManifest(BaseModel):
+    """Definition of a member of a package."""
+
+    name: str
+
+    # The offset of the content of the member within the package
+    offset: int
+
+    size: int
+
+    # The SHA-256 of the content of the member
+    sha256: str
+
+
+class EnclaveMeasurement(BaseModel):
+    """Definition of the MRENCLAVE of the image spawned with some arguments."""
+
+    input_args: NoSgxDockerConfig
+
+    mrenclave: str
+
+
+class PackageManifest(BaseModel):
+    """Definition of the content of an MSE package."""
+
+    image: Optional[ImageManifest] = None
+
+    members: List[MemberManifest] = []
+
+    # The MRENCLAVE precomputed for the expected deployments of the image
+    measurements: List[EnclaveMeasurement] = []
+
+    def member(self, name: str) -> Optional[MemberManifest]:
+        """Return the member `name` if the package contains it."""
+        return next((member for member in self.members if member.name == name), None)
+
+    def mrenclave(self, input_args: NoSgxDockerConfig) -> Optional[str]:
+        """Return the MRENCLAVE precomputed for `input_args` if any."""
+        return next(
+            (
+                measurement.mrenclave
+                for measurement in self.measurements
+                if measurement.input_args == input_args
+            ),
+            None,
+        )
+
+    @staticmethod
+    def load(path: Path):
+        """Load the manifest from a json file."""
+        return PackageManifest.parse_file(path)
+
+    def save(self, path: Path) -> None:
+        """Save the manifest into a json file."""
+        path.write_text(self.json(indent=4), encoding="utf8")
@@ -0,0 +1,60 @@
+"""mse_home.model.measurement module."""
+
+from pathlib import Path
+from typing import List, Optional
+from uuid import UUID
+
+import toml
+from mse_cli_core.no_sgx_docker import NoSgxDockerConfig
+from pydantic import BaseModel, validator
+
+
+class Deployment(BaseModel):
+    """Definition of the certificate arguments of an expected deployment."""
+
+    host: str
+    app_id: UUID
+    expiration_date: Optional[int] = None
+
+
+class MeasurementGrid(BaseModel):
+    """Definition of the deployments whose MRENCLAVE is computed in advance.
+
+    Each deployment is measured for every enclave size and application.
+    """
+
+    sizes: List[int]
+
+    # The application entry points, the one of the configuration if empty
+    applications: List[str] = []
+
+    deployments: List[Deployment]
+
+    @validator("sizes", each_item=True)
+    @classmethod
+    def check_size(cls, v: int):
+        """Check that the enclave size is a power of 2 of at least 1024 MB."""
+        if v < 1024 or v & (v - 1) != 0:
+            raise ValueError("Enclave size should be a power of two greater than 1024")
+        return v
+
+    def input_args(self, default_application: str) -> List[NoSgxDockerConfig]:
+        """Return the arguments of the enclaves of the grid."""
+        return [
+            NoSgxDockerConfig(
+                host=deployment.host,
+                expiration_date=deployment.expiration_date,
+                size=size,
+                app_id=deployment.app_id,
+                application=application,
+            )
+            for deployment in self.deployments
+            for size in self.sizes
+            for application in (self.applications or [default_application])
+        ]
+
+    @staticmethod
+    def load(path: Path):
+        """Load the grid from a toml file."""
+        with open(path, encoding="utf8") as f:
+            return MeasurementGrid(**toml.load(f))
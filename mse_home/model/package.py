@@ -1,10 +1,19 @@
 """mse_home.model.package module."""
 
+import hashlib
+import io
+import shutil
 import tarfile
+import time
+from contextlib import contextmanager
 from pathlib import Path
+from typing import BinaryIO, Iterable, Iterator, Optional, Tuple, cast
 
 from pydantic import BaseModel
 
+from mse_home.compression import decompress_file, open_tar
+from mse_home.model.manifest import MemberManifest, PackageManifest
+
 DEFAULT_CODE_DIR = "mse_src"
 DEFAULT_CONFIG_FILENAME = "mse.toml"
 DEFAULT_TEST_DIR = "tests"
@@ -14,9 +23,16 @@ DEFAULT_SEAL_SECRETS_FILENAME = "secrets_to_seal.json"
 
 CODE_TAR_NAME = "app.tar"
 DOCKER_IMAGE_TAR_NAME = "image.tar"
+MANIFEST_NAME = "manifest.json"
 MSE_CONFIG_NAME = "mse.toml"
 TEST_TAR_NAME = "tests.tar"
 
+PACKAGE_MEMBERS = [CODE_TAR_NAME, TEST_TAR_NAME, MSE_CONFIG_NAME, DOCKER_IMAGE_TAR_NAME]
+
+# Room reserved for the manifest at the head of the package
+MANIFEST_SIZE = 64 * 1024
+COPY_SIZE = 1024 * 1024
+
 
 class CodePackage(BaseModel):
     """Definition of a code package."""
@@ -25,22 +41,87 @@ class CodePackage(BaseModel):
     image_tar: Path
     test_tar: Path
     config_path: Path
+    manifest: Optional[PackageManifest] = None
+    # The package to read the members which have not been extracted from
+    path: Optional[Path] = None
 
     def create(
         self,
         output_tar: Path,
     ):
         """Create the package containing the code and Docker image tarballs."""
-        with tarfile.open(output_tar, "w:") as tar_file:
-            tar_file.add(self.code_tar, CODE_TAR_NAME)
-            tar_file.add(self.image_tar, DOCKER_IMAGE_TAR_NAME)
-            tar_file.add(self.test_tar, TEST_TAR_NAME)
-            tar_file.add(self.config_path, MSE_CONFIG_NAME)
+        with PackageWriter(output_tar) as package:
+            package.add(self.code_tar, CODE_TAR_NAME)
+            package.add(self.image_tar, DOCKER_IMAGE_TAR_NAME)
+            package.add(self.test_tar, TEST_TAR_NAME)
+            package.add(self.config_path, MSE_CONFIG_NAME)
+
+            if self.manifest:
+                package.manifest.image = self.manifest.image
+                package.manifest.measurements = self.manifest.measurements
+
+    @staticmethod
+    def extract(workspace: Path, package: Path, names: Optional[Iterable[str]] = None):
+        """Extract the code and image tarballs from the MSE package.
+
+        Only the members `names` are extracted if the package has a manifest:
+        the paths of the other ones are returned but do not exist.
+        The package and its tarballs are decompressed whatever their compression.
+        """
+        manifest = read_manifest(package)
+
+        if manifest is None:
+            return CodePackage._extract_all(workspace, package)
+
+        # Check the whole package before writing anything
+        package_size = package.stat().st_size
+        for name in PACKAGE_MEMBERS:
+            member = manifest.member(name)
+            if member is None:
+                raise Exception(f"'{name}' was not found in the MSE package")
+
+            if member.offset + member.size > package_size:
+                raise Exception(f"'{name}' is truncated in the MSE package")
+
+        with open(package, "rb") as f:
+            for name in PACKAGE_MEMBERS if names is None else names:
+                path = extract_member(
+                    f, cast(MemberManifest, manifest.member(name)), workspace
+                )
+
+                if name != MSE_CONFIG_NAME:
+                    decompress_file(path)
+
+        return CodePackage(
+            code_tar=workspace / CODE_TAR_NAME,
+            image_tar=workspace / DOCKER_IMAGE_TAR_NAME,
+            test_tar=workspace / TEST_TAR_NAME,
+            config_path=workspace / MSE_CONFIG_NAME,
+            manifest=manifest,
+            path=package,
+        )
+
+    @contextmanager
+    def open_image(self) -> Iterator[Tuple[BinaryIO, int]]:
+        """Open the image tarball and yield it with its size.
+
+        The image is read straight from the package if it has not been extracted.
+        Its content is still compressed if it was in the package.
+        """
+        if self.image_tar.exists() or self.manifest is None or self.path is None:
+            with open(self.image_tar, "rb") as f:
+                yield (f, self.image_tar.stat().st_size)
+            return
+
+        member = cast(MemberManifest, self.manifest.member(DOCKER_IMAGE_TAR_NAME))
+        with open(self.path, "rb") as f:
+            f.seek(member.offset)
+            yield (cast(BinaryIO, MemberReader(f, member)), member.size)
 
     @staticmethod
-    def extract(workspace: Path, package: Path):
-        """Extract the code and image tarballs from the MSE package."""
-        with tarfile.open(package, "r") as f:
+    def _extract_all(workspace: Path, package: Path):
+        """Extract the whole MSE package without manifest at its head."""
+        with open_tar(package) as f:
             f.extractall(path=workspace)
 
         code_tar_path = workspace / CODE_TAR_NAME
@@ -62,9 +143,222 @@ class CodePackage(BaseModel):
         if not code_config_path.exists():
             raise Exception(f"'{MSE_CONFIG_NAME}' was not found in the mse package")
 
+        for path in (code_tar_path, image_tar_path, test_tar_path):
+            decompress_file(path)
+
+        # The packages created before the manifest was introduced have none
+        manifest_path = workspace / MANIFEST_NAME
+
         return CodePackage(
             code_tar=code_tar_path,
             image_tar=image_tar_path,
             test_tar=test_tar_path,
             config_path=code_config_path,
+            manifest=PackageManifest.load(manifest_path)
+            if manifest_path.exists()
+            else None,
         )
+
+
+class _MemberStream(io.RawIOBase):
+    """Writable stream appending data to the current member of a tarball."""
+
+    def __init__(self, tar_file: tarfile.TarFile):
+        """Initialize the stream at the current end of `tar_file`."""
+        super().__init__()
+        self.fileobj = cast(BinaryIO, tar_file.fileobj)
+        self.size = 0
+        self.digest = hashlib.sha256()
+
+    def writable(self) -> bool:
+        """Return True since the stream is write-only."""
+        return True
+
+    def write(self, b) -> int:
+        """Write `b` as the next bytes of the member."""
+        n = self.fileobj.write(b)
+        self.digest.update(b)
+        self.size += n
+        return n
+
+    def tell(self) -> int:
+        """Return the number of bytes written so far."""
+        return self.size
+
+
+class PackageWriter:
+    """Write an MSE package member by member without intermediate tarballs.
+
+    Members whose size is unknown beforehand (like a Docker image being exported)
+    are streamed directly into the package: a placeholder header is written first
+    and rewritten with the actual size once the member is complete.
+
+    The manifest indexing the members is the first member of the package: its
+    room is reserved first and it is written once the package is complete.
+    """
+
+    def __init__(self, output_tar: Path):
+        """Open `output_tar` for writing."""
+        # pylint: disable=consider-using-with
+        self.tar_file = tarfile.open(output_tar, "w:")
+        self.manifest = PackageManifest()
+
+        info = tarfile.TarInfo(MANIFEST_NAME)
+        info.mtime = int(time.time())
+        info.mode = 0o644
+        info.size = MANIFEST_SIZE
+        self.tar_file.addfile(info, io.BytesIO(b" " * MANIFEST_SIZE))
+        self.manifest_offset = self.tar_file.offset - MANIFEST_SIZE
+
+    def __enter__(self):
+        """Entrypoint of the `with` statement."""
+        return self
+
+    def __exit__(self, exception_type, exception_value, traceback):
+        """Endpoint of the `with` statement."""
+        self.close()
+
+    def close(self):
+        """Write the manifest and finalize the package."""
+        if self.tar_file.closed:
+            return
+
+        # The JSON document is padded with whitespaces
+        data = self.manifest.json(indent=4).encode("utf-8")
+        if len(data) > MANIFEST_SIZE:
+            raise Exception("The manifest of the package is too large")
+
+        fileobj = cast(BinaryIO, self.tar_file.fileobj)
+        fileobj.seek(self.manifest_offset)
+        fileobj.write(data.ljust(MANIFEST_SIZE, b" "))
+        fileobj.seek(self.tar_file.offset)
+
+        self.tar_file.close()
+
+    def add(self, path: Path, arcname: str):
+        """Copy the file `path` into the package as `arcname`."""
+        with open(path, "rb") as src, self.open(arcname) as f:
+            shutil.copyfileobj(src, f, COPY_SIZE)
+
+    @contextmanager
+    def open(self, arcname: str) -> Iterator[BinaryIO]:
+        """Open the member `arcname` and yield a stream to write its content."""
+        tar_file = self.tar_file
+        fileobj = cast(BinaryIO, tar_file.fileobj)
+
+        info = tarfile.TarInfo(arcname)
+        info.mtime = int(time.time())
+        info.mode = 0o644
+
+        # The GNU header encodes large sizes in base-256 within a single block
+        # so it can be rewritten in place whatever the final size is
+        header_offset = tar_file.offset
+        fileobj.write(self._header(info))
+
+        stream = _MemberStream(tar_file)
+        yield cast(BinaryIO, stream)
+
+        info.size = stream.size
+        self.manifest.members.append(
+            MemberManifest(
+                name=arcname,
+                offset=header_offset + tarfile.BLOCKSIZE,
+                size=stream.size,
+                sha256=stream.digest.hexdigest(),
+            )
+        )
+
+        blocks, remainder = divmod(info.size, tarfile.BLOCKSIZE)
+        if remainder > 0:
+            fileobj.write(tarfile.NUL * (tarfile.BLOCKSIZE - remainder))
+            blocks += 1
+
+        end_offset = header_offset + tarfile.BLOCKSIZE * (blocks + 1)
+        fileobj.seek(header_offset)
+        fileobj.write(self._header(info))
+        fileobj.seek(end_offset)
+
+        tar_file.offset = end_offset
+        tar_file.members.append(info)  # type: ignore[attr-defined]
+
+    def _header(self, info: tarfile.TarInfo) -> bytes:
+        """Serialize the header of a streamed member."""
+        buf = info.tobuf(tarfile.GNU_FORMAT, self.tar_file.encoding, "surrogateescape")
+        if len(buf) != tarfile.BLOCKSIZE:
+            raise Exception(f"Member name '{info.name}' is too long to be streamed")
+        return buf
+
+
+def read_manifest(package: Path) -> Optional[PackageManifest]:
+    """Read the manifest at the head of the MSE package if any."""
+    with open(package, "rb") as f:
+        try:
+            info = tarfile.TarInfo.frombuf(
+                f.read(tarfile.BLOCKSIZE), tarfile.ENCODING, "surrogateescape"
+            )
+        except tarfile.HeaderError:
+            # Not a tarball or a compressed one
+            return None
+
+        if info.name != MANIFEST_NAME or info.size > MANIFEST_SIZE:
+            return None
+
+        return PackageManifest.parse_raw(f.read(info.size))
+
+
+def extract_member(fileobj: BinaryIO, member: MemberManifest, workspace: Path) -> Path:
+    """Extract the `member` of the MSE package `fileobj` into `workspace`.
+
+    The digest of the content is checked against the manifest.
+    """
+    path = workspace / member.name
+
+    fileobj.seek(member.offset)
+    try:
+        with open(path, "wb") as f:
+            shutil.copyfileobj(
+                cast(BinaryIO, MemberReader(fileobj, member)), f, COPY_SIZE
+            )
+    except BaseException as exc:
+        path.unlink()
+        raise exc
+
+    return path
+
+
+class MemberReader(io.RawIOBase):
+    """Readable stream over a member of an MSE package checking its digest.
+
+    The stream of the package should be positioned at the offset of the member.
+    """
+
+    def __init__(self, fileobj: BinaryIO, member: MemberManifest):
+        """Initialize the stream reading `member` from `fileobj`."""
+        super().__init__()
+        self.fileobj = fileobj
+        self.member = member
+        self.remaining = member.size
+        self.digest = hashlib.sha256()
+
+    def readable(self) -> bool:
+        """Return True since the stream is read-only."""
+        return True
+
+    def readinto(self, b) -> int:
+        """Read the next bytes of the member into `b`."""
+        if self.remaining == 0:
+            return 0
+
+        data = self.fileobj.read(min(len(b), self.remaining))
+        if not data:
+            raise Exception(f"'{self.member.name}' is truncated in the MSE package")
+
+        n = len(data)
+        b[:n] = data
+        self.digest.update(data)
+        self.remaining -= n
+
+        if self.remaining == 0 and self.digest.hexdigest() != self.member.sha256:
+            raise Exception(f"'{self.member.name}' is corrupted in the MSE package")
+
+        return n
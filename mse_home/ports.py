@@ -0,0 +1,132 @@
+"""mse_home.ports module."""
+
+import fcntl
+import json
+import os
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional, Set
+
+from docker.client import DockerClient
+
+from mse_home.command.helpers import is_port_free
+
+DEFAULT_STATE_DIR = (
+    Path(os.getenv("XDG_STATE_HOME", Path.home() / ".local" / "state")) / "mse-home"
+)
+
+DEFAULT_PORT_RANGE = (7000, 7999)
+
+# The label of the containers recording their port
+PORT_LABEL = "mse-home-port"
+
+
+class PortPool:
+    """Allocate the ports of the applications within a range.
+
+    The reservations are shared by the processes through a file under an
+    exclusive lock. A reservation is held by the spawning process until the
+    container labelled with the port is created, then by the container until
+    it is removed.
+    """
+
+    def __init__(
+        self,
+        client: DockerClient,
+        start: int = DEFAULT_PORT_RANGE[0],
+        end: int = DEFAULT_PORT_RANGE[1],
+        state_dir: Path = DEFAULT_STATE_DIR,
+    ):
+        """Initialize the pool of the ports from `start` to `end` included."""
+        self.client = client
+        self.start = start
+        self.end = end
+        self.state_path = state_dir / "ports.json"
+        self.lock_path = state_dir / "ports.lock"
+
+    @contextmanager
+    def _state(self) -> Iterator[Dict[str, Dict[str, Any]]]:
+        """Yield the reservations and save them, under the lock."""
+        self.state_path.parent.mkdir(parents=True, exist_ok=True)
+
+        with open(self.lock_path, "w", encoding="utf8") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+
+            state = (
+                json.loads(self.state_path.read_text(encoding="utf8"))
+                if self.state_path.exists()
+                else {}
+            )
+
+            yield state
+
+            tmp_path = self.state_path.with_suffix(".tmp")
+            tmp_path.write_text(json.dumps(state, indent=4), encoding="utf8")
+            os.replace(tmp_path, self.state_path)
+
+    def reserve(self, name: str, port: Optional[int] = None) -> int:
+        """Reserve `port` or the first free port of the range for `name`."""
+        with self._state() as state:
+            self._reclaim(state)
+
+            if port:
+                reservation = state.get(str(port))
+                if reservation and reservation["name"] != name:
+                    raise Exception(
+                        f"Port {port} is already reserved by `{reservation['name']}`!"
+                    )
+
+                if not is_port_free(port):
+                    raise Exception(f"Port {port} is already in-used!")
+            else:
+                port = next(
+                    (
+                        p
+                        for p in range(self.start, self.end + 1)
+                        if str(p) not in state and is_port_free(p)
+                    ),
+                    None,
+                )
+
+                if port is None:
+                    raise Exception(
+                        f"No free port left between {self.start} and {self.end}!"
+                    )
+
+            state[str(port)] = {"name": name, "pid": os.getpid()}
+
+        return port
+
+    def release(self, port: int):
+        """Release the reservation of `port`."""
+        with self._state() as state:
+            state.pop(str(port), None)
+
+    def _reclaim(self, state: Dict[str, Dict[str, Any]]):
+        """Remove the reservations held by no container nor running process."""
+        used_ports = self._labelled_ports()
+
+        for port, reservation in list(state.items()):
+            if port not in used_ports and not is_alive(reservation["pid"]):
+                del state[port]
+
+    def _labelled_ports(self) -> Set[str]:
+        """Return the ports recorded by the labels of the containers."""
+        return {
+            container.labels[PORT_LABEL]
+            for container in self.client.containers.list(
+                all=True, filters={"label": PORT_LABEL}
+            )
+        }
+
+
+def is_alive(pid: int) -> bool:
+    """Check whether the process `pid` is running."""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+
+    return True
@@ -0,0 +1,109 @@
+"""mse_home.readiness module."""
+
+import threading
+import time
+from typing import Callable, Optional
+
+from docker.client import DockerClient
+from docker.errors import NotFound
+
+from mse_home.error import AppContainerNotRunning
+
+# Events of the Docker containers which are not running anymore
+EXIT_EVENTS = ["die", "oom", "destroy"]
+
+# The probes are retried with an exponential backoff between these delays
+INITIAL_DELAY = 0.02
+MAX_DELAY = 2.0
+
+
+class ContainerWatcher:
+    """Watch the Docker events of a container to detect its exit."""
+
+    def __init__(self, client: DockerClient, name: str):
+        """Initialize the watcher of the container `name`."""
+        self.client = client
+        self.name = name
+        self.exited = threading.Event()
+        self.event: Optional[str] = None
+        self.events = None
+        self.thread: Optional[threading.Thread] = None
+
+    def __enter__(self):
+        """Subscribe to the events of the container."""
+        self.events = self.client.events(
+            decode=True,
+            filters={"type": "container", "container": self.name, "event": EXIT_EVENTS},
+        )
+        self.thread = threading.Thread(target=self._watch, daemon=True)
+        self.thread.start()
+
+        # The container may have exited before the subscription
+        try:
+            container = self.client.containers.get(self.name)
+            if container.status not in ("created", "running", "restarting"):
+                self._exit(container.status)
+        except NotFound:
+            self._exit("destroy")
+
+        return self
+
+    def __exit__(self, exception_type, exception_value, traceback):
+        """Unsubscribe from the events of the container."""
+        if self.events is not None:
+            self.events.close()
+
+    def _watch(self):
+        """Wait for an exit event of the container."""
+        try:
+            for event in self.events:  # type: ignore[union-attr]
+                self._exit(event.get("Action", event.get("status")))
+                return
+        except Exception:  # pylint: disable=broad-except
+            # The stream is closed when the watcher is
+            pass
+
+    def _exit(self, event: str):
+        """Record that the container is not running anymore."""
+        self.event = event
+        self.exited.set()
+
+    def wait(self, delay: float) -> bool:
+        """Wait for `delay` seconds or until the container exits."""
+        return self.exited.wait(delay)
+
+
+def wait_for_container(
+    client: DockerClient,
+    name: str,
+    check: Callable[[], bool],
+    timeout: float,
+    message: str,
+    initial_delay: float = INITIAL_DELAY,
+    max_delay: float = MAX_DELAY,
+):
+    """Hold on until `check` succeeds for the running container `name`.
+
+    The check is retried with an exponential backoff and the waiting is aborted
+    as soon as the container exits.
+    """
+    deadline = time.monotonic() + timeout
+    delay = initial_delay
+
+    with ContainerWatcher(client, name) as watcher:
+        while True:
+            if watcher.exited.is_set():
+                raise AppContainerNotRunning(
+                    f"Your application '{name}' is not running ({watcher.event}). "
+                    "Run `msehome logs` for more details"
+                )
+
+            if check():
+                return
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise Exception(message)
+
+            watcher.wait(min(delay, remaining))
+            delay = min(2 * delay, max_delay)
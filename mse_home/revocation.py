@@ -0,0 +1,186 @@
+"""mse_home.revocation module."""
+
+import json
+import threading
+from pathlib import Path
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple, cast
+
+from cryptography.hazmat.primitives.asymmetric.ec import EllipticCurvePublicKey
+from cryptography.hazmat.primitives.hashes import SHA256
+from cryptography.x509 import (
+    Certificate,
+    CertificateRevocationList,
+    CRLNumber,
+    ExtensionNotFound,
+    RevokedCertificate,
+    load_pem_x509_certificate,
+)
+from intel_sgx_ra.error import CertificateError, CertificateRevokedError
+from intel_sgx_ra.ratls import ratls_verify
+
+from mse_home.cache import Cache, cache_key
+from mse_home.log import LOGGER as LOG
+
+# The maximum size of the cache of the revocation index
+REVOCATION_CACHE_SIZE = 16 * 1024 * 1024
+
+
+class RevocationIndex:
+    """Index of the serial numbers revoked by the CRLs of each issuer.
+
+    The serial numbers of a CRL are indexed once per issuer and CRL number,
+    then shared by the verifications of all the evidences carrying that CRL
+    version. Only the CRLs signed by their issuer are indexed.
+    """
+
+    def __init__(self, path: Optional[Path]):
+        """Initialize the index in `path`, or in memory only if None."""
+        self.cache = Cache(path, REVOCATION_CACHE_SIZE) if path else None
+        self.entries: Dict[str, FrozenSet[int]] = {}
+        self.locks: Dict[str, threading.Lock] = {}
+        self.lock = threading.Lock()
+
+    def revoked(
+        self, crl: CertificateRevocationList, issuer: Certificate
+    ) -> FrozenSet[int]:
+        """Return the serial numbers revoked by `crl` of `issuer`."""
+        number = crl_number(crl)
+        if number is None:
+            # A CRL without number can't be told apart from its other versions
+            check_crl_signature(crl, issuer)
+            return frozenset(revoked.serial_number for revoked in crl)
+
+        key = cache_key(issuer.fingerprint(SHA256()), str(number))
+
+        # The concurrent verifications of the same CRL wait for one indexing
+        with self.lock:
+            lock = self.locks.setdefault(key, threading.Lock())
+
+        with lock:
+            serial_numbers = (
+                self.entries[key] if key in self.entries else self._load(key)
+            )
+            if serial_numbers is None:
+                check_crl_signature(crl, issuer)
+
+                LOG.debug("Indexing the CRL %d of %s", number, issuer.subject)
+                serial_numbers = frozenset(revoked.serial_number for revoked in crl)
+                self._save(key, number, serial_numbers)
+
+            self.entries[key] = serial_numbers
+
+            return serial_numbers
+
+    def _load(self, key: str) -> Optional[FrozenSet[int]]:
+        """Load the entry `key` from the disk."""
+        if self.cache is None:
+            return None
+
+        path = self.cache.get(key)
+        if path is None:
+            return None
+
+        try:
+            return load_serial_numbers(json.loads(path.read_text(encoding="utf8")))
+        except (ValueError, KeyError, TypeError) as exc:
+            LOG.debug("Ignoring the corrupted revocation index %s: %s", path, exc)
+            return None
+
+    def _save(self, key: str, number: int, serial_numbers: FrozenSet[int]):
+        """Save the entry `key` on the disk."""
+        if self.cache is None:
+            return
+
+        with self.cache.open(key) as f:
+            f.write(
+                json.dumps(dump_serial_numbers(number, serial_numbers)).encode("utf-8")
+            )
+
+
+class IndexedCRL:
+    """CRL whose revoked serial numbers are looked up in a revocation index.
+
+    The other attributes are the ones of the wrapped CRL.
+    """
+
+    def __init__(self, crl: CertificateRevocationList, serial_numbers: FrozenSet[int]):
+        """Wrap `crl` revoking `serial_numbers`."""
+        self.crl = crl
+        self.serial_numbers = serial_numbers
+
+    def get_revoked_certificate_by_serial_number(
+        self, serial_number: int
+    ) -> Optional[RevokedCertificate]:
+        """Return the revoked certificate `serial_number` if any."""
+        if serial_number not in self.serial_numbers:
+            return None
+
+        return self.crl.get_revoked_certificate_by_serial_number(serial_number)
+
+    def __getattr__(self, name: str) -> Any:
+        """Return the attribute `name` of the wrapped CRL."""
+        return getattr(self.crl, name)
+
+
+def check_revocation(
+    index: RevocationIndex,
+    ratls_certificate: Certificate,
+    root_ca_crl: CertificateRevocationList,
+    pck_ca_crl: CertificateRevocationList,
+) -> Tuple[IndexedCRL, IndexedCRL]:
+    """Check the PCK certification chain of the quote against the CRLs.
+
+    Return the CRLs backed by the index for the verification of the quote.
+    """
+    quote = ratls_verify(ratls_certificate)
+
+    pck_cert, pck_ca_cert, root_ca_cert = [
+        load_pem_x509_certificate(raw_cert) for raw_cert in quote.certs()
+    ]
+
+    root_ca_revoked = index.revoked(root_ca_crl, root_ca_cert)
+    pck_ca_revoked = index.revoked(pck_ca_crl, pck_ca_cert)
+
+    checks: List[Tuple[str, Certificate, FrozenSet[int]]] = [
+        ("Intel Root CA", root_ca_cert, root_ca_revoked),
+        ("Intel PCK CA", pck_ca_cert, root_ca_revoked),
+        ("Intel PCK", pck_cert, pck_ca_revoked),
+    ]
+
+    for name, cert, serial_numbers in checks:
+        if cert.serial_number in serial_numbers:
+            raise CertificateRevokedError(f"{name} certificate revoked")
+
+    return (
+        IndexedCRL(root_ca_crl, root_ca_revoked),
+        IndexedCRL(pck_ca_crl, pck_ca_revoked),
+    )
+
+
+def check_crl_signature(crl: CertificateRevocationList, issuer: Certificate):
+    """Check that `crl` is signed by the Intel SGX CA `issuer`."""
+    issuer_pk = cast(EllipticCurvePublicKey, issuer.public_key())
+
+    if crl.issuer != issuer.subject or not crl.is_signature_valid(issuer_pk):
+        raise CertificateError(f"Invalid CRL signature of {issuer.subject}")
+
+
+def crl_number(crl: CertificateRevocationList) -> Optional[int]:
+    """Return the CRL number of `crl` if any."""
+    try:
+        return crl.extensions.get_extension_for_class(CRLNumber).value.crl_number
+    except ExtensionNotFound:
+        return None
+
+
+def dump_serial_numbers(number: int, serial_numbers: FrozenSet[int]) -> Dict[str, Any]:
+    """Serialize the serial numbers revoked by the CRL `number`."""
+    return {
+        "crl_number": number,
+        "serial_numbers": [f"{serial:x}" for serial in sorted(serial_numbers)],
+    }
+
+
+def load_serial_numbers(data: Dict[str, Any]) -> FrozenSet[int]:
+    """Deserialize the revoked serial numbers."""
+    return frozenset(int(serial, 16) for serial in data["serial_numbers"])
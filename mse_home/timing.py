@@ -0,0 +1,100 @@
+"""mse_home.timing module."""
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+from mse_home.log import LOGGER as LOG
+
+# The OpenMetrics family of the durations of the phases
+METRIC_NAME = "mse_home_phase_duration_seconds"
+
+
+class Timer:
+    """Record the duration of the phases of a command.
+
+    The spans can be recorded concurrently by several threads.
+    """
+
+    def __init__(self, command: str):
+        """Initialize the timer of `command`."""
+        self.command = command
+        self.spans: List[Dict[str, Any]] = []
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def span(self, phase: str, app: Optional[str] = None) -> Iterator[None]:
+        """Record the duration of the phase within the context."""
+        timestamp = time.time()
+        start = time.perf_counter()
+        status = "failed"
+
+        try:
+            yield
+            status = "ok"
+        finally:
+            duration = time.perf_counter() - start
+            LOG.debug("Phase %s of %s took %.3fs", phase, app or self.command, duration)
+
+            with self.lock:
+                self.spans.append(
+                    {
+                        "command": self.command,
+                        "app": app,
+                        "phase": phase,
+                        "status": status,
+                        "timestamp": round(timestamp, 3),
+                        "duration": round(duration, 6),
+                    }
+                )
+
+    def save_jsonl(self, path: Path):
+        """Append the spans to a JSON lines file."""
+        with open(path, "a", encoding="utf8") as f:
+            for span in self.spans:
+                f.write(json.dumps(span) + "\n")
+
+    def save_openmetrics(self, path: Path):
+        """Write the spans into an OpenMetrics text file.
+
+        The file is replaced atomically to be scraped at any time.
+        """
+        lines = [
+            f"# TYPE {METRIC_NAME} gauge",
+            f"# UNIT {METRIC_NAME} seconds",
+            f"# HELP {METRIC_NAME} Duration of the phases of the msehome commands.",
+        ]
+
+        for span in self.spans:
+            labels = ",".join(
+                f'{name}="{escape(span[name] or "")}"'
+                for name in ("command", "app", "phase", "status")
+            )
+            lines.append(
+                f"{METRIC_NAME}{{{labels}}} {span['duration']} {span['timestamp']}"
+            )
+
+        lines.append("# EOF")
+
+        tmp_path = path.with_name(f".{path.name}.tmp")
+        tmp_path.write_text("\n".join(lines) + "\n", encoding="utf8")
+        os.replace(tmp_path, path)
+
+    def report(self, jsonl_path: Optional[Path], openmetrics_path: Optional[Path]):
+        """Save the spans into the requested reports."""
+        if jsonl_path:
+            self.save_jsonl(jsonl_path)
+            LOG.info("The timing report has been saved at: %s", jsonl_path)
+
+        if openmetrics_path:
+            self.save_openmetrics(openmetrics_path)
+            LOG.info("The timing metrics have been saved at: %s", openmetrics_path)
+
+
+def escape(value: str) -> str:
+    """Escape a label value of OpenMetrics."""
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
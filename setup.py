@@ -46,6 +46,10 @@ setup(
         "requests>=2.31.0,<3.0.0",
         "toml>=0.10.2,<0.11.0",
     ],
+    extras_require={
+        "zstd": ["zstandard>=0.21.0,<0.22.0"],
+        "cbor": ["cbor2>=5.4.0,<7.0.0"],
+    },
     entry_points={
         "console_scripts": ["msehome = mse_home.main:main"],
     },
@@ -0,0 +1,81 @@
+"""Test cache.py."""
+
+import os
+from pathlib import Path
+
+import pytest
+
+from mse_home.cache import Cache, cache_key, hash_directory
+
+
+def test_cache(workspace: Path):
+    """Test `Cache` get, open and put methods."""
+    cache = Cache(workspace / "cache", max_size=1024)
+
+    assert cache.get("a") is None
+
+    with cache.open("a") as f:
+        f.write(b"content of a")
+
+    assert cache.get("a").read_bytes() == b"content of a"
+
+    path = workspace / "file_b"
+    path.write_bytes(b"content of b")
+    assert cache.put("b", path) == cache.path / "b"
+    assert not path.exists()
+    assert cache.get("b").read_bytes() == b"content of b"
+
+    with pytest.raises(ValueError):
+        with cache.open("c") as f:
+            f.write(b"partial")
+            raise ValueError("error while writing")
+
+    assert cache.get("c") is None
+    assert sorted(path.name for path in cache.path.iterdir()) == ["a", "b"]
+
+
+def test_cache_eviction(workspace: Path):
+    """Test the LRU eviction of `Cache`."""
+    cache = Cache(workspace / "cache_eviction", max_size=250)
+
+    for i, key in enumerate(["a", "b"]):
+        with cache.open(key) as f:
+            f.write(b"0" * 100)
+        os.utime(cache.path / key, (i, i))
+
+    # Reading `a` makes `b` the least recently used entry
+    assert cache.get("a")
+
+    with cache.open("c") as f:
+        f.write(b"0" * 100)
+
+    assert cache.get("b") is None
+    assert cache.get("a")
+    assert cache.get("c")
+
+
+def test_hash_directory(workspace: Path):
+    """Test `hash_directory` function."""
+    code = workspace / "hash_code"
+    code.mkdir()
+    (code / "app.py").write_text("print('app')")
+    (code / "app.pyc").write_bytes(b"\x00")
+
+    digest = hash_directory(code, ["*.pyc"])
+
+    # Ignored files do not change the digest
+    (code / "app.pyc").write_bytes(b"\x01")
+    assert hash_directory(code, ["*.pyc"]) == digest
+
+    (code / "app.py").write_text("print('app v2')")
+    assert hash_directory(code, ["*.pyc"]) != digest
+
+    (code / "app.py").write_text("print('app')")
+    assert hash_directory(code, ["*.pyc"]) == digest
+
+
+def test_cache_key():
+    """Test `cache_key` function."""
+    assert cache_key("image", "sha256:1") == cache_key("image", b"sha256:1")
+    assert cache_key("image", "sha256:1") != cache_key("image", "sha256:2")
+    assert cache_key("ab", "c") != cache_key("a", "bc")
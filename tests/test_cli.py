@@ -1,6 +1,7 @@
 """Test command/*.py."""
 import base64
 import io
+import json
 import os
 import re
 import time
@@ -111,6 +112,15 @@ def test_package(workspace: Path, cmd_log: io.StringIO):
                 "dockerfile": pytest.app_path / "Dockerfile",
                 "test": pytest.app_path / "tests",
                 "encrypt": True,
+                "jobs": 1,
+                "cache_dir": workspace / "cache",
+                "cache_size": 20480,
+                "no_cache": False,
+                "compression": "none",
+                "compression_level": None,
+                "compression_threads": 1,
+                "base_image": None,
+                "measure": None,
                 "output": workspace,
             }
         )
@@ -148,6 +158,15 @@ def test_package_project(workspace: Path, cmd_log: io.StringIO):
                 "dockerfile": None,
                 "test": None,
                 "encrypt": True,
+                "jobs": 1,
+                "cache_dir": workspace / "cache",
+                "cache_size": 20480,
+                "no_cache": False,
+                "compression": "none",
+                "compression_level": None,
+                "compression_threads": 1,
+                "base_image": None,
+                "measure": None,
                 "output": workspace,
             }
         )
@@ -194,8 +213,17 @@ def test_spawn(
                 "package": pytest.package_path,
                 "host": host,
                 "days": 2,
+                "expiration": None,
+                "app_id": None,
                 "port": port,
                 "size": 4096,
+                "batch": None,
+                "port_range": (7000, 7999),
+                "cache_dir": workspace / "cache",
+                "no_cache": False,
+                "timing": None,
+                "timing_openmetrics": None,
+                "jobs": 4,
                 "timeout": 5,
                 "signer_key": signer_key,
                 "output": workspace,
@@ -267,6 +295,13 @@ def test_evidence(workspace: Path, cmd_log: io.StringIO, app_name: str, pccs_url
                 "name": app_name,
                 "pccs": pccs_url,
                 "output": workspace,
+                "cache_dir": workspace / "cache",
+                "no_cache": False,
+                "all": False,
+                "label": [],
+                "bundle": False,
+                "binary": False,
+                "jobs": 8,
             }
         )
     )
@@ -285,6 +320,38 @@ def test_evidence(workspace: Path, cmd_log: io.StringIO, app_name: str, pccs_url
     assert pytest.evidence_path.exists()
 
 
+@pytest.mark.slow
+@pytest.mark.incremental
+def test_evidence_all(workspace: Path, app_name: str, pccs_url: str):
+    """Test the `evidence` subcommand for all the applications."""
+    output = workspace / "evidences"
+    output.mkdir()
+
+    do_evidence(
+        Namespace(
+            **{
+                "name": None,
+                "pccs": pccs_url,
+                "output": output,
+                "cache_dir": workspace / "cache",
+                "no_cache": False,
+                "all": True,
+                "label": [],
+                "bundle": False,
+                "binary": False,
+                "jobs": 8,
+            }
+        )
+    )
+
+    index = json.loads((output / "evidence_index.json").read_text())
+    entry = next(entry for entry in index if entry["name"] == app_name)
+
+    assert entry["status"] == "ok"
+    assert (output / entry["evidence"]).exists()
+    assert (output / entry["ratls_certificate"]).exists()
+
+
 @pytest.mark.slow
 @pytest.mark.incremental
 def test_verify(workspace: Path, cmd_log: io.StringIO):
@@ -294,7 +361,12 @@ def test_verify(workspace: Path, cmd_log: io.StringIO):
             **{
                 "package": pytest.package_path,
                 "evidence": pytest.evidence_path,
+                "evidence_dir": None,
+                "app": None,
+                "jobs": 2,
                 "output": workspace,
+                "cache_dir": workspace / "cache",
+                "no_cache": False,
             }
         )
     )
@@ -316,6 +388,36 @@ def test_verify(workspace: Path, cmd_log: io.StringIO):
     assert pytest.ratls_cert.exists()
 
 
+@pytest.mark.slow
+@pytest.mark.incremental
+def test_verify_dir(workspace: Path, app_name: str):
+    """Test the `verify` subcommand on the evidences of all the applications."""
+    output = workspace / "verified"
+    output.mkdir()
+
+    do_verify(
+        Namespace(
+            **{
+                "package": pytest.package_path,
+                "evidence": None,
+                "evidence_dir": workspace / "evidences",
+                "app": None,
+                "jobs": 2,
+                "output": output,
+                "cache_dir": workspace / "cache",
+                "no_cache": False,
+            }
+        )
+    )
+
+    report = json.loads((output / "verify_report.json").read_text())
+    result = next(result for result in report["results"] if result["name"] == app_name)
+
+    assert report["failed"] == 0
+    assert result["status"] == "passed"
+    assert (output / result["ratls_certificate"]).exists()
+
+
 @pytest.mark.slow
 @pytest.mark.incremental
 def test_seal(workspace: Path, cmd_log: io.StringIO):
@@ -356,6 +458,8 @@ def test_run(cmd_log: io.StringIO, app_name: str):
                 "timeout": 5,
                 "secrets": pytest.app_path / "secrets.json",
                 "sealed_secrets": pytest.sealed_secrets,
+                "timing": None,
+                "timing_openmetrics": None,
             }
         )
     )
@@ -373,6 +477,7 @@ def test_test(app_name: str):
                 "name": app_name,
                 "test": pytest.app_path / "tests",
                 "config": pytest.app_path / "mse.toml",
+                "package": None,
             }
         )
     )
@@ -598,6 +703,15 @@ def test_plaintext(
                 "dockerfile": pytest.app_path / "Dockerfile",
                 "test": pytest.app_path / "tests",
                 "encrypt": False,  # We do not encrypt here
+                "jobs": 2,
+                "cache_dir": workspace / "cache",
+                "cache_size": 20480,
+                "no_cache": False,
+                "compression": "gzip",
+                "compression_level": None,
+                "compression_threads": 2,
+                "base_image": None,
+                "measure": None,
                 "output": workspace,
             }
         )
@@ -626,10 +740,19 @@ def test_plaintext(
                 "package": pytest.package_path,
                 "host": host,
                 "days": 2,
+                "expiration": None,
+                "app_id": None,
                 # We use `port2` because we do not manage when
                 # docker releases the free previous port
                 "port": port2,
                 "size": 4096,
+                "batch": None,
+                "port_range": (7000, 7999),
+                "cache_dir": workspace / "cache",
+                "no_cache": False,
+                "timing": None,
+                "timing_openmetrics": None,
+                "jobs": 4,
                 "timeout": 5,
                 "signer_key": signer_key,
                 "pccs": pccs_url,
@@ -659,6 +782,8 @@ def test_plaintext(
                 "timeout": 5,
                 "secrets": None,
                 "sealed_secrets": None,
+                "timing": None,
+                "timing_openmetrics": None,
             }
         )
     )
@@ -671,6 +796,7 @@ def test_plaintext(
                 "name": app_name,
                 "test": pytest.app_path / "tests",
                 "config": pytest.app_path / "mse.toml",
+                "package": None,
             }
         )
     )
@@ -704,6 +830,15 @@ def test_plaintext_project(
                 "dockerfile": None,
                 "test": None,
                 "encrypt": False,  # We do not encrypt here
+                "jobs": 1,
+                "cache_dir": workspace / "cache",
+                "cache_size": 20480,
+                "no_cache": False,
+                "compression": "none",
+                "compression_level": None,
+                "compression_threads": 1,
+                "base_image": None,
+                "measure": None,
                 "output": workspace,
             }
         )
@@ -733,11 +868,20 @@ def test_plaintext_project(
                 "package": pytest.package_path,
                 "host": host,
                 "days": 2,
+                "expiration": None,
+                "app_id": None,
                 # We use `port3` because we do not manage when
                 # docker releases the free previous port
                 "port": port3,
                 "timeout": 5,
                 "size": 4096,
+                "batch": None,
+                "port_range": (7000, 7999),
+                "cache_dir": workspace / "cache",
+                "no_cache": False,
+                "timing": None,
+                "timing_openmetrics": None,
+                "jobs": 4,
                 "signer_key": signer_key,
                 "output": workspace,
             }
@@ -765,6 +909,8 @@ def test_plaintext_project(
                 "timeout": 5,
                 "secrets": None,
                 "sealed_secrets": None,
+                "timing": None,
+                "timing_openmetrics": None,
             }
         )
     )
@@ -777,6 +923,7 @@ def test_plaintext_project(
                 "name": app_name,
                 "test": pytest.app_path / "tests",
                 "config": pytest.app_path / "mse.toml",
+                "package": None,
             }
         )
     )
@@ -0,0 +1,137 @@
+"""Test collaterals.py."""
+
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pytest
+from cryptography.x509 import load_pem_x509_certificate
+from intel_sgx_ra import pccs
+from intel_sgx_ra.error import CertificateError
+from intel_sgx_ra.ratls import ratls_verify
+
+from mse_home import collaterals
+from mse_home.collaterals import CollateralCache, fetch_collaterals, next_update
+from mse_home.model.evidence import ApplicationEvidence
+
+
+def test_next_update():
+    """Test the earliest next update of the collaterals."""
+    evidence = ApplicationEvidence.load(Path(__file__).parent / "data/evidence.json")
+
+    # The PCK CA CRL expires before the TCB info, the QE identity and the root CRL
+    assert next_update(evidence.collaterals) == evidence.pck_platform_crl.next_update
+
+
+def test_collateral_cache(workspace, monkeypatch):
+    """Test retrieving the collaterals once until their next update."""
+    evidence = ApplicationEvidence.load(Path(__file__).parent / "data/evidence.json")
+    quote = ratls_verify(evidence.ratls_certificate)
+
+    fetches = []
+
+    def fetch(_quote, pccs_url):
+        fetches.append(pccs_url)
+        return evidence.collaterals
+
+    monkeypatch.setattr(collaterals, "fetch_collaterals", fetch)
+
+    expiration = next_update(evidence.collaterals)
+    now = expiration - timedelta(days=1)
+
+    cache = CollateralCache(workspace / "collaterals", lambda: now)
+
+    threads = [
+        threading.Thread(target=cache.retrieve, args=(quote, "https://pccs"))
+        for _ in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert fetches == ["https://pccs"]
+
+    # Another process reuses the collaterals stored on the disk
+    cached = CollateralCache(workspace / "collaterals", lambda: now).retrieve(
+        quote, "https://pccs"
+    )
+    assert fetches == ["https://pccs"]
+    assert cached[0] == evidence.tcb_info
+    assert cached[4] == evidence.pck_platform_crl
+
+    # The collaterals are fetched again from another PCCS or once expired
+    cache.retrieve(quote, "https://other-pccs")
+    assert fetches == ["https://pccs", "https://other-pccs"]
+
+    now = expiration + timedelta(seconds=1)
+    cache.retrieve(quote, "https://pccs")
+    assert fetches == ["https://pccs", "https://other-pccs", "https://pccs"]
+
+
+def test_collateral_cache_expired(workspace, monkeypatch):
+    """Test that expired collaterals are not cached."""
+    evidence = ApplicationEvidence.load(Path(__file__).parent / "data/evidence.json")
+    quote = ratls_verify(evidence.ratls_certificate)
+
+    fetches = []
+
+    def fetch(_quote, pccs_url):
+        fetches.append(pccs_url)
+        return evidence.collaterals
+
+    monkeypatch.setattr(collaterals, "fetch_collaterals", fetch)
+
+    cache = CollateralCache(workspace / "collaterals_expired", datetime.utcnow)
+    cache.retrieve(quote, "https://pccs")
+    cache.retrieve(quote, "https://pccs")
+
+    assert len(fetches) == 2
+    assert not any((workspace / "collaterals_expired").iterdir())
+
+
+def test_fetch_collaterals(monkeypatch):
+    """Test fetching the collaterals concurrently."""
+    evidence = ApplicationEvidence.load(Path(__file__).parent / "data/evidence.json")
+    quote = ratls_verify(evidence.ratls_certificate)
+    _, pck_ca_cert, root_ca_cert = [
+        load_pem_x509_certificate(raw_cert) for raw_cert in quote.certs()
+    ]
+
+    def respond(result):
+        def get(*_args):
+            time.sleep(0.2)
+            return result
+
+        return get
+
+    monkeypatch.setattr(pccs, "get_root_ca_crl", respond(evidence.root_ca_crl))
+    monkeypatch.setattr(
+        pccs,
+        "get_pck_cert_crl",
+        respond((root_ca_cert, pck_ca_cert, evidence.pck_platform_crl)),
+    )
+    monkeypatch.setattr(
+        pccs,
+        "get_tcbinfo",
+        respond((evidence.tcb_info, root_ca_cert, evidence.tcb_cert)),
+    )
+    monkeypatch.setattr(
+        pccs,
+        "get_qe_identity",
+        respond((evidence.qe_identity, root_ca_cert, evidence.tcb_cert)),
+    )
+
+    start = time.monotonic()
+    assert fetch_collaterals(quote, "https://pccs") == evidence.collaterals
+    assert time.monotonic() - start < 0.6
+
+    monkeypatch.setattr(
+        pccs,
+        "get_qe_identity",
+        respond((evidence.qe_identity, root_ca_cert, root_ca_cert)),
+    )
+
+    with pytest.raises(CertificateError, match="TCB signing certificate"):
+        fetch_collaterals(quote, "https://pccs")
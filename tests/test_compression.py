@@ -0,0 +1,107 @@
+"""Test compression.py."""
+
+import gzip
+import io
+import os
+import tarfile
+from pathlib import Path
+
+import pytest
+
+from mse_home.compression import (
+    GZIP,
+    GZIP_BLOCK_SIZE,
+    NONE,
+    ZSTD,
+    Compression,
+    decompress,
+    decompress_file,
+    detect,
+    open_tar,
+)
+
+
+@pytest.mark.parametrize("threads", [1, 4])
+def test_gzip(threads: int):
+    """Test the gzip compression by blocks."""
+    data = os.urandom(GZIP_BLOCK_SIZE // 2) * 5
+
+    output = io.BytesIO()
+    with Compression(algorithm=GZIP, level=1, threads=threads).open(output) as f:
+        # Writes not aligned on the blocks
+        for i in range(0, len(data), 100_000):
+            f.write(data[i : i + 100_000])
+
+    assert gzip.decompress(output.getvalue()) == data
+
+    output.seek(0)
+    assert detect(output) == GZIP
+    with decompress(output) as f:
+        assert f.read() == data
+
+
+def test_gzip_empty():
+    """Test the gzip compression of no data."""
+    output = io.BytesIO()
+    with Compression(algorithm=GZIP).open(output):
+        pass
+
+    assert gzip.decompress(output.getvalue()) == b""
+
+
+def test_zstd():
+    """Test the zstd compression."""
+    pytest.importorskip("zstandard")
+
+    data = os.urandom(1000) * 1000
+
+    output = io.BytesIO()
+    with Compression(algorithm=ZSTD, threads=2).open(output) as f:
+        f.write(data)
+
+    output.seek(0)
+    assert detect(output) == ZSTD
+    with decompress(output) as f:
+        assert f.read() == data
+
+
+def test_none():
+    """Test no compression."""
+    output = io.BytesIO()
+    with Compression().open(output) as f:
+        f.write(b"data")
+
+    output.seek(0)
+    assert output.getvalue() == b"data"
+    assert detect(output) == NONE
+
+
+def test_decompress_file(workspace: Path):
+    """Test `decompress_file`."""
+    output_dir = workspace / "decompress_file"
+    output_dir.mkdir()
+    path = output_dir / "file.tar"
+
+    path.write_bytes(b"data")
+    assert not decompress_file(path)
+    assert path.read_bytes() == b"data"
+
+    path.write_bytes(gzip.compress(b"data"))
+    assert decompress_file(path)
+    assert path.read_bytes() == b"data"
+    assert list(output_dir.iterdir()) == [path]
+
+
+def test_open_tar(workspace: Path):
+    """Test `open_tar` with a compressed tarball."""
+    (workspace / "file").write_bytes(b"data")
+
+    tar_path = workspace / "file.tar.gz"
+    with open(tar_path, "wb") as f, Compression(algorithm=GZIP).open(f) as output:
+        with tarfile.open(fileobj=output, mode="w:") as tar_file:
+            tar_file.add(workspace / "file", "file")
+
+    with open_tar(tar_path) as tar_file:
+        tar_file.extractall(workspace / "extract")
+
+    assert (workspace / "extract" / "file").read_bytes() == b"data"
@@ -0,0 +1,123 @@
+"""Test crypto.py."""
+
+import tarfile
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from mse_cli_core.fs import tar as tar_mirror
+from mse_cli_core.fs import whitelist
+from mse_lib_crypto.xsalsa20_poly1305 import decrypt, encrypt_directory, random_key
+from test_fs import create_tree
+
+import mse_home.crypto
+from mse_home.crypto import CHUNK_SIZE, chunks, encrypt_tar
+
+
+def check_encrypted_tar(code: Path, tar_path: Path, key: bytes, nonces):
+    """Check the content of the encrypted tarball of `code`."""
+    with tarfile.open(tar_path) as tar_file:
+        for member in tar_file.getmembers():
+            content = tar_file.extractfile(member).read()
+
+            if member.name == "requirements.txt":
+                assert content == (code / member.name).read_bytes()
+                continue
+
+            name = member.name[: -len(".enc")]
+            assert content[:24] == nonces[name]
+            assert decrypt(content, key) == (code / name).read_bytes()
+
+
+def test_encrypt_tar(workspace: Path):
+    """Test `encrypt_tar` function."""
+    code = create_tree(workspace / "encrypt_code")
+    patterns = ["*.pyc", "__pycache__"]
+    key = random_key()
+
+    encrypted_path = workspace / "encrypt_mirror"
+    expected_nonces = encrypt_directory(
+        dir_path=code,
+        pattern="*",
+        key=key,
+        nonces=None,
+        exceptions=whitelist(),
+        ignore_patterns=patterns,
+        out_dir_path=encrypted_path,
+    )
+    expected_tar = workspace / "encrypt_expected.tar"
+    tar_mirror(dir_path=encrypted_path, tar_path=expected_tar)
+
+    output_tar = workspace / "encrypt_output.tar"
+    with open(output_tar, "wb") as f:
+        nonces = encrypt_tar(code, f, key, whitelist(), patterns)
+
+    with tarfile.open(expected_tar) as expected, tarfile.open(output_tar) as output:
+        assert output.getnames() == expected.getnames()
+
+    # Hidden files are encrypted but not archived by `encrypt_directory`
+    assert set(nonces) == {name for name in expected_nonces if not name.startswith(".")}
+    check_encrypted_tar(code, output_tar, key, nonces)
+
+
+def test_encrypt_tar_executor(workspace: Path):
+    """Test `encrypt_tar` function with worker processes."""
+    code = create_tree(workspace / "encrypt_code_executor")
+    key = random_key()
+
+    output_tar = workspace / "encrypt_output_executor.tar"
+    with open(output_tar, "wb") as f, ProcessPoolExecutor(max_workers=2) as executor:
+        nonces = encrypt_tar(code, f, key, whitelist(), ["*.pyc"], executor)
+
+    check_encrypted_tar(code, output_tar, key, nonces)
+
+
+def test_chunks(workspace: Path):
+    """Test `chunks` function."""
+    paths = []
+    for i in range(5):
+        path = workspace / f"chunk_{i}"
+        path.write_bytes(b"0" * 10)
+        paths.append((path, path.name, True))
+
+    assert [(len(chunk), size) for chunk, size in chunks(paths, chunk_size=25)] == [
+        (3, 30),
+        (2, 20),
+    ]
+
+    # A file larger than a chunk is alone in its chunk
+    large = workspace / "chunk_large"
+    large.write_bytes(b"0" * 30)
+    paths.insert(1, (large, large.name, True))
+
+    assert [len(chunk) for chunk, _ in chunks(paths, chunk_size=25)] == [1, 1, 3, 1]
+
+
+def test_encrypt_tar_pending(workspace: Path, monkeypatch):
+    """Test writing each chunk as soon as it is encrypted without workers."""
+    code = workspace / "encrypt_code_pending"
+    code.mkdir()
+    (code / "small.py").write_bytes(b"0" * 10)
+    for i in range(3):
+        (code / f"large_{i}.bin").write_bytes(b"0" * CHUNK_SIZE)
+
+    output_tar = workspace / "encrypt_output_pending.tar"
+    with open(output_tar, "wb") as f:
+        encrypt_files = mse_home.crypto.encrypt_files
+        encrypted = []
+        pending = []
+
+        def encrypt_and_count(paths, key, nonces):
+            ciphertexts = encrypt_files(paths, key, nonces)
+            encrypted.extend(ciphertexts)
+            # The ciphertexts not written yet, the tarball headers aside
+            pending.append(sum(map(len, encrypted)) - f.tell())
+            return ciphertexts
+
+        monkeypatch.setattr(mse_home.crypto, "encrypt_files", encrypt_and_count)
+
+        key = random_key()
+        nonces = encrypt_tar(code, f, key, whitelist(), [])
+
+    assert len(pending) == 4
+    assert max(pending) <= CHUNK_SIZE + 40
+    check_encrypted_tar(code, output_tar, key, nonces)
@@ -0,0 +1,136 @@
+"""Test enclave.py."""
+
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+from mse_cli_core import enclave
+from mse_cli_core.no_sgx_docker import NoSgxDockerConfig
+
+import mse_home.enclave
+from mse_home.cache import Cache
+from mse_home.enclave import EnclaveMeasurer
+from mse_home.model.manifest import EnclaveMeasurement, ImageManifest, PackageManifest
+from mse_home.model.package import CodePackage
+
+MRENCLAVE = "a" * 64
+
+INPUT_ARGS = NoSgxDockerConfig(
+    host="localhost",
+    expiration_date=1714058115,
+    size=4096,
+    app_id="63322f85-1ff8-4483-91ae-f18d7398d157",
+    application="app:app",
+)
+
+
+class FakeImages:
+    """Images of the fake Docker client."""
+
+    def get(self, name):
+        """Get the image `name`."""
+        return SimpleNamespace(id=f"sha256:{name}")
+
+
+class FakeDockerClient:
+    """Docker client without any daemon."""
+
+    def __init__(self):
+        """Initialize the images."""
+        self.images = FakeImages()
+
+
+@pytest.fixture(name="measurements")
+def fixture_measurements(monkeypatch):
+    """Measure the enclaves without Docker and record their arguments."""
+    measurements = []
+    clients = []
+
+    def measure(_client, image, app_args, _app_path, _docker_path_log):
+        measurements.append((image, app_args.size))
+        return MRENCLAVE
+
+    def get_client_docker():
+        clients.append(FakeDockerClient())
+        return clients[-1]
+
+    monkeypatch.setattr(enclave, "compute_mr_enclave", measure)
+    monkeypatch.setattr(mse_home.enclave, "get_client_docker", get_client_docker)
+    monkeypatch.setattr(
+        mse_home.enclave, "load_package_image", lambda _client, _package: "image"
+    )
+
+    return SimpleNamespace(measurements=measurements, clients=clients)
+
+
+def code_package(manifest=None) -> CodePackage:
+    """Build a package whose image is never extracted."""
+    return CodePackage(
+        code_tar=Path("app.tar"),
+        image_tar=Path("image.tar"),
+        test_tar=Path("tests.tar"),
+        config_path=Path("mse.toml"),
+        manifest=manifest,
+    )
+
+
+def test_measure(workspace, measurements):
+    """Test reusing the MRENCLAVE of the same image and arguments."""
+    cache = Cache(workspace / "mrenclave", 1024 * 1024)
+
+    for _ in range(2):
+        measurer = EnclaveMeasurer(code_package(), workspace, workspace, cache)
+        assert measurer.measure(INPUT_ARGS) == MRENCLAVE
+
+    assert measurements.measurements == [("image", 4096)]
+
+    # Other arguments are measured again
+    measurer.measure(INPUT_ARGS.copy(update={"size": 8192}))
+    assert measurements.measurements == [("image", 4096), ("image", 8192)]
+
+    # Without cache the image is always measured
+    EnclaveMeasurer(code_package(), workspace, workspace).measure(INPUT_ARGS)
+    assert len(measurements.measurements) == 3
+
+
+def test_measure_manifest(workspace, measurements):
+    """Test rejecting a package whose image is not the one of its manifest."""
+    cache = Cache(workspace / "mrenclave_manifest", 1024 * 1024)
+
+    # The fake Docker client reports the ID `sha256:image`
+    package = code_package(
+        PackageManifest(image=ImageManifest(id="sha256:genuine", layers=[]))
+    )
+
+    with pytest.raises(Exception):
+        EnclaveMeasurer(package, workspace, workspace, cache).measure(INPUT_ARGS)
+
+    # Nothing has been measured nor stored under the ID of the manifest
+    assert not measurements.measurements
+    assert not list((workspace / "mrenclave_manifest").iterdir())
+
+    package = code_package(
+        PackageManifest(image=ImageManifest(id="sha256:image", layers=[]))
+    )
+    EnclaveMeasurer(package, workspace, workspace, cache).measure(INPUT_ARGS)
+    assert measurements.measurements == [("image", 4096)]
+
+
+def test_measure_precomputed(workspace, measurements):
+    """Test reusing the MRENCLAVE precomputed in the package manifest."""
+    package = code_package(
+        PackageManifest(
+            image=ImageManifest(id="sha256:image", layers=[]),
+            measurements=[
+                EnclaveMeasurement(input_args=INPUT_ARGS, mrenclave="b" * 64)
+            ],
+        )
+    )
+
+    measurer = EnclaveMeasurer(package, workspace, workspace)
+    assert measurer.measure(INPUT_ARGS) == "b" * 64
+    assert not measurements.clients
+
+    # The deployments outside of the grid are measured
+    assert measurer.measure(INPUT_ARGS.copy(update={"size": 8192})) == MRENCLAVE
+    assert measurements.measurements == [("image", 8192)]
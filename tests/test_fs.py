@@ -0,0 +1,85 @@
+"""Test fs.py."""
+
+import io
+import os
+import shutil
+from pathlib import Path
+
+from mse_cli_core.fs import ls as ls_mirror
+from mse_cli_core.fs import tar as tar_mirror
+
+from mse_home.fs import ChunksReader, ls, tar
+
+
+def create_tree(path: Path) -> Path:
+    """Create a code directory with files to ignore."""
+    (path / "pkg" / "__pycache__").mkdir(parents=True)
+    (path / "pkg" / "sub").mkdir()
+    (path / ".git").mkdir()
+    (path / "data.txt").mkdir()
+
+    (path / ".mseignore").write_text("# comment\n*.pyc\n__pycache__\ndata.txt\n")
+    (path / "app.py").write_text("print('app')")
+    (path / "app.pyc").write_bytes(b"\x00")
+    (path / "requirements.txt").write_text("flask")
+    (path / ".env").write_text("SECRET=1")
+    (path / ".git" / "HEAD").write_text("ref")
+    (path / "data.txt" / "ignored.csv").write_text("a,b")
+    (path / "pkg" / "__init__.py").write_text("")
+    (path / "pkg" / "__pycache__" / "mod.cpython.pyc").write_bytes(b"\x01")
+    (path / "pkg" / "sub" / "mod.py").write_text("x = 1" * 1000)
+    (path / "pkg.py").write_text("y = 2")
+    (path / "run.sh").write_text("#!/bin/sh")
+    (path / "run.sh").chmod(0o755)
+    os.symlink(path / "app.py", path / "pkg" / "link.py")
+
+    return path
+
+
+def test_ls(workspace: Path):
+    """Test `ls` function."""
+    code = create_tree(workspace / "ls_code")
+    patterns = ["*.pyc", "__pycache__"]
+
+    mirror = workspace / "ls_mirror"
+    shutil.copytree(code, mirror, ignore=shutil.ignore_patterns(*patterns))
+
+    files = [path.relative_to(code) for path in ls(code, patterns)]
+
+    assert files == [path.relative_to(mirror) for path in ls_mirror(mirror)]
+    assert set(map(str, files)) == {
+        "app.py",
+        "data.txt/ignored.csv",
+        "pkg/__init__.py",
+        "pkg/link.py",
+        "pkg/sub/mod.py",
+        "pkg.py",
+        "requirements.txt",
+        "run.sh",
+    }
+
+
+def test_tar_reproducible(workspace: Path):
+    """Test `tar` produces the same archive as a filtered copy of the directory."""
+    code = create_tree(workspace / "tar_code")
+    patterns = ["# comment", "*.pyc", "__pycache__", "data.txt"]
+
+    mirror = workspace / "tar_mirror"
+    shutil.copytree(code, mirror, ignore=shutil.ignore_patterns(*patterns))
+    expected_tar = workspace / "tar_expected.tar"
+    tar_mirror(dir_path=mirror, tar_path=expected_tar)
+
+    output_tar = workspace / "tar_output.tar"
+    with open(output_tar, "wb") as f:
+        tar(dir_path=code, fileobj=f, ignore_patterns=patterns)
+
+    assert output_tar.read_bytes() == expected_tar.read_bytes()
+
+
+def test_chunks_reader():
+    """Test `ChunksReader`."""
+    reader = io.BufferedReader(ChunksReader([b"abc", b"", b"defgh", b"i"]))
+
+    assert reader.read(2) == b"ab"
+    assert reader.read() == b"cdefghi"
+    assert reader.read() == b""
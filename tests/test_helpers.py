@@ -1,8 +1,24 @@
 """Test helpers functions."""
 
+import os
 from pathlib import Path
 
+from docker.errors import NotFound
+
+from mse_home.command.helpers import (
+    LOAD_CHUNK_SIZE,
+    load_docker_image,
+    load_package_image,
+)
 from mse_home.command.sgx_operator.evidence import guess_pccs_url
+from mse_home.compression import GZIP, Compression
+from mse_home.model.manifest import ImageManifest
+from mse_home.model.package import (
+    DOCKER_IMAGE_TAR_NAME,
+    CodePackage,
+    PackageWriter,
+    read_manifest,
+)
 
 
 def test_guess_pccs_url():
@@ -10,3 +26,94 @@ def test_guess_pccs_url():
     conf = Path(__file__).parent / "data/sgx_default_qcnl.conf"
 
     assert guess_pccs_url(aemsd_conf_file=conf) == "https://example.cosmian.com"
+
+
+class FakeDockerClient:
+    """Docker client recording the loaded images."""
+
+    def __init__(self, image_ids=()):
+        """Initialize the client with the images `image_ids` already loaded."""
+        self.api = self
+        self.images = self
+        self.loaded = b""
+        self.tags = ["app:1"]
+        self.image_ids = list(image_ids)
+
+    def load_image(self, data):
+        """Consume the streamed image tarball."""
+        for chunk in data:
+            assert len(chunk) <= LOAD_CHUNK_SIZE
+            self.loaded += chunk
+
+        self.image_ids.append("sha256:1234")
+        yield {"stream": "Loaded image: app:1\n"}
+
+    def get(self, name):
+        """Get the loaded image."""
+        if name != "app:1" and name not in self.image_ids:
+            raise NotFound(name)
+        return self
+
+
+def test_load_docker_image(workspace: Path):
+    """Test load_docker_image streaming an image member of a package."""
+    data = os.urandom(LOAD_CHUNK_SIZE) * 3
+    image_tar = workspace / "image_to_load.tar"
+    image_tar.write_bytes(data)
+
+    package_tar = workspace / "package_to_load.tar"
+    with PackageWriter(package_tar) as package:
+        with package.open(DOCKER_IMAGE_TAR_NAME) as f:
+            with Compression(algorithm=GZIP).open(f) as output:
+                output.write(data)
+
+    package = CodePackage(
+        code_tar=workspace / "none",
+        image_tar=workspace / "none",
+        test_tar=workspace / "none",
+        config_path=workspace / "none",
+        manifest=read_manifest(package_tar),
+        path=package_tar,
+    )
+
+    client = FakeDockerClient()
+    with package.open_image() as (f, size):
+        assert load_docker_image(client, f, size) == "app:1"
+
+    assert client.loaded == data
+
+    client = FakeDockerClient()
+    with open(image_tar, "rb") as f:
+        assert load_docker_image(client, f, len(data)) == "app:1"
+
+    assert client.loaded == data
+
+
+def test_load_package_image(workspace: Path):
+    """Test load_package_image skipping the images already loaded."""
+    package_tar = workspace / "package_to_skip.tar"
+    with PackageWriter(package_tar) as package:
+        with package.open(DOCKER_IMAGE_TAR_NAME) as f:
+            f.write(b"image")
+
+        package.manifest.image = ImageManifest(
+            id="sha256:1234", tags=["app:1"], layers=[]
+        )
+
+    package = CodePackage(
+        code_tar=workspace / "none",
+        image_tar=workspace / "none",
+        test_tar=workspace / "none",
+        config_path=workspace / "none",
+        manifest=read_manifest(package_tar),
+        path=package_tar,
+    )
+
+    client = FakeDockerClient()
+    assert load_package_image(client, package) == "app:1"
+    assert client.loaded == b"image"
+
+    # Loaded once only
+    client.loaded = b""
+    assert load_package_image(client, package) == "app:1"
+    assert client.loaded == b""
@@ -0,0 +1,80 @@
+"""Test image.py."""
+
+import hashlib
+import io
+import tarfile
+from typing import Dict
+
+from mse_home.image import filter_image_tar
+
+
+def make_tar(members: Dict[str, bytes]) -> bytes:
+    """Create a tarball in memory."""
+    output = io.BytesIO()
+    with tarfile.open(fileobj=output, mode="w:") as tar_file:
+        for name, data in members.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tar_file.addfile(info, io.BytesIO(data))
+
+    return output.getvalue()
+
+
+def chunked(data: bytes, size: int = 1000):
+    """Split `data` in chunks like `Image.save` does."""
+    return (data[i : i + size] for i in range(0, len(data), size))
+
+
+def digest(data: bytes) -> str:
+    """Compute the digest of a layer."""
+    return f"sha256:{hashlib.sha256(data).hexdigest()}"
+
+
+def test_filter_image_tar_legacy():
+    """Test `filter_image_tar` with the legacy `docker save` format."""
+    base_layer = b"base" * 10000
+    app_layer = b"app" * 10000
+    image_tar = make_tar(
+        {
+            "manifest.json": b"[]",
+            "1234/layer.tar": base_layer,
+            "5678/layer.tar": app_layer,
+        }
+    )
+
+    output = io.BytesIO()
+    omitted = filter_image_tar(
+        chunked(image_tar), output, {digest(base_layer), digest(b"other")}
+    )
+
+    assert omitted == {digest(base_layer)}
+
+    output.seek(0)
+    with tarfile.open(fileobj=output) as tar_file:
+        assert tar_file.getnames() == ["manifest.json", "5678/layer.tar"]
+        assert tar_file.extractfile("5678/layer.tar").read() == app_layer
+
+
+def test_filter_image_tar_oci():
+    """Test `filter_image_tar` with the OCI `docker save` format."""
+    base_layer = b"base" * 10000
+    app_layer = b"app" * 10000
+    image_tar = make_tar(
+        {
+            "index.json": b"{}",
+            f"blobs/sha256/{digest(base_layer)[7:]}": base_layer,
+            f"blobs/sha256/{digest(app_layer)[7:]}": app_layer,
+        }
+    )
+
+    output = io.BytesIO()
+    omitted = filter_image_tar(chunked(image_tar), output, {digest(base_layer)})
+
+    assert omitted == {digest(base_layer)}
+
+    output.seek(0)
+    with tarfile.open(fileobj=output) as tar_file:
+        assert tar_file.getnames() == [
+            "index.json",
+            f"blobs/sha256/{digest(app_layer)[7:]}",
+        ]
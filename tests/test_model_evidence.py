@@ -4,6 +4,7 @@ import base64
 import filecmp
 from pathlib import Path
 
+import pytest
 from cryptography.hazmat.primitives.serialization import (
     Encoding,
     PublicFormat,
@@ -12,7 +13,7 @@ from cryptography.hazmat.primitives.serialization import (
 from cryptography.x509 import load_pem_x509_certificate, load_pem_x509_crl
 from mse_cli_core.no_sgx_docker import NoSgxDockerConfig
 
-from mse_home.model.evidence import ApplicationEvidence
+from mse_home.model.evidence import ApplicationEvidence, EvidenceBundle, load_evidences
 
 
 def test_load():
@@ -80,3 +81,88 @@ def test_save(workspace: Path):
     conf.save(tmp_json)
 
     assert filecmp.cmp(json, tmp_json)
+
+
+def test_bundle(workspace: Path):
+    """Test the evidence bundle sharing the collaterals."""
+    json_path = Path(__file__).parent / "data/evidence.json"
+    evidence = ApplicationEvidence.load(path=json_path)
+    other = evidence.copy(
+        update={"input_args": evidence.input_args.copy(update={"size": 8192})}
+    )
+
+    bundle = EvidenceBundle()
+    bundle.add("app1", evidence)
+    bundle.add("app2", other)
+
+    assert len(bundle.collaterals) == 5
+
+    bundle_path = workspace / "evidence_bundle.json"
+    bundle.save(bundle_path)
+    assert bundle_path.stat().st_size < 1.5 * json_path.stat().st_size
+
+    evidences = load_evidences(bundle_path)
+    assert list(evidences) == ["app1", "app2"]
+    assert evidences["app1"].to_dict() == evidence.to_dict()
+    assert evidences["app2"].to_dict() == other.to_dict()
+
+    # The collaterals are decoded once for all the applications
+    assert evidences["app1"].pck_platform_crl is evidences["app2"].pck_platform_crl
+
+    assert list(load_evidences(json_path)) == ["data"]
+
+
+@pytest.mark.parametrize("name", ["", ".", "..", "../app", "app/..", "/tmp"])
+def test_bundle_bad_name(workspace: Path, name: str):
+    """Test rejecting a bundle whose application name escapes its directory."""
+    json_path = Path(__file__).parent / "data/evidence.json"
+
+    bundle = EvidenceBundle()
+    bundle.add(name, ApplicationEvidence.load(path=json_path))
+
+    bundle_path = workspace / "evidence_bundle_bad_name.json"
+    bundle.save(bundle_path)
+
+    with pytest.raises(ValueError, match="Invalid application name"):
+        load_evidences(bundle_path)
+
+
+def test_lazy():
+    """Test decoding the certificates and CRLs on first access."""
+    json_path = Path(__file__).parent / "data/evidence.json"
+    evidence = ApplicationEvidence.load(path=json_path)
+
+    assert "pck_platform_crl" not in evidence.__dict__
+
+    crl = evidence.pck_platform_crl
+    assert evidence.__dict__["pck_platform_crl"] is crl
+    assert evidence.pck_platform_crl is crl
+
+    with pytest.raises(AttributeError):
+        _ = evidence.unknown
+
+
+def test_binary(workspace: Path):
+    """Test the round trip between the json and binary formats."""
+    pytest.importorskip("cbor2")
+
+    json_path = Path(__file__).parent / "data/evidence.json"
+    evidence = ApplicationEvidence.load(path=json_path)
+
+    binary_dir = workspace / "binary"
+    binary_dir.mkdir()
+    binary_path = binary_dir / "evidence.cbor"
+    evidence.save(binary_path)
+    assert binary_path.stat().st_size < 0.8 * json_path.stat().st_size
+
+    binary = ApplicationEvidence.load(path=binary_path)
+    assert "root_ca_crl" not in binary.__dict__
+    assert binary.root_ca_crl == evidence.root_ca_crl
+    assert binary.to_dict() == evidence.to_dict()
+    assert binary.to_bytes() == binary_path.read_bytes()
+
+    tmp_json = binary_dir / "evidence.json"
+    binary.save(tmp_json)
+    assert filecmp.cmp(json_path, tmp_json)
+
+    assert list(load_evidences(binary_path)) == ["binary"]
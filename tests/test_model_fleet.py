@@ -0,0 +1,50 @@
+"""Test model/fleet.py."""
+
+from pathlib import Path
+
+import pytest
+from pydantic import ValidationError
+
+from mse_home.model.fleet import DEFAULT_DAYS, Fleet
+
+
+def test_load(workspace: Path):
+    """Test the `load` method."""
+    fleet_path = workspace / "fleet.toml"
+    fleet_path.write_text(
+        """
+[[apps]]
+name = "app1"
+host = "app1.example.com"
+port = 7001
+size = 4096
+
+[[apps]]
+name = "app2"
+host = "app2.example.com"
+port = 7002
+size = 8192
+days = 2
+"""
+    )
+
+    fleet = Fleet.load(fleet_path)
+
+    assert [app.name for app in fleet.apps] == ["app1", "app2"]
+    assert fleet.apps[0].days == DEFAULT_DAYS
+    assert fleet.apps[1].days == 2
+    assert fleet.apps[1].size == 8192
+
+
+def test_load_bad_fleet():
+    """Test the validation of the fleet."""
+    app = {"name": "app1", "host": "app1.example.com", "port": 7001, "size": 4096}
+
+    with pytest.raises(ValidationError):
+        Fleet(apps=[{**app, "size": 3000}])
+
+    with pytest.raises(ValidationError):
+        Fleet(apps=[app, {**app, "name": "app2"}])
+
+    with pytest.raises(ValidationError):
+        Fleet(apps=[app, {**app, "port": 7002}])
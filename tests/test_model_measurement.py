@@ -0,0 +1,77 @@
+"""Test model/measurement.py."""
+
+from pathlib import Path
+
+import pytest
+from pydantic import ValidationError
+
+from mse_home.command.code_provider.package import check_manifest_room
+from mse_home.model.manifest import PackageManifest
+from mse_home.model.measurement import MeasurementGrid
+
+APP_ID = "63322f85-1ff8-4483-91ae-f18d7398d157"
+
+
+def test_input_args(workspace: Path):
+    """Test the arguments of the enclaves of the grid."""
+    grid_path = workspace / "grid.toml"
+    grid_path.write_text(
+        f"""
+sizes = [4096, 8192]
+
+[[deployments]]
+host = "app1.example.com"
+app_id = "{APP_ID}"
+expiration_date = 1714058115
+
+[[deployments]]
+host = "app2.example.com"
+app_id = "{APP_ID}"
+"""
+    )
+
+    input_args = MeasurementGrid.load(grid_path).input_args("app:app")
+
+    assert [(args.host, args.size) for args in input_args] == [
+        ("app1.example.com", 4096),
+        ("app1.example.com", 8192),
+        ("app2.example.com", 4096),
+        ("app2.example.com", 8192),
+    ]
+    assert {args.application for args in input_args} == {"app:app"}
+    assert input_args[0].expiration_date == 1714058115
+    assert input_args[2].expiration_date is None
+
+    grid = MeasurementGrid(
+        sizes=[4096],
+        applications=["app:app", "other:app"],
+        deployments=[{"host": "localhost", "app_id": APP_ID}],
+    )
+    assert [args.application for args in grid.input_args("app:app")] == [
+        "app:app",
+        "other:app",
+    ]
+
+
+def test_bad_grid():
+    """Test the validation of the grid."""
+    deployment = {"host": "localhost", "app_id": APP_ID}
+
+    with pytest.raises(ValidationError):
+        MeasurementGrid(sizes=[3000], deployments=[deployment])
+
+    with pytest.raises(ValidationError):
+        MeasurementGrid(sizes=[4096], deployments=[{**deployment, "app_id": "id"}])
+
+
+def test_manifest_room():
+    """Test rejecting a grid too large for the manifest of the package."""
+    grid = MeasurementGrid(
+        sizes=[4096, 8192],
+        deployments=[{"host": "localhost", "app_id": APP_ID}],
+    )
+    check_manifest_room(PackageManifest(), grid.input_args("app:app"))
+
+    grid.deployments = grid.deployments * 100
+    with pytest.raises(Exception):
+        check_manifest_room(PackageManifest(), grid.input_args("app:app"))
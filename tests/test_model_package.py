@@ -1,12 +1,24 @@
 """Test model/package.py."""
 
 import filecmp
+import gzip
 from pathlib import Path
 from tarfile import TarFile
 
 import pytest
 
-from mse_home.model.package import CodePackage
+from mse_home.compression import GZIP, Compression
+from mse_home.model.manifest import ImageManifest
+from mse_home.model.package import (
+    CODE_TAR_NAME,
+    DOCKER_IMAGE_TAR_NAME,
+    MANIFEST_NAME,
+    MSE_CONFIG_NAME,
+    TEST_TAR_NAME,
+    CodePackage,
+    PackageWriter,
+    read_manifest,
+)
 
 
 def test_create(workspace: Path):
@@ -22,7 +34,19 @@ def test_create(workspace: Path):
     package_tar = workspace / "package.tar"
     package.create(package_tar)
 
-    assert TarFile(package_tar).getnames() == TarFile(package_tar_ref).getnames()
+    assert (
+        TarFile(package_tar).getnames()
+        == [MANIFEST_NAME] + TarFile(package_tar_ref).getnames()
+    )
+
+    manifest = read_manifest(package_tar)
+    assert manifest
+    assert [member.name for member in manifest.members] == [
+        CODE_TAR_NAME,
+        DOCKER_IMAGE_TAR_NAME,
+        TEST_TAR_NAME,
+        MSE_CONFIG_NAME,
+    ]
 
 
 def test_extract(workspace: Path):
@@ -60,3 +84,148 @@ def test_extract_bad_tar(workspace: Path):
 
     with pytest.raises(Exception):
         CodePackage.extract(workspace, package_tar)
+
+
+def test_package_writer(workspace: Path):
+    """Test `PackageWriter` streaming members into the package."""
+    data_dir = Path(__file__).parent / "data"
+    package_tar = workspace / "package_streamed.tar"
+
+    with PackageWriter(package_tar) as package:
+        with package.open(CODE_TAR_NAME) as f:
+            f.write((data_dir / "package" / "app.tar").read_bytes())
+
+        with package.open(TEST_TAR_NAME) as f:
+            f.write((data_dir / "package" / "tests.tar").read_bytes())
+
+        package.add(data_dir / "mse.toml", MSE_CONFIG_NAME)
+
+        with package.open(DOCKER_IMAGE_TAR_NAME) as f:
+            # Several chunks spanning multiple blocks
+            for i in range(10):
+                f.write(bytes([i]) * 1000)
+
+    with TarFile(package_tar) as tar_file:
+        assert tar_file.getnames() == [
+            MANIFEST_NAME,
+            CODE_TAR_NAME,
+            TEST_TAR_NAME,
+            MSE_CONFIG_NAME,
+            DOCKER_IMAGE_TAR_NAME,
+        ]
+        assert tar_file.getmember(DOCKER_IMAGE_TAR_NAME).size == 10000
+
+    extract_dir = workspace / "extract_streamed"
+    extract_dir.mkdir()
+    package = CodePackage.extract(extract_dir, package_tar)
+
+    assert filecmp.cmp(data_dir / "package" / "app.tar", package.code_tar)
+    assert filecmp.cmp(data_dir / "package" / "tests.tar", package.test_tar)
+    assert filecmp.cmp(data_dir / "mse.toml", package.config_path)
+    assert package.image_tar.read_bytes() == b"".join(
+        bytes([i]) * 1000 for i in range(10)
+    )
+
+
+def test_extract_compressed(workspace: Path):
+    """Test the `extract` method with compressed tarballs."""
+    data_dir = Path(__file__).parent / "data"
+    package_tar = workspace / "package_compressed.tar"
+
+    with PackageWriter(package_tar) as package:
+        for name in (CODE_TAR_NAME, TEST_TAR_NAME):
+            with package.open(name) as f, Compression(algorithm=GZIP).open(f) as output:
+                output.write((data_dir / "package" / name).read_bytes())
+
+        package.add(data_dir / "mse.toml", MSE_CONFIG_NAME)
+
+        with package.open(DOCKER_IMAGE_TAR_NAME) as f:
+            with Compression(algorithm=GZIP, threads=2).open(f) as output:
+                output.write(
+                    (data_dir / "package" / DOCKER_IMAGE_TAR_NAME).read_bytes()
+                )
+
+        image = ImageManifest(
+            id="sha256:1234",
+            layers=["sha256:base", "sha256:app"],
+            base_image="base:latest",
+            omitted_layers=["sha256:base"],
+        )
+        package.manifest.image = image
+
+    extract_dir = workspace / "extract_compressed"
+    extract_dir.mkdir()
+    package = CodePackage.extract(extract_dir, package_tar)
+
+    assert filecmp.cmp(data_dir / "package" / "app.tar", package.code_tar)
+    assert filecmp.cmp(data_dir / "package" / "tests.tar", package.test_tar)
+    assert filecmp.cmp(data_dir / "package" / "image.tar", package.image_tar)
+    assert filecmp.cmp(data_dir / "mse.toml", package.config_path)
+    assert package.manifest.image == image
+    assert package.manifest.image.is_delta
+
+    # The whole package compressed
+    with open(package_tar, "rb") as f:
+        (workspace / "package_compressed.tar.gz").write_bytes(gzip.compress(f.read()))
+
+    extract_dir = workspace / "extract_compressed_package"
+    extract_dir.mkdir()
+    package = CodePackage.extract(extract_dir, workspace / "package_compressed.tar.gz")
+
+    assert filecmp.cmp(data_dir / "package" / "app.tar", package.code_tar)
+
+
+def test_extract_lazy(workspace: Path):
+    """Test the `extract` method of some members only."""
+    data_dir = Path(__file__).parent / "data"
+    package_tar = workspace / "package_lazy.tar"
+
+    CodePackage(
+        code_tar=data_dir / "package" / "app.tar",
+        image_tar=data_dir / "package" / "image.tar",
+        test_tar=data_dir / "package" / "tests.tar",
+        config_path=data_dir / "mse.toml",
+    ).create(package_tar)
+
+    extract_dir = workspace / "extract_lazy"
+    extract_dir.mkdir()
+    package = CodePackage.extract(extract_dir, package_tar, [DOCKER_IMAGE_TAR_NAME])
+
+    assert filecmp.cmp(data_dir / "package" / "image.tar", package.image_tar)
+    assert list(extract_dir.iterdir()) == [package.image_tar]
+
+
+def test_extract_corrupted(workspace: Path):
+    """Test the `extract` method with a corrupted or truncated package."""
+    data_dir = Path(__file__).parent / "data"
+    package_tar = workspace / "package_corrupted.tar"
+
+    CodePackage(
+        code_tar=data_dir / "package" / "app.tar",
+        image_tar=data_dir / "package" / "image.tar",
+        test_tar=data_dir / "package" / "tests.tar",
+        config_path=data_dir / "mse.toml",
+    ).create(package_tar)
+
+    manifest = read_manifest(package_tar)
+    assert manifest
+    member = manifest.member(CODE_TAR_NAME)
+    assert member
+
+    data = bytearray(package_tar.read_bytes())
+    data[member.offset] ^= 0xFF
+    package_tar.write_bytes(data)
+
+    extract_dir = workspace / "extract_corrupted"
+    extract_dir.mkdir()
+
+    with pytest.raises(Exception, match="corrupted"):
+        CodePackage.extract(extract_dir, package_tar)
+
+    # Nothing is written if the package is truncated
+    package_tar.write_bytes(data[: member.offset + member.size])
+
+    with pytest.raises(Exception, match="truncated"):
+        CodePackage.extract(extract_dir, package_tar)
+
+    assert list(extract_dir.iterdir()) == []
@@ -0,0 +1,93 @@
+"""Test ports.py."""
+
+import subprocess
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+from mse_home.ports import PORT_LABEL, PortPool, is_alive
+
+
+class FakeContainers:
+    """Containers of the fake Docker client."""
+
+    def __init__(self):
+        """Initialize the labels of the containers."""
+        self.labels = []
+
+    def list(self, all, filters):  # pylint: disable=redefined-builtin
+        """List the containers labelled with their port."""
+        assert all and filters == {"label": PORT_LABEL}
+        return [SimpleNamespace(labels=labels) for labels in self.labels]
+
+
+class FakeDockerClient:
+    """Docker client without any daemon."""
+
+    def __init__(self):
+        """Initialize the containers."""
+        self.containers = FakeContainers()
+
+
+def dead_pid() -> int:
+    """Return the pid of a terminated process."""
+    with subprocess.Popen([sys.executable, "-c", "pass"]) as process:
+        process.wait()
+
+    return process.pid
+
+
+def test_reserve(workspace):
+    """Test reserving the first free ports of the range."""
+    pool = PortPool(FakeDockerClient(), 17000, 17999, workspace / "ports_reserve")
+
+    first = pool.reserve("app1")
+    second = pool.reserve("app2")
+
+    assert 17000 <= first < second <= 17999
+
+    pool.release(first)
+    assert pool.reserve("app3") == first
+
+
+def test_reserve_explicit(workspace):
+    """Test reserving a port already reserved by another application."""
+    pool = PortPool(FakeDockerClient(), 17000, 17999, workspace / "ports_explicit")
+
+    port = pool.reserve("app1")
+
+    with pytest.raises(Exception, match="already reserved by `app1`"):
+        pool.reserve("app2", port)
+
+    assert pool.reserve("app1", port) == port
+
+
+def test_reserve_exhausted(workspace):
+    """Test reserving a port when the range is exhausted."""
+    pool = PortPool(FakeDockerClient(), 17000, 17000, workspace / "ports_exhausted")
+
+    pool.reserve("app1")
+
+    with pytest.raises(Exception, match="No free port left"):
+        pool.reserve("app2")
+
+
+def test_reclaim(workspace):
+    """Test reclaiming the ports of the dead processes."""
+    client = FakeDockerClient()
+    pool = PortPool(client, 17000, 17001, workspace / "ports_reclaim")
+
+    pid = dead_pid()
+    assert not is_alive(pid)
+
+    first = pool.reserve("app1")
+    second = pool.reserve("app2")
+
+    # The first port is held by a container, the second by a dead process
+    client.containers.labels.append({PORT_LABEL: str(first)})
+    with pool._state() as state:  # pylint: disable=protected-access
+        for reservation in state.values():
+            reservation["pid"] = pid
+
+    assert pool.reserve("app3") == second
@@ -0,0 +1,100 @@
+"""Test readiness.py."""
+
+import threading
+import time
+
+import pytest
+
+from mse_home.error import AppContainerNotRunning
+from mse_home.readiness import wait_for_container
+
+
+class FakeEvents:
+    """Stream of Docker events blocking until an event is sent."""
+
+    def __init__(self):
+        """Initialize the stream."""
+        self.queue = []
+        self.ready = threading.Event()
+
+    def send(self, event):
+        """Send an event."""
+        self.queue.append(event)
+        self.ready.set()
+
+    def __iter__(self):
+        """Yield the sent events."""
+        while self.ready.wait():
+            while self.queue:
+                event = self.queue.pop(0)
+                if event is None:
+                    return
+                yield event
+            self.ready.clear()
+
+    def close(self):
+        """Close the stream."""
+        self.send(None)
+
+
+class FakeDockerClient:
+    """Docker client with a single container."""
+
+    def __init__(self, status: str = "running"):
+        """Initialize the client."""
+        self.stream = FakeEvents()
+        self.containers = self
+        self.status = status
+
+    def events(self, **_kwargs):
+        """Subscribe to the events."""
+        return self.stream
+
+    def get(self, _name):
+        """Get the container."""
+        return self
+
+
+def test_wait_for_container():
+    """Test `wait_for_container` with a container becoming ready."""
+    client = FakeDockerClient()
+    checks = []
+
+    def check():
+        checks.append(time.monotonic())
+        return len(checks) == 4
+
+    start = time.monotonic()
+    wait_for_container(client, "app", check, timeout=10, message="timeout")
+
+    assert len(checks) == 4
+    # 20 + 40 + 80 ms of backoff
+    assert time.monotonic() - start < 1
+
+
+def test_wait_for_container_exit():
+    """Test `wait_for_container` with a container exiting while waiting."""
+    client = FakeDockerClient()
+    threading.Timer(0.2, client.stream.send, ({"Action": "die"},)).start()
+
+    start = time.monotonic()
+    with pytest.raises(AppContainerNotRunning, match="die"):
+        wait_for_container(
+            client, "app", lambda: False, timeout=10, message="timeout", max_delay=5
+        )
+
+    assert time.monotonic() - start < 1
+
+    # Already exited
+    with pytest.raises(AppContainerNotRunning, match="exited"):
+        wait_for_container(
+            FakeDockerClient("exited"), "app", lambda: True, timeout=10, message=""
+        )
+
+
+def test_wait_for_container_timeout():
+    """Test `wait_for_container` with a container never ready."""
+    with pytest.raises(Exception, match="timeout"):
+        wait_for_container(
+            FakeDockerClient(), "app", lambda: False, timeout=0.1, message="timeout"
+        )
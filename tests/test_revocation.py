@@ -0,0 +1,87 @@
+"""Test revocation.py."""
+
+from pathlib import Path
+
+import pytest
+from cryptography.x509 import load_pem_x509_certificate
+from intel_sgx_ra.error import CertificateError, CertificateRevokedError
+from intel_sgx_ra.ratls import ratls_verify
+
+import mse_home.revocation
+from mse_home.model.evidence import ApplicationEvidence
+from mse_home.revocation import RevocationIndex, check_revocation
+
+
+@pytest.fixture(name="evidence")
+def fixture_evidence() -> ApplicationEvidence:
+    """Load the evidence of the test data."""
+    return ApplicationEvidence.load(Path(__file__).parent / "data/evidence.json")
+
+
+def test_check_revocation(workspace: Path, evidence: ApplicationEvidence, monkeypatch):
+    """Test indexing the CRLs once and reusing the index from the disk."""
+    index = RevocationIndex(workspace / "revocation")
+
+    (root_ca_crl, pck_ca_crl) = check_revocation(
+        index,
+        evidence.ratls_certificate,
+        evidence.root_ca_crl,
+        evidence.pck_platform_crl,
+    )
+
+    assert len(index.entries) == 2
+    assert not root_ca_crl.serial_numbers
+    assert len(pck_ca_crl.serial_numbers) == len(evidence.pck_platform_crl)
+
+    serial_number = next(iter(evidence.pck_platform_crl)).serial_number
+    revoked = pck_ca_crl.get_revoked_certificate_by_serial_number(serial_number)
+    assert revoked is not None
+    assert revoked.serial_number == serial_number
+    assert pck_ca_crl.get_revoked_certificate_by_serial_number(1) is None
+    assert pck_ca_crl.next_update == evidence.pck_platform_crl.next_update
+
+    # The CRLs are neither checked nor indexed again
+    def check_crl_signature(_crl, _issuer):
+        raise AssertionError("The CRL should not be indexed again")
+
+    monkeypatch.setattr(mse_home.revocation, "check_crl_signature", check_crl_signature)
+
+    other = RevocationIndex(workspace / "revocation")
+    (_, other_pck_ca_crl) = check_revocation(
+        other,
+        evidence.ratls_certificate,
+        evidence.root_ca_crl,
+        evidence.pck_platform_crl,
+    )
+    assert other_pck_ca_crl.serial_numbers == pck_ca_crl.serial_numbers
+
+
+def test_revoked(evidence: ApplicationEvidence, monkeypatch):
+    """Test rejecting a revoked PCK certificate."""
+    pck_cert = load_pem_x509_certificate(
+        ratls_verify(evidence.ratls_certificate).certs()[0]
+    )
+
+    index = RevocationIndex(None)
+    monkeypatch.setattr(
+        index, "revoked", lambda _crl, _issuer: frozenset([pck_cert.serial_number])
+    )
+
+    with pytest.raises(CertificateRevokedError):
+        check_revocation(
+            index,
+            evidence.ratls_certificate,
+            evidence.root_ca_crl,
+            evidence.pck_platform_crl,
+        )
+
+
+def test_bad_crl(evidence: ApplicationEvidence):
+    """Test rejecting a CRL not signed by its issuer."""
+    with pytest.raises(CertificateError):
+        check_revocation(
+            RevocationIndex(None),
+            evidence.ratls_certificate,
+            evidence.root_ca_crl,
+            evidence.root_ca_crl,
+        )
@@ -0,0 +1,52 @@
+"""Test timing.py."""
+
+import json
+
+import pytest
+
+from mse_home.timing import METRIC_NAME, Timer
+
+
+def test_span():
+    """Test recording the spans of the phases."""
+    timer = Timer("spawn")
+
+    with timer.span("extract"):
+        pass
+
+    with pytest.raises(ValueError):
+        with timer.span("load_image", "app1"):
+            raise ValueError()
+
+    assert [(s["app"], s["phase"], s["status"]) for s in timer.spans] == [
+        (None, "extract", "ok"),
+        ("app1", "load_image", "failed"),
+    ]
+    assert all(s["command"] == "spawn" and s["duration"] >= 0 for s in timer.spans)
+
+
+def test_report(workspace):
+    """Test the JSON lines and the OpenMetrics reports."""
+    jsonl_path = workspace / "timing.jsonl"
+    openmetrics_path = workspace / "timing.prom"
+
+    for _ in range(2):
+        timer = Timer("run")
+        with timer.span("configure_app", 'my"app'):
+            pass
+        timer.report(jsonl_path, openmetrics_path)
+
+    # The JSON lines are appended at each run
+    spans = [json.loads(line) for line in jsonl_path.read_text().splitlines()]
+    assert len(spans) == 2
+    assert spans[0]["app"] == 'my"app'
+
+    # The OpenMetrics file only contains the last run
+    lines = openmetrics_path.read_text().splitlines()
+    assert lines[0] == f"# TYPE {METRIC_NAME} gauge"
+    assert lines[-1] == "# EOF"
+    assert lines[3].startswith(
+        f'{METRIC_NAME}{{command="run",app="my\\"app",phase="configure_app",'
+        'status="ok"} '
+    )
+    assert len(lines) == 5